@@ -1,27 +1,26 @@
 import os
+import hmac
 import json
 import time
 import logging
-import asyncio
 import atexit
-from typing import Optional
-from flask import Flask, request, jsonify
-from telegram import Update
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, ConversationHandler
-
-# Импортируем обработчики из handlers.py
-from handlers import (
-    AMOUNT, CATEGORY, DESCRIPTION,
-    start_command, help_command,
-    add_expense_start, process_amount, process_category, process_description,
-    cancel,
-    show_stats, show_today_expenses, show_month_expenses,
-    clear_expenses_start,
-    show_categories,
-  # для отладки если нужно
-)
-
-from database_postgres import db
+import threading
+from typing import TYPE_CHECKING, Optional
+from flask import Flask, Response, request, jsonify
+
+# Здесь только легкие модули: telegram, psycopg и обработчики
+# импортируются в load_components(), чтобы воркер быстрее начал отвечать
+from event_loop import BackgroundEventLoop
+from update_queue import UpdateQueue
+from exporter import iter_csv, iter_encoded
+from metrics import REGISTRY, WEBHOOK_RESULT
+
+if TYPE_CHECKING:
+    from telegram import Update
+    from telegram.ext import Application
+
+# Время запуска: от него считаются uptime и startup_seconds
+start_time = time.time()
 
 # ========== НАСТРОЙКА ЛОГИРОВАНИЯ ==========
 logging.basicConfig(
@@ -32,18 +31,101 @@ logger = logging.getLogger(__name__)
 
 # ========== КОНФИГУРАЦИЯ ==========
 TELEGRAM_TOKEN = os.environ.get('TELEGRAM_BOT_TOKEN')
+# Свой сервер Bot API (например, локальный telegram-bot-api), по умолчанию api.telegram.org
+TELEGRAM_API_URL = os.environ.get('TELEGRAM_API_URL')
+# Максимальное время ожидания корутины из маршрута Flask, с
+ASYNC_TIMEOUT = float(os.environ.get('ASYNC_TIMEOUT', 30))
+# Очередь обновлений: число воркеров, лимит ожидающих обновлений и
+# сколько ждать их обработки при остановке, с
+UPDATE_WORKERS = int(os.environ.get('UPDATE_WORKERS', 8))
+UPDATE_QUEUE_SIZE = int(os.environ.get('UPDATE_QUEUE_SIZE', 1000))
+UPDATE_DRAIN_TIMEOUT = float(os.environ.get('UPDATE_DRAIN_TIMEOUT', 25))
+# Токен для /export/<user_id> (без него HTTP-выгрузка выключена)
+EXPORT_API_TOKEN = os.environ.get('EXPORT_API_TOKEN')
+# Быстрый холодный старт: воркер сразу принимает запросы, а модули, БД и
+# бот поднимаются в фоне; маршрутам бота разрешено ждать их STARTUP_TIMEOUT, с
+LAZY_START = os.environ.get('LAZY_START', '0') != '0'
+STARTUP_TIMEOUT = float(os.environ.get('STARTUP_TIMEOUT', 25))
+# Пауза перед повторной фоновой инициализацией после неудачной, с
+STARTUP_RETRY_INTERVAL = 30
 app = Flask(__name__)
 
 # ========== ГЛОБАЛЬНЫЕ ПЕРЕМЕННЫЕ ==========
-telegram_app: Optional[Application] = None
+telegram_app: Optional['Application'] = None
+# Один event loop на все время жизни приложения
+bot_loop = BackgroundEventLoop()
+
+# Компоненты с тяжелыми зависимостями создает load_components()
+db = None
+adb = None
+invalidation_listener = None
+# Общее для воркеров состояние диалогов (STATE_BACKEND=postgres)
+persistence = None
+# Все исходящие запросы к Bot API идут через общий ограничитель (flood-лимиты)
+outbound = None
+_components_loaded = False
+_components_lock = threading.Lock()
+
+
+def load_components():
+    """Импорт telegram, слоев БД и создание общих компонентов (один раз на процесс).
+
+    Соединения здесь не открываются: синхронная БД подключается при
+    первом обращении, асинхронный пул - при первом запросе в event loop.
+    """
+    global db, adb, invalidation_listener, persistence, outbound, _components_loaded
+    if _components_loaded:
+        return
+
+    with _components_lock:
+        if _components_loaded:
+            return
+        started = time.perf_counter()
+
+        import database_async
+        from database_postgres import db as sync_db
+        from outbound import OutboundRateLimiter
+        from persistence import STATE_BACKEND, PostgresPersistence
+
+        db = sync_db
+        adb = database_async.adb
+        invalidation_listener = database_async.invalidation_listener
+        persistence = PostgresPersistence(adb) if STATE_BACKEND == 'postgres' else None
+        outbound = OutboundRateLimiter()
+        _components_loaded = True
+        logger.info(f"✅ Модули загружены за {time.perf_counter() - started:.2f} с")
+
+
+def db_ready() -> bool:
+    """Подключена ли синхронная БД (без попытки подключиться)"""
+    return db is not None and db.initialized
+
+
+async def process_telegram_update(update: 'Update'):
+    """Обработка обновления воркером очереди"""
+    if persistence:
+        await persistence.load_update(update)
+    await telegram_app.process_update(update)
+    if persistence:
+        # Состояние пишется сразу: следующее сообщение может уйти в другой воркер
+        await telegram_app.update_persistence()
+        await persistence.flush()
+
+
+update_queue = UpdateQueue(
+    process_telegram_update,
+    workers=UPDATE_WORKERS,
+    max_pending=UPDATE_QUEUE_SIZE
+)
 
 
-def run_async_safe(coro):
-    """Безопасный запуск асинхронной функции"""
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
+def run_async_safe(coro, timeout: float = ASYNC_TIMEOUT):
+    """Безопасный запуск асинхронной функции в общем event loop"""
     try:
-        return loop.run_until_complete(coro)
+        return bot_loop.run(coro, timeout)
+    except TimeoutError:
+        logger.error(f"Асинхронная функция не завершилась за {timeout} с")
+        return None
     except Exception as e:
         logger.error(f"Ошибка в асинхронной функции: {e}")
         return None
@@ -60,15 +142,41 @@ async def async_create_and_initialize_bot() -> bool:
     try:
         logger.info("🔄 Создаем приложение бота...")
 
+        from telegram.ext import (
+            Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters, ConversationHandler
+        )
+
+        # Импортируем обработчики из handlers.py
+        from handlers import (
+            AMOUNT, CATEGORY, DESCRIPTION, IMPORT_FILE,
+            start_command, help_command,
+            add_expense_start, quick_add_expenses, process_amount, process_category, process_description,
+            cancel,
+            import_start, process_import_file,
+            export_expenses,
+            show_stats, show_today_expenses, show_month_expenses, show_expenses_page,
+            PAGE_CALLBACK_PREFIX,
+            clear_expenses_start,
+            show_categories, manage_aliases,
+        )
+
         # 1. Создаем приложение
-        telegram_app = Application.builder().token(TELEGRAM_TOKEN).build()
+        builder = Application.builder().token(TELEGRAM_TOKEN).rate_limiter(outbound)
+        if TELEGRAM_API_URL:
+            builder = builder.base_url(f"{TELEGRAM_API_URL}/bot").base_file_url(f"{TELEGRAM_API_URL}/file/bot")
+        if persistence:
+            builder = builder.persistence(persistence)
+        telegram_app = builder.build()
         logger.info("✅ Приложение бота создано")
 
         # ========== СНАЧАЛА CONVERSATIONHANDLER ==========
 
         # ConversationHandler для добавления расхода
         conv_handler = ConversationHandler(
-            entry_points=[CommandHandler('add', add_expense_start)],
+            entry_points=[
+                CommandHandler('add', add_expense_start),
+                CommandHandler('import', import_start)
+            ],
             states={
                 AMOUNT: [
                     MessageHandler(
@@ -92,13 +200,16 @@ async def async_create_and_initialize_bot() -> bool:
                         filters.Regex(r'^(skip|пропустить|без описания)$') & ~filters.COMMAND,
                         process_description
                     )
+                ],
+                IMPORT_FILE: [
+                    MessageHandler(filters.Document.ALL, process_import_file)
                 ]
             },
             fallbacks=[
                 CommandHandler('cancel', cancel)
             ],
             name="add_expense",
-            persistent=False,
+            persistent=persistence is not None,
             allow_reentry=True
         )
 
@@ -112,11 +223,23 @@ async def async_create_and_initialize_bot() -> bool:
         telegram_app.add_handler(CommandHandler("start", start_command))
         telegram_app.add_handler(CommandHandler("help", help_command))
         telegram_app.add_handler(CommandHandler("categories", show_categories))
+        telegram_app.add_handler(CommandHandler("alias", manage_aliases))
+
+        # Расход одним сообщением без /add: "1500 еда обед" (вне диалога -
+        # внутри него сообщение забирает ConversationHandler)
+        telegram_app.add_handler(MessageHandler(
+            filters.TEXT & ~filters.COMMAND & filters.Regex(r'^\s*\d'),
+            quick_add_expenses
+        ))
 
         # КОМАНДЫ ПРОСМОТРА
         telegram_app.add_handler(CommandHandler("today", show_today_expenses))
         telegram_app.add_handler(CommandHandler("month", show_month_expenses))
         telegram_app.add_handler(CommandHandler("stats", show_stats))
+        telegram_app.add_handler(CallbackQueryHandler(show_expenses_page, pattern=f"^{PAGE_CALLBACK_PREFIX}:"))
+
+        # ВЫГРУЗКА
+        telegram_app.add_handler(CommandHandler("export", export_expenses))
 
         # КОМАНДА ОЧИСТКИ
         telegram_app.add_handler(CommandHandler("clear", clear_expenses_start))
@@ -132,10 +255,15 @@ async def async_create_and_initialize_bot() -> bool:
 
         logger.info("✅ Все обработчики добавлены")
 
+        if persistence:
+            persistence.attach(telegram_app)
+
         # Инициализируем приложение
         await telegram_app.initialize()
         logger.info("✅ Приложение бота инициализировано")
 
+        await update_queue.start()
+
         return True
 
     except Exception as bot_init_error:
@@ -145,8 +273,112 @@ async def async_create_and_initialize_bot() -> bool:
 
 
 def create_and_initialize_bot() -> bool:
-    """Создание и инициализация приложения бота (синхронная обертка)"""
-    return run_async_safe(async_create_and_initialize_bot())
+    """Создание и инициализация приложения бота (синхронная обертка).
+
+    Подключение к БД и сверка схемы (сеть, SSL, миграции) идут в
+    отдельном потоке, пока импортируется telegram и бот инициализируется
+    в event loop. Возврат - после обоих: миграции проходят до первых обновлений.
+    """
+    from database_postgres import db as sync_db
+
+    schema_check = threading.Thread(target=sync_db.get, name='db-startup', daemon=True)
+    schema_check.start()
+    try:
+        load_components()
+        future = bot_loop.submit(async_create_and_initialize_bot())
+        try:
+            return bool(future.result(ASYNC_TIMEOUT))
+        except TimeoutError:
+            future.cancel()
+            logger.error(f"Инициализация бота не завершилась за {ASYNC_TIMEOUT} с")
+            return False
+    finally:
+        schema_check.join()
+
+
+_bot_start_lock = threading.Lock()
+# Бот готов принимать обновления
+_bot_ready = threading.Event()
+# Фоновая инициализация (LAZY_START): поток, время попытки и ее завершение
+_startup_lock = threading.Lock()
+_startup_thread: Optional[threading.Thread] = None
+_startup_attempted_at: Optional[float] = None
+_startup_done = threading.Event()
+# Секунд от запуска до готовности бота (healthz, метрика)
+startup_seconds: Optional[float] = None
+
+
+def start_bot() -> bool:
+    """Инициализация бота один раз на процесс.
+
+    Вызывается из __main__ или из хука gunicorn post_worker_init (каждый
+    воркер - отдельный процесс со своим event loop и пулами), при
+    LAZY_START - из фонового потока. Повторный вызов ничего не делает,
+    если бот уже инициализирован.
+    """
+    global startup_seconds
+    with _bot_start_lock:
+        if _bot_ready.is_set():
+            return True
+        if not create_and_initialize_bot():
+            return False
+
+        startup_seconds = time.time() - start_time
+        _bot_ready.set()
+        logger.info(f"✅ Бот готов через {startup_seconds:.2f} с после запуска")
+        # Прогрев: асинхронный пул и справочник категорий открываются
+        # сейчас, а не на первом сообщении пользователя
+        bot_loop.submit(adb.get_pool())
+        if invalidation_listener:
+            invalidation_listener.start()
+        return True
+
+
+def _run_startup():
+    try:
+        if not start_bot():
+            logger.error("❌ Фоновая инициализация бота не удалась")
+    except Exception as e:
+        logger.error(f"❌ Ошибка фоновой инициализации: {e}", exc_info=True)
+    finally:
+        _startup_done.set()
+
+
+def start_bot_background():
+    """Инициализация бота в фоновом потоке, без ожидания.
+
+    Ничего не делает, если бот готов или попытка уже идет; после
+    неудачной попытки следующая - не раньше STARTUP_RETRY_INTERVAL.
+    """
+    global _startup_thread, _startup_attempted_at
+    with _startup_lock:
+        if _bot_ready.is_set():
+            return
+        if _startup_thread is not None and _startup_thread.is_alive():
+            return
+        if _startup_attempted_at is not None and time.monotonic() - _startup_attempted_at < STARTUP_RETRY_INTERVAL:
+            return
+
+        _startup_attempted_at = time.monotonic()
+        _startup_done.clear()
+        _startup_thread = threading.Thread(target=_run_startup, name='bot-startup', daemon=True)
+        _startup_thread.start()
+
+
+def wait_bot_ready(timeout: float = STARTUP_TIMEOUT) -> bool:
+    """Готов ли бот; пока идет фоновая инициализация - ждет ее не дольше timeout"""
+    if _bot_ready.is_set():
+        return True
+    start_bot_background()
+    _startup_done.wait(timeout)
+    return _bot_ready.is_set()
+
+
+@app.before_request
+def warm_up():
+    """Первый запрос к воркеру запускает инициализацию, если она еще не началась"""
+    if not _bot_ready.is_set():
+        start_bot_background()
 
 
 # ========== WEBHOOK МАРШРУТЫ ==========
@@ -155,16 +387,23 @@ def create_and_initialize_bot() -> bool:
 def webhook_handler():
     """Обработчик вебхука от Telegram"""
 
-    if telegram_app is None:
+    if not wait_bot_ready():
         logger.error("❌ Бот не инициализирован!")
+        WEBHOOK_RESULT['not_initialized'].inc()
         return 'Bot not initialized', 500
 
     if request.headers.get('Content-Type') != 'application/json':
         logger.error("❌ Неверный тип контента")
+        WEBHOOK_RESULT['bad_request'].inc()
         return 'Invalid content type', 400
 
     try:
         data = json.loads(request.data.decode('utf-8'))
+        if not isinstance(data, dict) or 'update_id' not in data:
+            logger.error("❌ Некорректное обновление")
+            WEBHOOK_RESULT['bad_request'].inc()
+            return 'Invalid update', 400
+        from telegram import Update
         update = Update.de_json(data, telegram_app.bot)
 
         # Логируем входящее сообщение
@@ -173,12 +412,17 @@ def webhook_handler():
             text = update.message.text or "(без текста)"
             logger.info(f"📨 [{user_id}]: '{text}'")
 
-        # Обрабатываем обновление
-        run_async_safe(telegram_app.process_update(update))
+        # Ставим в очередь и сразу отвечаем Telegram
+        if not update_queue.submit(update):
+            logger.warning("⚠️ Очередь обновлений переполнена, Telegram повторит доставку")
+            WEBHOOK_RESULT['queue_full'].inc()
+            return 'Queue full', 503
+        WEBHOOK_RESULT['ok'].inc()
         return 'OK', 200
 
     except Exception as webhook_error:
         logger.error(f"❌ Ошибка webhook: {webhook_error}", exc_info=True)
+        WEBHOOK_RESULT['error'].inc()
         return 'Internal error', 500
 
 
@@ -186,7 +430,7 @@ def webhook_handler():
 def set_webhook_handler():
     """Установка вебхука для бота"""
 
-    if telegram_app is None:
+    if not wait_bot_ready():
         return """
         <!DOCTYPE html>
         <html>
@@ -255,7 +499,7 @@ def set_webhook_handler():
 @app.route('/delete_webhook', methods=['GET'])
 def delete_webhook_handler():
     """Удаление вебхука (для сброса)"""
-    if telegram_app is None:
+    if not wait_bot_ready():
         return "Бот не инициализирован", 500
 
     try:
@@ -281,8 +525,9 @@ def home_handler():
     """Главная страница"""
     token_set = bool(TELEGRAM_TOKEN and TELEGRAM_TOKEN != "your_bot_token_here")
     token_preview = TELEGRAM_TOKEN[:10] + "..." if token_set else "Не установлен"
-    bot_status = "✅ ИНИЦИАЛИЗИРОВАН" if telegram_app else "❌ НЕ ИНИЦИАЛИЗИРОВАН"
-    db_status = "✅ ПОДКЛЮЧЕНА" if db else "❌ НЕ ПОДКЛЮЧЕНА"
+    bot_ready = _bot_ready.is_set()
+    bot_status = "✅ ИНИЦИАЛИЗИРОВАН" if bot_ready else "❌ НЕ ИНИЦИАЛИЗИРОВАН"
+    db_status = "✅ ПОДКЛЮЧЕНА" if db_ready() else "❌ НЕ ПОДКЛЮЧЕНА"
 
     return f"""
     <!DOCTYPE html>
@@ -304,7 +549,7 @@ def home_handler():
     <body>
         <h1>🤖 TgBot - Учет расходов</h1>
 
-        <div class="status {'ok' if telegram_app else 'error'}">
+        <div class="status {'ok' if bot_ready else 'error'}">
             <strong>Статус бота:</strong> {bot_status}
         </div>
 
@@ -312,7 +557,7 @@ def home_handler():
             <strong>Токен:</strong> {token_preview}
         </div>
 
-        <div class="status {'ok' if db else 'error'}">
+        <div class="status {'ok' if db_ready() else 'error'}">
             <strong>База данных:</strong> {db_status}
         </div>
 
@@ -341,6 +586,106 @@ def home_handler():
     """
 
 
+@app.route('/export/<int:user_id>')
+def export_handler(user_id):
+    """Потоковая выгрузка расходов пользователя в CSV (?gzip=1 - сжатая)"""
+    if not EXPORT_API_TOKEN:
+        return 'Not found', 404
+
+    token = request.headers.get('Authorization', '').removeprefix('Bearer ')
+    if not hmac.compare_digest(token.encode(), EXPORT_API_TOKEN.encode()):
+        return 'Unauthorized', 401
+
+    compress = request.args.get('gzip') == '1'
+    filename = f"expenses_{user_id}.csv" + ('.gz' if compress else '')
+    load_components()
+    # Ответ уходит кусками (chunked) по мере чтения серверного курсора
+    body = iter_encoded(iter_csv(db.iter_expenses(user_id)), compress)
+    return Response(
+        body,
+        content_type='application/gzip' if compress else 'text/csv; charset=utf-8',
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+
+def collect_runtime_metrics():
+    """Метрики, которые считываются из статистики компонентов в момент запроса"""
+    queue = update_queue.stats()
+    # До load_components() (LAZY_START) часть компонентов еще не создана
+    pool = db.get_pool_stats() if db_ready() else {}
+    async_pool = adb.get_pool_stats() if adb is not None else {}
+    cache = adb.get_cache_stats() if adb is not None else {}
+    sending = outbound.stats() if outbound is not None else None
+
+    metrics = [
+        ('tgbot_update_queue_depth', 'gauge', 'Обновлений в очереди и в обработке',
+         [({}, queue['depth'])]),
+        ('tgbot_update_queue_in_flight', 'gauge', 'Обновлений в обработке',
+         [({}, queue['in_flight'])]),
+        ('tgbot_update_queue_rejected_total', 'counter', 'Обновлений отклонено из-за переполнения',
+         [({}, queue['rejected'])]),
+        ('tgbot_update_queue_processed_total', 'counter', 'Обработано обновлений',
+         [({}, queue['processed'])]),
+        ('tgbot_update_queue_wait_seconds_total', 'counter', 'Суммарное ожидание обновлений в очереди',
+         [({}, queue['wait_seconds_total'])]),
+        ('tgbot_update_queue_wait_seconds_max', 'gauge', 'Максимальное ожидание обновления в очереди',
+         [({}, queue['wait_seconds_max'])]),
+        ('tgbot_startup_seconds', 'gauge', 'Секунд от запуска процесса до готовности бота',
+         [({}, startup_seconds)] if startup_seconds is not None else []),
+        ('tgbot_db_connect_seconds_total', 'counter', 'Суммарное время открытия соединений с БД', [
+            ({'pool': 'sync'}, pool.get('connect_seconds', 0.0)),
+            ({'pool': 'async'}, async_pool.get('connections_ms', 0) / 1000),
+        ]),
+        ('tgbot_db_connections_opened_total', 'counter', 'Открыто соединений с БД', [
+            ({'pool': 'sync'}, pool.get('connections_opened', 0)),
+            ({'pool': 'async'}, async_pool.get('connections_num', 0)),
+        ]),
+        ('tgbot_db_pool_in_use', 'gauge', 'Выданных соединений пула', [
+            ({'pool': 'sync'}, pool.get('in_use', 0)),
+            ({'pool': 'async'}, async_pool.get('pool_size', 0) - async_pool.get('pool_available', 0)),
+        ]),
+    ]
+    if sending:
+        # Только самые длинные очереди: число рядов не растет с числом чатов
+        deepest = sorted(sending['chat_depths'].items(), key=lambda item: item[1], reverse=True)[:20]
+        metrics.extend([
+            ('tgbot_outbound_queue_depth', 'gauge', 'Исходящих запросов в ожидании отправки',
+             [({}, sending['depth'])]),
+            ('tgbot_outbound_chat_queue_depth', 'gauge', 'Исходящих запросов в ожидании по чатам (20 самых длинных очередей)',
+             [({'chat': chat_id}, depth) for chat_id, depth in deepest]),
+            ('tgbot_outbound_chats_waiting', 'gauge', 'Чатов с ожидающими отправки запросами',
+             [({}, sending['chats_waiting'])]),
+            ('tgbot_outbound_requests_total', 'counter', 'Исходящие запросы по результату', [
+                ({'result': 'sent'}, sending['sent']),
+                ({'result': 'coalesced'}, sending['coalesced']),
+                ({'result': 'failed'}, sending['failed']),
+            ]),
+            ('tgbot_outbound_retry_after_total', 'counter', 'Ответов RetryAfter (flood control) от Telegram',
+             [({}, sending['retry_after'])]),
+            ('tgbot_outbound_wait_seconds_total', 'counter', 'Суммарное ожидание исходящих запросов в очереди',
+             [({}, sending['wait_seconds_total'])]),
+        ])
+    if cache:
+        metrics.extend([
+            ('tgbot_cache_requests_total', 'counter', 'Обращения к кешу чтения', [
+                ({'result': 'hit'}, cache['hits']),
+                ({'result': 'miss'}, cache['misses']),
+            ]),
+            ('tgbot_cache_hit_ratio', 'gauge', 'Доля попаданий в кеш', [({}, cache['hit_ratio'])]),
+            ('tgbot_cache_entries', 'gauge', 'Записей в кеше', [({}, cache['size'])]),
+        ])
+    return metrics
+
+
+REGISTRY.add_collector(collect_runtime_metrics)
+
+
+@app.route('/metrics')
+def metrics_handler():
+    """Метрики в текстовом формате Prometheus"""
+    return Response(REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 @app.route('/healthz')
 def health_check_handler():
     """Health check для Render - ВАЖНЫЙ МАРШРУТ!"""
@@ -348,11 +693,19 @@ def health_check_handler():
         "status": "healthy",
         "timestamp": time.time(),
         "service": "telegram-expense-bot",
-        "bot_initialized": bool(telegram_app),
-        "database_initialized": db is not None,
+        "bot_initialized": _bot_ready.is_set(),
+        "database_initialized": db_ready(),
+        "database_pool": db.get_pool_stats() if db_ready() else {},
+        "async_database_pool": adb.get_pool_stats() if adb is not None else {},
+        "cache": adb.get_cache_stats() if adb is not None else {},
+        "write_behind": adb.get_write_stats() if adb is not None else {},
+        "update_queue": update_queue.stats(),
+        "outbound": outbound.stats() if outbound is not None else {},
+        "state_persistence": persistence.stats() if persistence else {},
         "token_configured": TELEGRAM_TOKEN is not None and TELEGRAM_TOKEN != "your_bot_token_here",
         "version": "1.0.0",
-        "uptime": time.time() - start_time if 'start_time' in globals() else 0
+        "uptime": time.time() - start_time if 'start_time' in globals() else 0,
+        "startup_seconds": startup_seconds,
     }
 
     # Определяем общий статус
@@ -368,39 +721,59 @@ def health_check_handler():
 
 
 # ========== ЗАПУСК ПРИЛОЖЕНИЯ ==========
-start_time = time.time()
+_cleaned_up = False
 
 
 @atexit.register
 def cleanup():
-    """Очистка при завершении"""
+    """Очистка при завершении (повторный вызов ничего не делает)"""
+    global _cleaned_up
+    if _cleaned_up:
+        return
+    _cleaned_up = True
+
+    # Сначала дорабатываем уже принятые обновления
+    run_async_safe(update_queue.drain(UPDATE_DRAIN_TIMEOUT), timeout=UPDATE_DRAIN_TIMEOUT + 5)
     if telegram_app:
         logger.info("🧹 Очистка ресурсов бота...")
         run_async_safe(telegram_app.shutdown())
+    if adb is not None:
+        run_async_safe(adb.close())
+    if invalidation_listener:
+        invalidation_listener.stop()
+    bot_loop.stop()
+    if db_ready():
+        logger.info("🧹 Закрытие пула соединений БД...")
+        db.close()
 
 
 if __name__ == '__main__':
     logger.info("🚀 Запуск TgBot сервера...")
 
-    # Инициализируем бота
-    logger.info("🔄 Инициализация бота...")
-    success = create_and_initialize_bot()
+    if LAZY_START:
+        # Сервер начинает слушать порт сразу, бот поднимается в фоне
+        logger.info("🔄 Фоновая инициализация бота...")
+        start_bot_background()
+    else:
+        # Инициализируем бота
+        logger.info("🔄 Инициализация бота...")
+        success = start_bot()
 
-    if not success:
-        logger.error("❌ Не удалось инициализировать бота!")
-        exit(1)
+        if not success:
+            logger.error("❌ Не удалось инициализировать бота!")
+            exit(1)
 
-    logger.info("✅ Бот успешно инициализирован")
+        logger.info("✅ Бот успешно инициализирован")
 
-    # Запускаем Flask
+    # Запускаем Flask (сервер разработки; в продакшене - gunicorn -c gunicorn.conf.py app:app)
     port = int(os.environ.get('PORT', 10000))
     logger.info(f"🌐 Запуск Flask на порту {port}")
 
     print("=" * 50)
     print("🚀 TgBot запущен!")
     print(f"📌 Порт: {port}")
-    print(f"🤖 Бот: {'✅' if telegram_app else '❌'}")
-    print(f"🗄️  БД: {'✅' if db else '❌'}")
+    print(f"🤖 Бот: {'✅' if _bot_ready.is_set() else '⏳' if LAZY_START else '❌'}")
+    print(f"🗄️  БД: {'✅' if db_ready() else '⏳' if LAZY_START else '❌'}")
     print(f"🔗 Webhook: https://your-app.onrender.com/set_webhook")
     print(f"🩺 Health check: https://your-app.onrender.com/healthz")
     print("=" * 50)
@@ -0,0 +1,92 @@
+# benchmarks/async_concurrency.py
+# N пользователей одновременно запрашивают статистику. Синхронные вызовы
+# из корутин выполняются по очереди и блокируют loop, асинхронный слой
+# выполняет запросы параллельно.
+#
+# Первая строка результатов - запрос с задержкой на стороне сервера
+# (pg_sleep), как у медленного сетевого/дискового запроса. Вторая - реальный
+# get_expenses_by_category; на машине с одним ядром CPU-bound запросы
+# параллельно не ускорятся, выигрыш виден на задержках.
+import asyncio
+import time
+
+from benchmarks.common import BENCH_USER_BASE, seed_user, drop_bench_users, analyze, print_table
+from database_postgres import db
+from database_async import adb
+
+USERS = 8
+EXPENSES_PER_USER = 200_000
+QUERY_LATENCY = 0.1
+
+
+async def blocking_sleep(user_ids):
+    async def handler(_):
+        connection = db.get_connection()
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_sleep(%s)", (QUERY_LATENCY,))
+        finally:
+            db.release_connection(connection)
+    await asyncio.gather(*(handler(u) for u in user_ids))
+
+
+async def async_sleep(user_ids):
+    pool = await adb.get_pool()
+
+    async def handler(_):
+        async with pool.connection() as connection:
+            await connection.execute("SELECT pg_sleep(%s)", (QUERY_LATENCY,))
+    await asyncio.gather(*(handler(u) for u in user_ids))
+
+
+async def blocking_handlers(user_ids):
+    async def handler(user_id):
+        return db.get_expenses_by_category(user_id)
+    await asyncio.gather(*(handler(u) for u in user_ids))
+
+
+async def async_handlers(user_ids):
+    await asyncio.gather(*(adb.get_expenses_by_category(u) for u in user_ids))
+
+
+async def main():
+    user_ids = [BENCH_USER_BASE + i for i in range(USERS)]
+    connection = db.get_connection()
+    try:
+        drop_bench_users(connection)
+        for user_id in user_ids:
+            seed_user(connection, user_id, EXPENSES_PER_USER)
+        analyze(connection)
+    finally:
+        db.release_connection(connection)
+
+    await adb.get_pool()
+    await async_handlers(user_ids)
+
+    await async_sleep(user_ids)
+
+    rows = []
+    cases = (
+        (f'pg_sleep({QUERY_LATENCY})', blocking_sleep, async_sleep),
+        ('get_expenses_by_category', blocking_handlers, async_handlers),
+    )
+    for name, sync_fn, async_fn in cases:
+        timings = []
+        for fn in (sync_fn, async_fn):
+            started = time.perf_counter()
+            await fn(user_ids)
+            timings.append((time.perf_counter() - started) * 1000)
+        rows.append((name, USERS, f"{timings[0]:.1f}", f"{timings[1]:.1f}", f"{timings[0] / timings[1]:.1f}x"))
+
+    print_table(('query', 'users', 'sync ms', 'async ms', 'speedup'), rows)
+
+    connection = db.get_connection()
+    try:
+        drop_bench_users(connection)
+    finally:
+        db.release_connection(connection)
+    await adb.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
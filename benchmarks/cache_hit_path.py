@@ -0,0 +1,70 @@
+# benchmarks/cache_hit_path.py
+# Задержка чтения статистики через кеш: промах (запрос в БД) против
+# попадания, а также стоимость инвалидации после add_expense.
+import time
+import asyncio
+import statistics
+
+from benchmarks.common import BENCH_USER_BASE, seed_user, drop_bench_users, analyze, print_table
+from database_postgres import db
+from database_async import adb
+
+REPEAT = 2000
+EXPENSES = 10_000
+
+
+async def timed(coro_factory, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await coro_factory()
+        samples.append((time.perf_counter() - started) * 1_000_000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99)]
+
+
+async def main():
+    if not hasattr(adb, 'cache'):
+        print("Кеш выключен (CACHE_ENABLED=0)")
+        return
+
+    user_id = BENCH_USER_BASE
+    connection = db.get_connection()
+    try:
+        drop_bench_users(connection)
+        seed_user(connection, user_id, EXPENSES)
+        analyze(connection)
+    finally:
+        db.release_connection(connection)
+    db.rebuild_rollups(user_id)
+
+    database = adb._database
+    await database.get_user_summary(user_id, 'all')
+
+    rows = []
+    miss = await timed(lambda: database.get_user_summary(user_id, 'all'), 200)
+    rows.append(('get_user_summary (БД)', f"{miss[0]:.1f}", f"{miss[1]:.1f}"))
+
+    await adb.get_user_summary(user_id, 'all')
+    hit = await timed(lambda: adb.get_user_summary(user_id, 'all'), REPEAT)
+    rows.append(('get_user_summary (кеш)', f"{hit[0]:.1f}", f"{hit[1]:.1f}"))
+
+    async def invalidate_and_read():
+        adb.cache.invalidate(user_id)
+        await adb.get_user_summary(user_id, 'all')
+    after_write = await timed(invalidate_and_read, 200)
+    rows.append(('чтение после инвалидации', f"{after_write[0]:.1f}", f"{after_write[1]:.1f}"))
+
+    print_table(('path', 'p50 µs', 'p99 µs'), rows)
+    print(adb.get_cache_stats())
+
+    connection = db.get_connection()
+    try:
+        drop_bench_users(connection)
+    finally:
+        db.release_connection(connection)
+    await adb.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
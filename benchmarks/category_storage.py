@@ -0,0 +1,114 @@
+# benchmarks/category_storage.py
+# Размер таблицы и время /stats до и после миграции 0008: категория
+# названием (VARCHAR с эмодзи) против SMALLINT id из справочника.
+# Обе версии строятся рядом во временной схеме из одних и тех же строк
+# с индексом как idx_expenses_user_created; /stats считается по сырым
+# расходам, как до expense_rollups, чтобы сравнение шло по строкам expenses.
+#     DATABASE_URL=postgresql://... python -m benchmarks.category_storage
+import config
+from benchmarks.common import category_ids, measure, print_table
+from database_postgres import db
+
+ROWS = 5_000_000
+USERS = 10_000
+SCHEMA = 'bench_category_storage'
+
+STATS_QUERY = {
+    'category': f"""
+        SELECT category, SUM(amount) AS total
+        FROM {SCHEMA}.expenses_text
+        WHERE user_id = %s
+        GROUP BY category
+        ORDER BY total DESC
+    """,
+    'category_id': f"""
+        SELECT category_id, SUM(amount) AS total
+        FROM {SCHEMA}.expenses_id
+        WHERE user_id = %s
+        GROUP BY category_id
+        ORDER BY total DESC
+    """,
+}
+
+# Группировка по всей таблице - сравнение ключей заметнее, чем на одном пользователе
+GLOBAL_QUERY = {
+    'category': f"SELECT category, SUM(amount) FROM {SCHEMA}.expenses_text GROUP BY category",
+    'category_id': f"SELECT category_id, SUM(amount) FROM {SCHEMA}.expenses_id GROUP BY category_id",
+}
+
+
+def build(connection):
+    """Две копии одних и тех же расходов: с названием и с id категории"""
+    with connection.cursor() as cursor:
+        cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        cursor.execute(f"CREATE SCHEMA {SCHEMA}")
+        cursor.execute(f"""
+            CREATE TABLE {SCHEMA}.expenses_id AS
+            SELECT i AS id,
+                   (i %% %s)::bigint AS user_id,
+                   round((random() * 5000 + 1)::numeric, 2) AS amount,
+                   (%s::smallint[])[1 + (i %% %s)] AS category_id,
+                   'bench'::text AS description,
+                   now() - random() * interval '365 days' AS created_at
+            FROM generate_series(1, %s) AS i
+        """, (USERS, category_ids(), len(config.CATEGORIES), ROWS))
+        cursor.execute(f"""
+            CREATE TABLE {SCHEMA}.expenses_text AS
+            SELECT e.id, e.user_id, e.amount, c.name::varchar(50) AS category,
+                   e.description, e.created_at
+            FROM {SCHEMA}.expenses_id e
+            JOIN categories c ON c.id = e.category_id
+        """)
+        for table, column in (('expenses_text', 'category'), ('expenses_id', 'category_id')):
+            cursor.execute(f"""
+                CREATE INDEX ON {SCHEMA}.{table} (user_id, created_at DESC)
+                INCLUDE (id, amount, {column})
+            """)
+            cursor.execute(f"VACUUM ANALYZE {SCHEMA}.{table}")
+
+
+def sizes(connection, table):
+    """(heap, индексы) в мегабайтах"""
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT pg_table_size(%s::regclass), pg_indexes_size(%s::regclass)
+        """, (f'{SCHEMA}.{table}', f'{SCHEMA}.{table}'))
+        heap, indexes = cursor.fetchone()
+    return heap / 2**20, indexes / 2**20
+
+
+def main():
+    # Соединения пула в autocommit - VACUUM в build() выполняется
+    connection = db.get_connection()
+    rows = []
+    try:
+        build(connection)
+        for column, table in (('category', 'expenses_text'), ('category_id', 'expenses_id')):
+            heap_mb, index_mb = sizes(connection, table)
+
+            def stats():
+                with connection.cursor() as cursor:
+                    cursor.execute(STATS_QUERY[column], (USERS // 2,))
+                    cursor.fetchall()
+
+            def stats_all():
+                with connection.cursor() as cursor:
+                    cursor.execute(GLOBAL_QUERY[column])
+                    cursor.fetchall()
+
+            user_result = measure(stats, repeat=50)
+            all_result = measure(stats_all, repeat=5, warmup=1)
+            rows.append((column, f"{heap_mb:,.1f}", f"{index_mb:,.1f}",
+                         f"{user_result['p50_ms']:.2f}", f"{user_result['p95_ms']:.2f}",
+                         f"{all_result['p50_ms']:,.0f}"))
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP SCHEMA {SCHEMA} CASCADE")
+    finally:
+        db.release_connection(connection)
+
+    print(f"{ROWS:,} расходов, {USERS:,} пользователей")
+    print_table(('column', 'heap MB', 'index MB', '/stats p50 ms', '/stats p95 ms', 'GROUP BY all ms'), rows)
+
+
+if __name__ == '__main__':
+    main()
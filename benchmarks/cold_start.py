@@ -0,0 +1,147 @@
+# benchmarks/cold_start.py
+# Холодный старт gunicorn: сколько проходит от запуска процесса до
+# открытого порта, до первого ответа 200 на POST /webhook и до ответа
+# бота пользователю. Обычный старт (бот и схема БД до приема запросов)
+# сравнивается с LAZY_START=1. Бот ходит в поддельный Bot API.
+#     DATABASE_URL=postgresql://... python -m benchmarks.cold_start
+import os
+import sys
+import json
+import time
+import signal
+import socket
+import statistics
+import threading
+import subprocess
+import http.client
+
+from benchmarks.common import print_table
+from benchmarks.fake_bot_api import FakeBotAPI
+
+RUNS = 5
+SERVER_PORT = 18081
+TOKEN = '123456:bench'
+CHAT_ID = 1000
+COMMAND = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app']
+TIMEOUT = 60
+
+MODES = (
+    ('обычный старт', {'LAZY_START': '0'}),
+    ('LAZY_START=1', {'LAZY_START': '1'}),
+)
+
+
+def start_update(update_id):
+    return json.dumps({
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': {'id': CHAT_ID, 'type': 'private'},
+            'from': {'id': CHAT_ID, 'is_bot': False, 'first_name': 'Bench'},
+            'text': '/start',
+            'entities': [{'type': 'bot_command', 'offset': 0, 'length': 6}],
+        },
+    }).encode()
+
+
+def port_open():
+    try:
+        with socket.create_connection(('127.0.0.1', SERVER_PORT), timeout=0.5):
+            return True
+    except OSError:
+        return False
+
+
+def post_webhook(update_id):
+    """Статус ответа на /webhook, None - сервер еще не слушает порт"""
+    try:
+        connection = http.client.HTTPConnection('127.0.0.1', SERVER_PORT, timeout=TIMEOUT)
+        connection.request('POST', '/webhook', body=start_update(update_id),
+                           headers={'Content-Type': 'application/json'})
+        response = connection.getresponse()
+        response.read()
+        connection.close()
+        return response.status
+    except (OSError, http.client.HTTPException):
+        return None
+
+
+def cold_start(env, replied):
+    """Секунды от запуска процесса до порта, ответа /webhook и ответа бота"""
+    replied.clear()
+    started = time.perf_counter()
+    process = subprocess.Popen(COMMAND, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while not port_open():
+            if time.perf_counter() - started > TIMEOUT or process.poll() is not None:
+                return None
+            time.sleep(0.005)
+        port_seconds = time.perf_counter() - started
+
+        update_id = 0
+        while True:
+            update_id += 1
+            status = post_webhook(update_id)
+            if status == 200:
+                break
+            if time.perf_counter() - started > TIMEOUT:
+                return None
+            time.sleep(0.01)
+        webhook_seconds = time.perf_counter() - started
+
+        if not replied.wait(TIMEOUT):
+            return None
+        reply_seconds = replied.at - started
+        return port_seconds, webhook_seconds, reply_seconds
+    finally:
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(60)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+class Reply(threading.Event):
+    """Первый ответ бота в чат бенчмарка (время по perf_counter)"""
+
+    at = None
+
+    def on_message(self, method, chat_id, text, at):
+        if chat_id == CHAT_ID and not self.is_set():
+            self.at = at
+            self.set()
+
+
+def median(samples):
+    return f"{statistics.median(samples):.2f}" if samples else '-'
+
+
+def main():
+    replied = Reply()
+    rows = []
+    with FakeBotAPI(replied.on_message) as api:
+        env = dict(
+            os.environ,
+            TELEGRAM_BOT_TOKEN=TOKEN,
+            TELEGRAM_API_URL=api.url,
+            PORT=str(SERVER_PORT),
+            WEB_CONCURRENCY='1',
+        )
+        for name, extra_env in MODES:
+            results = [cold_start(dict(env, **extra_env), replied) for _ in range(RUNS)]
+            done = [result for result in results if result]
+            rows.append((
+                name,
+                median([r[0] for r in done]),
+                median([r[1] for r in done]),
+                median([r[2] for r in done]),
+                RUNS - len(done),
+            ))
+
+    print(f"Медиана по {RUNS} запускам, секунд от запуска процесса")
+    print_table(('mode', 'port open', 'first /webhook 200', 'first reply', 'failed'), rows)
+
+
+if __name__ == '__main__':
+    main()
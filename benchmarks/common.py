@@ -0,0 +1,134 @@
+# benchmarks/common.py
+# Общие помощники для бенчмарков: генерация данных и замеры времени.
+# Запуск любого бенчмарка из корня репозитория:
+#     DATABASE_URL=postgresql://... python -m benchmarks.<имя>
+import time
+import statistics
+
+import config
+import queries
+from categories import CATEGORY_IDS
+
+# Диапазон user_id, который бенчмарки считают своим и очищают
+BENCH_USER_BASE = 900_000_000
+
+
+def category_ids():
+    """id встроенных категорий (справочник загружает database_postgres.db)"""
+    return [CATEGORY_IDS.id(category) for category in config.CATEGORIES]
+
+
+def seed_user(connection, user_id, expenses, days=365, offset_days=0):
+    """Пользователь с expenses расходами, равномерно за days дней до now() - offset_days"""
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            INSERT INTO users (user_id, username)
+            VALUES (%s, %s)
+            ON CONFLICT (user_id) DO NOTHING
+        """, (user_id, f'bench_{user_id}'))
+        cursor.execute("""
+            INSERT INTO expenses (user_id, amount, category_id, description, created_at)
+            SELECT %s,
+                   round((random() * 5000 + 1)::numeric, 2),
+                   (%s::smallint[])[1 + (i %% %s)],
+                   'bench',
+                   now() - make_interval(days => %s) - random() * make_interval(days => %s)
+            FROM generate_series(1, %s) AS i
+        """, (user_id, category_ids(), len(config.CATEGORIES), offset_days, days, expenses))
+
+
+def seed_population(connection, first_user_id, users, expenses_per_user, days=365):
+    """users пользователей подряд с first_user_id, по expenses_per_user расходов за days дней"""
+    if users <= 0:
+        return
+    last_user_id = first_user_id + users - 1
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            INSERT INTO users (user_id, username)
+            SELECT u, 'bench_' || u
+            FROM generate_series(%s::bigint, %s::bigint) AS u
+            ON CONFLICT (user_id) DO NOTHING
+        """, (first_user_id, last_user_id))
+        cursor.execute("""
+            INSERT INTO expenses (user_id, amount, category_id, description, created_at)
+            SELECT u,
+                   round((random() * 5000 + 1)::numeric, 2),
+                   (%s::smallint[])[1 + ((u + i) %% %s)],
+                   'bench',
+                   now() - random() * make_interval(days => %s)
+            FROM generate_series(%s::bigint, %s::bigint) AS u
+            CROSS JOIN generate_series(1, %s) AS i
+        """, (category_ids(), len(config.CATEGORIES), days, first_user_id, last_user_id, expenses_per_user))
+    seed_rollups(connection, first_user_id, last_user_id)
+
+
+def seed_rollups(connection, first_user_id, last_user_id):
+    """expense_rollups для пользователей из диапазона (seed_* пишут в expenses напрямую)"""
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            DELETE FROM expense_rollups WHERE user_id BETWEEN %s AND %s
+        """, (first_user_id, last_user_id))
+        cursor.execute("""
+            INSERT INTO expense_rollups (user_id, period_kind, period_start, category_id, total, expense_count)
+            SELECT e.user_id,
+                   k.kind,
+                   CASE k.kind WHEN 'd' THEN e.created_at::date
+                               ELSE date_trunc('month', e.created_at)::date END,
+                   e.category_id,
+                   SUM(e.amount),
+                   COUNT(*)
+            FROM expenses e
+            CROSS JOIN (VALUES ('d'), ('m')) AS k(kind)
+            WHERE e.user_id BETWEEN %s AND %s
+            GROUP BY 1, 2, 3, 4
+        """, (first_user_id, last_user_id))
+
+
+def drop_bench_users(connection):
+    """Удаление всех пользователей бенчмарков (расходы удаляются каскадно)"""
+    with connection.cursor() as cursor:
+        cursor.execute("DELETE FROM users WHERE user_id >= %s", (BENCH_USER_BASE,))
+
+
+def analyze(connection):
+    """Разделы для засеянных месяцев (иначе строки остаются в expenses_default) и статистика"""
+    with connection.cursor() as cursor:
+        cursor.execute(queries.ENSURE_EXPENSE_PARTITIONS, (0,))
+        cursor.execute("ANALYZE users")
+        cursor.execute("ANALYZE expenses")
+        cursor.execute("ANALYZE expense_rollups")
+
+
+def measure(fn, repeat=50, warmup=3, setup=None):
+    """Время вызова fn: медиана, p95 и среднее в миллисекундах.
+
+    setup() вызывается перед каждым вызовом и в замер не входит
+    (например, чтобы заново подготовить данные для удаления).
+    """
+    for _ in range(warmup):
+        if setup:
+            setup()
+        fn()
+    samples = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        'p50_ms': statistics.median(samples),
+        'p95_ms': samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        'mean_ms': statistics.fmean(samples),
+    }
+
+
+def print_table(headers, rows):
+    """Вывод результатов простой текстовой таблицей"""
+    widths = [max(len(str(h)), *(len(str(r[i])) for r in rows)) for i, h in enumerate(headers)]
+    line = '  '.join(str(h).ljust(w) for h, w in zip(headers, widths))
+    print(line)
+    print('-' * len(line))
+    for row in rows:
+        print('  '.join(str(c).ljust(w) for c, w in zip(row, widths)))
@@ -0,0 +1,67 @@
+# benchmarks/date_range_queries.py
+# Время /today и /month при росте истории пользователя от 1k до 1M строк.
+# В текущем месяце у пользователя всегда одинаковое число расходов, остальная
+# история - старше месяца. Старые запросы (DATE()/EXTRACT()) сравниваются с
+# полуоткрытыми диапазонами из queries.py, которые идут по индексу
+# idx_expenses_user_created.
+import queries
+from benchmarks.common import BENCH_USER_BASE, seed_user, drop_bench_users, analyze, measure, print_table
+from database_postgres import db
+
+HISTORY_SIZES = (1_000, 10_000, 100_000, 1_000_000)
+RECENT_EXPENSES = 200
+
+OLD_TODAY_EXPENSES = """
+    SELECT id, amount, category_id, description, created_at
+    FROM expenses
+    WHERE user_id = %s
+    AND DATE(created_at) = CURRENT_DATE
+    ORDER BY created_at DESC
+"""
+
+OLD_MONTH_EXPENSES = """
+    SELECT id, amount, category_id, description, created_at
+    FROM expenses
+    WHERE user_id = %s
+    AND EXTRACT(MONTH FROM created_at) = EXTRACT(MONTH FROM CURRENT_DATE)
+    AND EXTRACT(YEAR FROM created_at) = EXTRACT(YEAR FROM CURRENT_DATE)
+    ORDER BY created_at DESC
+"""
+
+CASES = (
+    ('today (DATE())', OLD_TODAY_EXPENSES),
+    ('today (range)', queries.TODAY_EXPENSES),
+    ('month (EXTRACT)', OLD_MONTH_EXPENSES),
+    ('month (range)', queries.MONTH_EXPENSES),
+)
+
+
+def main():
+    connection = db.get_connection()
+    rows = []
+    try:
+        drop_bench_users(connection)
+        for i, size in enumerate(HISTORY_SIZES):
+            user_id = BENCH_USER_BASE + i
+            # Свежие расходы: последние сутки (часть попадает в "сегодня")
+            seed_user(connection, user_id, RECENT_EXPENSES, days=1)
+            # История старше текущего месяца, по несколько лет назад
+            seed_user(connection, user_id, size - RECENT_EXPENSES, days=3 * 365, offset_days=32)
+            analyze(connection)
+
+            for name, sql in CASES:
+                def run():
+                    with connection.cursor() as cursor:
+                        cursor.execute(sql, (user_id,))
+                        cursor.fetchall()
+                result = measure(run, repeat=20)
+                rows.append((f"{size:,}", name, f"{result['p50_ms']:.2f}", f"{result['p95_ms']:.2f}"))
+        drop_bench_users(connection)
+    finally:
+        db.release_connection(connection)
+
+    print_table(('history rows', 'query', 'p50 ms', 'p95 ms'), rows)
+
+
+if __name__ == '__main__':
+    main()
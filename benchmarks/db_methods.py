@@ -0,0 +1,328 @@
+# benchmarks/db_methods.py
+# Все методы PostgreSQLDatabase на разных объемах данных.
+#
+# Фикстуры: профильные пользователи с --sizes расходами (по умолчанию
+# 100, 10k и 1M, равномерно за три года) и "население" из --populations
+# пользователей (10 ... 1M, по --per-user расходов за год). Население
+# наращивается от меньшего к большему, профили засеваются один раз.
+# Генерация детерминирована (--seed -> setseed).
+#
+# Для каждого метода: p50/p95 одного вызова, строк за вызов (возвращено,
+# записано или обработано), строк/с и round-trip'ы до сервера - execute
+# и FETCH серверных курсоров (ROLLBACK в конце iter_expenses не виден).
+# Удаляющие методы работают с копией профиля, копия готовится вне замера.
+# Замеры идут на пуле с настройками рабочего (в том числе PREPARE частых
+# запросов на каждом соединении), только размер пула - 1..2.
+# Затем EXPLAIN (ANALYZE, BUFFERS) каждого запроса в транзакции с откатом.
+#     DATABASE_URL=postgresql://... python -m benchmarks.db_methods
+#     python -m benchmarks.db_methods --sizes 100,10000 --populations 10,10000 --explain none
+import sys
+import json
+import logging
+import argparse
+import itertools
+from decimal import Decimal
+
+from psycopg2 import extensions
+
+import config
+import queries
+from categories import CATEGORY_IDS
+from benchmarks.common import (
+    BENCH_USER_BASE, seed_user, seed_population, seed_rollups, drop_bench_users,
+    analyze, measure, print_table,
+)
+from database_pool import ConnectionPool
+from database_postgres import db, expense_columns, page_params
+
+# Диапазоны user_id внутри BENCH_USER_BASE
+CLONE_OFFSET = 100
+NEW_USERS_BASE = BENCH_USER_BASE + 10_000
+FILLER_BASE = BENCH_USER_BASE + 10_000_000
+
+BATCH_SIZE = 100
+
+
+class RoundTrips:
+    count = 0
+
+
+class CountingCursor(extensions.cursor):
+    """Курсор, который считает запросы к серверу"""
+
+    def execute(self, query, vars=None):
+        RoundTrips.count += 1
+        return super().execute(query, vars)
+
+    def executemany(self, query, vars_list):
+        RoundTrips.count += 1
+        return super().executemany(query, vars_list)
+
+    def copy_expert(self, sql, file, size=8192):
+        RoundTrips.count += 1
+        return super().copy_expert(sql, file, size)
+
+    def fetchmany(self, size=None):
+        # Серверный курсор делает FETCH на каждый вызов, обычный - читает буфер
+        if self.name is not None:
+            RoundTrips.count += 1
+        return super().fetchmany(self.arraysize if size is None else size)
+
+    def fetchall(self):
+        if self.name is not None:
+            RoundTrips.count += 1
+        return super().fetchall()
+
+    def __iter__(self):
+        if self.name is None:
+            yield from super().__iter__()
+            return
+        while True:
+            rows = self.fetchmany(self.itersize)
+            if not rows:
+                return
+            yield from rows
+
+
+def install_counter():
+    """Пул db с CountingCursor на всех соединениях.
+
+    Настройки и configure (PREPARE частых запросов) берутся из рабочего
+    пула, чтобы методы шли тем же путем, что в продакшене. PREPARE
+    выполняется обычным курсором и в round-trip'ы не попадает.
+    """
+    database = db.get()
+    pool = database.connection_pool
+
+    def configure(connection):
+        if pool.configure:
+            pool.configure(connection)
+        connection.cursor_factory = CountingCursor
+
+    database.close()
+    database.connection_pool = ConnectionPool(
+        pool.dsn,
+        min_size=1,
+        max_size=2,
+        timeout=pool.timeout,
+        max_uses=pool.max_uses,
+        max_age=pool.max_age,
+        check_after=pool.check_after,
+        connect_timeout=pool.connect_timeout,
+        configure=configure,
+    )
+    database.connection_pool.open()
+
+
+def count_round_trips(fn, setup=None):
+    """Результат одного вызова fn и число его round-trip'ов"""
+    if setup:
+        setup()
+    RoundTrips.count = 0
+    result = fn()
+    return result, RoundTrips.count
+
+
+def clone_user(connection, source, target):
+    """Копия расходов и агрегатов source у target (прежние данные target удаляются)"""
+    with connection.cursor() as cursor:
+        cursor.execute(queries.CLEAR_USER_EXPENSES, {'user_id': target})
+        cursor.execute("""
+            INSERT INTO expenses (user_id, amount, category_id, description, created_at)
+            SELECT %s, amount, category_id, description, created_at
+            FROM expenses WHERE user_id = %s
+        """, (target, source))
+        rows = cursor.rowcount
+        cursor.execute("""
+            INSERT INTO expense_rollups (user_id, period_kind, period_start, category_id, total, expense_count)
+            SELECT %s, period_kind, period_start, category_id, total, expense_count
+            FROM expense_rollups WHERE user_id = %s
+        """, (target, source))
+    return rows
+
+
+def seed_profiles(connection, sizes):
+    for i, size in enumerate(sizes):
+        user_id = BENCH_USER_BASE + i
+        # Часть расходов - сегодня, чтобы дневные запросы не были пустыми
+        recent = max(1, size // 1000)
+        seed_user(connection, user_id, recent, days=0)
+        seed_user(connection, user_id, size - recent, days=3 * 365)
+        seed_user(connection, user_id + CLONE_OFFSET, 0)
+    seed_rollups(connection, BENCH_USER_BASE, BENCH_USER_BASE + CLONE_OFFSET + len(sizes))
+
+
+def method_cases(connection, user_id, new_user_ids):
+    """[(метод, вызов, строк по результату, setup или None)]"""
+    clone_id = user_id + CLONE_OFFSET
+    cloned = {'rows': 0}
+
+    def clone():
+        cloned['rows'] = clone_user(connection, user_id, clone_id)
+
+    # Запись идет в копию: профиль не меняется между прогонами
+    clone()
+    batch = [(clone_id, Decimal('10.00'), config.CATEGORIES[0], 'bench')] * BATCH_SIZE
+    page = db.get_expenses_page(user_id, 'month')
+    one = lambda result: 1
+
+    cases = [
+        ('add_user', lambda: db.add_user(next(new_user_ids), 'bench'), one, None),
+        ('add_expense', lambda: db.add_expense(clone_id, Decimal('10.00'), config.CATEGORIES[0], 'bench'), one, None),
+        ('add_expenses', lambda: db.add_expenses(batch), lambda result: BATCH_SIZE, None),
+        ('get_today_expenses', lambda: db.get_today_expenses(user_id), len, None),
+        ('get_month_expenses', lambda: db.get_month_expenses(user_id), len, None),
+        ('get_expenses_page month', lambda: db.get_expenses_page(user_id, 'month'),
+         lambda result: len(result['rows']), None),
+    ]
+    if page['has_older']:
+        last = page['rows'][-1]
+        cases.append(('get_expenses_page older',
+                      lambda: db.get_expenses_page(user_id, 'month', 'older', (last[4], last[0])),
+                      lambda result: len(result['rows']), None))
+    cases += [
+        ('iter_expenses', lambda: sum(1 for _ in db.iter_expenses(user_id)), lambda result: result, None),
+        ('get_expenses_by_category', lambda: db.get_expenses_by_category(user_id), len, None),
+        ('get_total_expenses', lambda: db.get_total_expenses(user_id), one, None),
+        ('get_user_summary all', lambda: db.get_user_summary(user_id, 'all'),
+         lambda result: len(result['by_category']) + 1, None),
+        ('get_user_summary today', lambda: db.get_user_summary(user_id, 'today'),
+         lambda result: len(result['by_category']) + 1, None),
+        ('get_today_total', lambda: db.get_today_total(user_id), one, None),
+        ('get_month_total', lambda: db.get_month_total(user_id), one, None),
+        ('verify_rollups', lambda: db.verify_rollups(clone_id), lambda result: cloned['rows'], clone),
+        ('rebuild_rollups', lambda: db.rebuild_rollups(clone_id), lambda result: cloned['rows'], clone),
+        ('clear_user_expenses', lambda: db.clear_user_expenses(clone_id), lambda result: cloned['rows'], clone),
+        ('delete_all_expenses', lambda: db.delete_all_expenses(clone_id), lambda result: cloned['rows'], clone),
+    ]
+    return cases
+
+
+def run_methods(connection, population, sizes, new_user_ids, args):
+    rows, results = [], []
+    for i, size in enumerate(sizes):
+        user_id = BENCH_USER_BASE + i
+        for name, call, count_rows, setup in method_cases(connection, user_id, new_user_ids):
+            # Подготовка копии для больших профилей дорогая - меньше повторов
+            repeat = args.repeat if setup is None else args.destructive_repeat
+            timing = measure(call, repeat=repeat, warmup=0 if setup else 3, setup=setup)
+            result, trips = count_round_trips(call, setup)
+            processed = count_rows(result)
+            rows_per_second = processed / (timing['mean_ms'] / 1000) if timing['mean_ms'] else 0.0
+            rows.append((f"{population:,}", f"{size:,}", name, f"{timing['p50_ms']:.2f}",
+                         f"{timing['p95_ms']:.2f}", f"{processed:,}", f"{rows_per_second:,.0f}", trips))
+            results.append({'population': population, 'expenses': size, 'method': name,
+                            **timing, 'rows': processed, 'rows_per_second': rows_per_second,
+                            'round_trips': trips})
+    print_table(('users', 'expenses', 'method', 'p50 ms', 'p95 ms', 'rows', 'rows/s', 'round-trips'), rows)
+    return results
+
+
+def explain_cases(user_id, new_user_id):
+    clone_id = user_id + CLONE_OFFSET
+    batch = [(user_id, Decimal('10.00'), config.CATEGORIES[0], 'bench')] * BATCH_SIZE
+    return [
+        ('ADD_USER', queries.ADD_USER, (new_user_id, 'bench', None, None, None), None),
+        ('ADD_EXPENSE', queries.ADD_EXPENSE, (user_id, Decimal('10.00'), CATEGORY_IDS.id(config.CATEGORIES[0]), 'bench'), None),
+        ('ADD_EXPENSES', queries.ADD_EXPENSES, expense_columns(batch), None),
+        ('TODAY_EXPENSES', queries.TODAY_EXPENSES, (user_id,), None),
+        ('MONTH_EXPENSES', queries.MONTH_EXPENSES, (user_id,), None),
+        ('EXPENSES_PAGE month', queries.EXPENSES_PAGE[('month', 'first')],
+         page_params(user_id, 'first', None, config.EXPENSES_PAGE_SIZE), None),
+        ('EXPORT_EXPENSES', queries.EXPORT_EXPENSES, (user_id,), None),
+        ('EXPENSES_BY_CATEGORY', queries.EXPENSES_BY_CATEGORY, (user_id,), None),
+        ('TOTAL_EXPENSES', queries.TOTAL_EXPENSES, (user_id,), None),
+        ('USER_SUMMARY all', queries.USER_SUMMARY['all'], (user_id,), None),
+        ('TODAY_TOTAL', queries.TODAY_TOTAL, (user_id,), None),
+        ('MONTH_TOTAL', queries.MONTH_TOTAL, (user_id,), None),
+        ('VERIFY_ROLLUPS', queries.VERIFY_ROLLUPS, {'user_id': user_id}, None),
+        # Пересборка идет после удаления агрегатов в той же транзакции
+        ('REBUILD_ROLLUPS', queries.REBUILD_ROLLUPS, {'user_id': clone_id},
+         (queries.DELETE_ROLLUPS, {'user_id': clone_id})),
+        ('CLEAR_USER_EXPENSES', queries.CLEAR_USER_EXPENSES, {'user_id': clone_id}, None),
+        ('DELETE_ALL_EXPENSES', queries.DELETE_ALL_EXPENSES, {'user_id': clone_id}, None),
+    ]
+
+
+def explain(connection, population, sizes, new_user_ids):
+    """EXPLAIN (ANALYZE, BUFFERS) запросов; изменения откатываются"""
+    for i, size in enumerate(sizes):
+        user_id = BENCH_USER_BASE + i
+        clone_user(connection, user_id, user_id + CLONE_OFFSET)
+        for name, sql, params, before in explain_cases(user_id, next(new_user_ids)):
+            with connection.cursor() as cursor:
+                cursor.execute("BEGIN")
+                try:
+                    if before:
+                        cursor.execute(*before)
+                    cursor.execute("EXPLAIN (ANALYZE, BUFFERS) " + sql, params)
+                    plan = [row[0] for row in cursor.fetchall()]
+                finally:
+                    cursor.execute("ROLLBACK")
+            print(f"\n=== {name}: {population:,} пользователей, {size:,} расходов ===")
+            print('\n'.join(plan))
+
+
+def parse_sizes(value):
+    return [int(item) for item in value.split(',') if item]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Методы PostgreSQLDatabase на разных объемах данных")
+    parser.add_argument('--sizes', type=parse_sizes, default=[100, 10_000, 1_000_000],
+                        help="расходов у профильных пользователей")
+    parser.add_argument('--populations', type=parse_sizes, default=[10, 10_000, 1_000_000],
+                        help="пользователей в базе")
+    parser.add_argument('--per-user', type=int, default=10, help="расходов у остальных пользователей")
+    parser.add_argument('--repeat', type=int, default=30, help="замеров на метод")
+    parser.add_argument('--destructive-repeat', type=int, default=3,
+                        help="замеров удаляющих методов (каждый готовит копию профиля)")
+    parser.add_argument('--explain', choices=('last', 'all', 'none'), default='last',
+                        help="планы запросов: для последнего населения, для каждого или без них")
+    parser.add_argument('--seed', type=float, default=0.42)
+    parser.add_argument('--save', help="сохранить результаты в JSON")
+    args = parser.parse_args()
+
+    sizes = args.sizes
+    populations = sorted(args.populations)
+    if len(sizes) > CLONE_OFFSET:
+        print(f"❌ Не больше {CLONE_OFFSET} профилей")
+        return 1
+
+    logging.disable(logging.INFO)
+    install_counter()
+    new_user_ids = itertools.count(NEW_USERS_BASE)
+    results = []
+
+    connection = db.get_connection()
+    try:
+        drop_bench_users(connection)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT setseed(%s)", (args.seed,))
+        print(f"🔄 Профили: {', '.join(f'{size:,}' for size in sizes)} расходов")
+        seed_profiles(connection, sizes)
+
+        # Профили и их копии - тоже пользователи
+        seeded = 0
+        for population in populations:
+            filler = max(0, population - 2 * len(sizes) - seeded)
+            print(f"🔄 Население {population:,}: +{filler:,} пользователей по {args.per_user} расходов")
+            seed_population(connection, FILLER_BASE + seeded, filler, args.per_user)
+            seeded += filler
+            analyze(connection)
+
+            results += run_methods(connection, population, sizes, new_user_ids, args)
+            if args.explain == 'all' or (args.explain == 'last' and population == populations[-1]):
+                explain(connection, population, sizes, new_user_ids)
+        drop_bench_users(connection)
+    finally:
+        db.release_connection(connection)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,95 @@
+# benchmarks/export_stream.py
+# Потоковая выгрузка расходов: время и пиковая память Python для
+# пользователей с разным числом расходов (вплоть до миллиона). Память
+# должна оставаться постоянной - строки идут из серверного курсора
+# кусками и сразу уходят в ответ/файл.
+#     DATABASE_URL=postgresql://... python -m benchmarks.export_stream
+import os
+import time
+import asyncio
+import logging
+import tempfile
+import tracemalloc
+
+from benchmarks.common import BENCH_USER_BASE, seed_user, drop_bench_users, analyze, print_table
+from database_postgres import db
+from database_async import AsyncPostgreSQLDatabase
+from exporter import iter_csv, iter_encoded, write_export
+
+SIZES = (10_000, 100_000, 1_000_000)
+
+
+def stream_http(user_id, compress):
+    """Как маршрут /export: байты ответа только считаются и отбрасываются"""
+    size = 0
+    for chunk in iter_encoded(iter_csv(db.iter_expenses(user_id)), compress):
+        size += len(chunk)
+    return size
+
+
+async def stream_file(database, user_id, compress):
+    """Как /export в боте: файл во временной папке"""
+    fd, path = tempfile.mkstemp()
+    os.close(fd)
+    try:
+        count = await write_export(database, user_id, path, compress)
+        return count, os.path.getsize(path)
+    finally:
+        os.remove(path)
+
+
+def traced(fn):
+    """Результат fn, время в секундах и пик выделенной памяти Python в МБ"""
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    connection = db.get_connection()
+    try:
+        drop_bench_users(connection)
+        for i, size in enumerate(SIZES):
+            seed_user(connection, BENCH_USER_BASE + i, size)
+        analyze(connection)
+    finally:
+        db.release_connection(connection)
+
+    logging.disable(logging.INFO)
+    database = AsyncPostgreSQLDatabase()
+    loop = asyncio.new_event_loop()
+
+    rows = []
+    try:
+        for i, size in enumerate(SIZES):
+            user_id = BENCH_USER_BASE + i
+            for compress in (False, True):
+                label = 'gzip' if compress else 'csv'
+
+                http_size, elapsed, peak = traced(lambda: stream_http(user_id, compress))
+                rows.append((size, f'HTTP {label}', f"{elapsed:.2f}", f"{http_size / 1024 / 1024:.1f}", f"{peak:.2f}"))
+
+                (count, file_size), elapsed, peak = traced(
+                    lambda: loop.run_until_complete(stream_file(database, user_id, compress))
+                )
+                assert count == size, f"выгружено {count} из {size}"
+                rows.append((size, f'bot {label}', f"{elapsed:.2f}", f"{file_size / 1024 / 1024:.1f}", f"{peak:.2f}"))
+    finally:
+        loop.run_until_complete(database.close())
+        loop.close()
+
+    print_table(['expenses', 'path', 'seconds', 'size MB', 'peak py MB'], rows)
+
+    connection = db.get_connection()
+    try:
+        drop_bench_users(connection)
+    finally:
+        db.release_connection(connection)
+
+
+if __name__ == '__main__':
+    main()
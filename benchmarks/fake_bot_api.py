@@ -0,0 +1,87 @@
+# benchmarks/fake_bot_api.py
+# Поддельный Bot API для бенчмарков: бот ходит сюда через
+# TELEGRAM_API_URL вместо api.telegram.org. Отвечает на getMe и
+# sendMessage, на остальное - ok; каждое сообщение передает в on_message.
+import json
+import time
+import threading
+from urllib.parse import parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BOT_USER = {'id': 123456, 'is_bot': True, 'first_name': 'Bench', 'username': 'bench_bot'}
+
+
+class FakeBotAPIHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length)
+        method = self.path.rsplit('/', 1)[-1]
+        self.server.count_call()
+
+        if method == 'getMe':
+            result = BOT_USER
+        elif method in ('sendMessage', 'editMessageText'):
+            params = self._params(body)
+            chat_id = int(params.get('chat_id', 0))
+            text = params.get('text', '')
+            self.server.on_message(method, chat_id, text, time.perf_counter())
+            result = {'message_id': 1, 'date': int(time.time()),
+                      'chat': {'id': chat_id, 'type': 'private'}, 'text': text}
+        else:
+            result = True
+
+        data = json.dumps({'ok': True, 'result': result}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _params(self, body):
+        """Параметры запроса бота: JSON или form-urlencoded (значения - JSON)"""
+        if self.headers.get('Content-Type', '').startswith('application/json'):
+            return json.loads(body or b'{}')
+        params = {}
+        for key, values in parse_qs(body.decode()).items():
+            try:
+                params[key] = json.loads(values[0])
+            except ValueError:
+                params[key] = values[0]
+        return params
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeBotAPI(ThreadingHTTPServer):
+    """Сервер в отдельном потоке: with FakeBotAPI() as api: ... api.url"""
+
+    daemon_threads = True
+
+    def __init__(self, on_message=None):
+        super().__init__(('127.0.0.1', 0), FakeBotAPIHandler)
+        self._on_message = on_message
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_port}"
+
+    def count_call(self):
+        with self._lock:
+            self.calls += 1
+
+    def on_message(self, method, chat_id, text, at):
+        if self._on_message:
+            self._on_message(method, chat_id, text, at)
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
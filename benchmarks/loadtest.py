@@ -0,0 +1,288 @@
+# benchmarks/loadtest.py
+# Нагрузочный тест вебхука синтетическими обновлениями Telegram.
+#
+# Каждый пользователь проходит сессию: /start, полный диалог /add (сумма,
+# категория, описание), /stats, /month - с паузой think между сообщениями.
+# Сессии стартуют так, чтобы суммарный поток был --rate обновлений/с
+# (открытая модель: отправка не ждет ответов). Бот отвечает в поддельный
+# Bot API, Postgres - локальный (DATABASE_URL).
+#
+# Отчет: пропускная способность, p50/p95/p99 ответа вебхука и полной
+# обработки (от POST до sendMessage бота), доля ошибок. Генерация
+# детерминирована (--seed), --save/--baseline сохраняют и сравнивают
+# результаты между запусками.
+#     DATABASE_URL=postgresql://... python -m benchmarks.loadtest --rate 50 --duration 30
+import os
+import sys
+import json
+import time
+import heapq
+import random
+import signal
+import argparse
+import threading
+import subprocess
+import http.client
+from collections import defaultdict, deque
+
+import config
+from benchmarks.common import BENCH_USER_BASE, drop_bench_users, print_table
+from benchmarks.fake_bot_api import FakeBotAPI
+from benchmarks.webhook_server import SERVER_PORT, TOKEN, wait_ready, percentile
+from database_postgres import db
+
+# Сообщений в одной сессии пользователя (см. session)
+SESSION_LENGTH = 7
+
+
+def message_update(update_id, user_id, text):
+    message = {
+        'message_id': update_id,
+        'date': int(time.time()),
+        'chat': {'id': user_id, 'type': 'private'},
+        'from': {'id': user_id, 'is_bot': False, 'first_name': f'User{user_id}', 'language_code': 'ru'},
+        'text': text,
+    }
+    if text.startswith('/'):
+        message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+    return {'update_id': update_id, 'message': message}
+
+
+def session(rng):
+    """Тексты сообщений одного пользователя"""
+    return [
+        '/start',
+        '/add',
+        f"{rng.randint(50, 5000)}{rng.choice(['', '.50', ',99'])}",
+        rng.choice(config.CATEGORIES),
+        rng.choice(['обед', 'такси до дома', 'подарок маме', 'продукты на неделю']),
+        '/stats',
+        '/month',
+    ]
+
+
+def build_schedule(rate, duration, think, seed):
+    """[(время отправки от старта, user_id, тело запроса)], отсортировано по времени"""
+    rng = random.Random(seed)
+    sessions_per_second = rate / SESSION_LENGTH
+    sessions = max(1, int(duration * sessions_per_second))
+
+    schedule = []
+    update_id = 0
+    for n in range(sessions):
+        user_id = BENCH_USER_BASE + n
+        started = n / sessions_per_second
+        for step, text in enumerate(session(rng)):
+            update_id += 1
+            at = started + step * think
+            body = json.dumps(message_update(update_id, user_id, text)).encode()
+            schedule.append((at, update_id, user_id, body))
+    schedule.sort()
+    return [(at, user_id, body) for at, _, user_id, body in schedule]
+
+
+class Recorder:
+    """Время отправки и ответа бота по каждому чату (ответы приходят по порядку)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sent = defaultdict(deque)
+        self.ack_ms = []
+        self.end_to_end_ms = []
+        self.http_errors = defaultdict(int)
+        self.bot_errors = 0
+        self.send_lag_ms = []
+
+    def sending(self, user_id, started):
+        """Отметка до запроса: ответ бота может прийти раньше ответа вебхука"""
+        with self._lock:
+            self._sent[user_id].append(started)
+
+    def sent(self, user_id, started, ack_ms, status, lag_ms):
+        with self._lock:
+            self.send_lag_ms.append(lag_ms)
+            if status == 200:
+                self.ack_ms.append(ack_ms)
+            else:
+                self.http_errors[status] += 1
+                # Обновление не принято - ответа на него не будет
+                pending = self._sent[user_id]
+                if started in pending:
+                    pending.remove(started)
+
+    def on_message(self, method, chat_id, text, at):
+        if method != 'sendMessage':
+            return
+        with self._lock:
+            pending = self._sent.get(chat_id)
+            if pending:
+                self.end_to_end_ms.append((at - pending.popleft()) * 1000)
+            if text.startswith('❌'):
+                self.bot_errors += 1
+
+    def unanswered(self):
+        with self._lock:
+            return sum(len(pending) for pending in self._sent.values())
+
+
+def replay(schedule, recorder, senders):
+    """Отправка по расписанию из senders потоков с keep-alive соединениями"""
+    heap = list(schedule)
+    heapq.heapify(heap)
+    lock = threading.Lock()
+    origin = time.perf_counter() + 0.2
+
+    def sender():
+        connection = http.client.HTTPConnection('127.0.0.1', SERVER_PORT, timeout=30)
+        while True:
+            with lock:
+                if not heap:
+                    break
+                at, user_id, body = heapq.heappop(heap)
+            delay = origin + at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            started = time.perf_counter()
+            recorder.sending(user_id, started)
+            try:
+                connection.request('POST', '/webhook', body=body, headers={'Content-Type': 'application/json'})
+                response = connection.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                status = 'connection'
+            finished = time.perf_counter()
+            recorder.sent(user_id, started, (finished - started) * 1000, status,
+                          max(0.0, (started - origin - at) * 1000))
+        connection.close()
+
+    threads = [threading.Thread(target=sender) for _ in range(senders)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - origin
+
+
+def summarize(args, schedule, recorder, send_seconds, total_seconds):
+    requests = len(schedule)
+    answered = len(recorder.end_to_end_ms)
+    http_errors = sum(recorder.http_errors.values())
+    ack = sorted(recorder.ack_ms)
+    e2e = sorted(recorder.end_to_end_ms)
+    lag = sorted(recorder.send_lag_ms)
+    return {
+        'params': {'rate': args.rate, 'duration': args.duration, 'think': args.think,
+                   'seed': args.seed, 'server': args.server, 'workers': args.workers},
+        'requests': requests,
+        'offered_rps': requests / send_seconds if send_seconds else 0.0,
+        'processed_rps': answered / total_seconds if total_seconds else 0.0,
+        'ack_p50_ms': percentile(ack, 0.5),
+        'ack_p95_ms': percentile(ack, 0.95),
+        'ack_p99_ms': percentile(ack, 0.99),
+        'e2e_p50_ms': percentile(e2e, 0.5),
+        'e2e_p95_ms': percentile(e2e, 0.95),
+        'e2e_p99_ms': percentile(e2e, 0.99),
+        'send_lag_p99_ms': percentile(lag, 0.99),
+        'http_error_rate': http_errors / requests if requests else 0.0,
+        'http_errors': {str(status): count for status, count in recorder.http_errors.items()},
+        'unanswered_rate': recorder.unanswered() / requests if requests else 0.0,
+        'bot_error_rate': recorder.bot_errors / answered if answered else 0.0,
+    }
+
+
+def print_report(result, baseline=None):
+    keys = [key for key, value in result.items() if isinstance(value, float) or isinstance(value, int)]
+    if baseline:
+        rows = []
+        for key in keys:
+            old = baseline.get(key)
+            change = f"{(result[key] - old) / old * 100:+.1f}%" if old else '-'
+            rows.append((key, f"{result[key]:.3f}", f"{old:.3f}" if old is not None else '-', change))
+        print_table(['metric', 'now', 'baseline', 'change'], rows)
+    else:
+        print_table(['metric', 'value'], [(key, f"{result[key]:.3f}") for key in keys])
+    if result['http_errors']:
+        print(f"HTTP ошибки: {result['http_errors']}")
+
+
+def server_command(args):
+    if args.server == 'flask':
+        return [sys.executable, 'app.py'], {}
+    extra = {'WEB_CONCURRENCY': str(args.workers)}
+    if args.workers > 1:
+        extra['STATE_BACKEND'] = 'postgres'
+    return [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app'], extra
+
+
+def cleanup_users():
+    connection = db.get_connection()
+    try:
+        drop_bench_users(connection)
+    finally:
+        db.release_connection(connection)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест /webhook")
+    parser.add_argument('--rate', type=float, default=50, help="обновлений в секунду")
+    parser.add_argument('--duration', type=float, default=30, help="секунд запуска новых сессий")
+    parser.add_argument('--think', type=float, default=1.0, help="пауза между сообщениями пользователя, с")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--senders', type=int, default=32, help="потоков отправки")
+    parser.add_argument('--server', choices=('gunicorn', 'flask'), default='gunicorn')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--drain', type=float, default=30, help="сколько ждать ответов после отправки, с")
+    parser.add_argument('--save', help="сохранить результат в JSON")
+    parser.add_argument('--baseline', help="сравнить с сохраненным результатом")
+    args = parser.parse_args()
+
+    schedule = build_schedule(args.rate, args.duration, args.think, args.seed)
+    recorder = Recorder()
+    cleanup_users()
+
+    command, extra_env = server_command(args)
+    with FakeBotAPI(on_message=recorder.on_message) as api:
+        env = dict(os.environ, TELEGRAM_BOT_TOKEN=TOKEN, TELEGRAM_API_URL=api.url,
+                   PORT=str(SERVER_PORT), **extra_env)
+        process = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            if not wait_ready():
+                print("❌ Сервер не запустился")
+                return 1
+
+            print(f"🔄 {len(schedule)} обновлений, {args.rate:g}/с, сервер: {args.server} x{args.workers}")
+            started = time.perf_counter()
+            send_seconds = replay(schedule, recorder, args.senders)
+
+            deadline = time.monotonic() + args.drain
+            while recorder.unanswered() and time.monotonic() < deadline:
+                time.sleep(0.1)
+            total_seconds = time.perf_counter() - started
+        finally:
+            process.send_signal(signal.SIGTERM)
+            try:
+                process.wait(60)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    cleanup_users()
+
+    result = summarize(args, schedule, recorder, send_seconds, total_seconds)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('params') != result['params']:
+            print(f"⚠️ Параметры отличаются от базового запуска: {baseline.get('params')}")
+    print_report(result, baseline)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,90 @@
+# benchmarks/prepared_statements.py
+# Частые запросы синхронного слоя: обычный execute против EXECUTE
+# подготовленного оператора на том же соединении. Planning Time берется
+# из EXPLAIN ANALYZE: подготовленный оператор после нескольких
+# выполнений переходит на сохраненный общий план и не планируется заново.
+#     DATABASE_URL=postgresql://... python -m benchmarks.prepared_statements
+import re
+from decimal import Decimal
+
+import config
+import queries
+from categories import CATEGORY_IDS
+from benchmarks.common import BENCH_USER_BASE, seed_user, seed_rollups, drop_bench_users, analyze, measure, print_table
+from database_postgres import db, prepare_statements
+
+HISTORY_SIZE = 10_000
+REPEAT = 200
+
+PLANNING_TIME = re.compile(r'Planning Time: ([\d.]+) ms')
+
+
+def cases(user_id):
+    """(имя оператора, запрос, параметры)"""
+    return [
+        ('add_expense', queries.ADD_EXPENSE, (user_id, Decimal('10.00'), CATEGORY_IDS.id(config.CATEGORIES[0]), 'bench')),
+        ('today_expenses', queries.TODAY_EXPENSES, (user_id,)),
+        ('month_expenses', queries.MONTH_EXPENSES, (user_id,)),
+        ('expenses_by_category', queries.EXPENSES_BY_CATEGORY, (user_id,)),
+        ('total_expenses', queries.TOTAL_EXPENSES, (user_id,)),
+        ('today_total', queries.TODAY_TOTAL, (user_id,)),
+        ('month_total', queries.MONTH_TOTAL, (user_id,)),
+    ]
+
+
+def planning_ms(cursor, sql, params):
+    """Planning Time запроса; изменения EXPLAIN ANALYZE откатываются"""
+    cursor.execute("BEGIN")
+    try:
+        cursor.execute("EXPLAIN (ANALYZE) " + sql, params)
+        plan = '\n'.join(row[0] for row in cursor.fetchall())
+    finally:
+        cursor.execute("ROLLBACK")
+    return float(PLANNING_TIME.search(plan).group(1))
+
+
+def main():
+    user_id = BENCH_USER_BASE
+    connection = db.get_connection()
+    rows = []
+    try:
+        drop_bench_users(connection)
+        seed_user(connection, user_id, HISTORY_SIZE, days=365)
+        seed_rollups(connection, user_id, user_id)
+        analyze(connection)
+        prepare_statements(connection)
+
+        with connection.cursor() as cursor:
+            for name, sql, params in cases(user_id):
+                execute_sql = queries.EXECUTE_STATEMENTS[name]
+
+                def plain():
+                    cursor.execute(sql, params)
+                    if cursor.description:
+                        cursor.fetchall()
+
+                def prepared():
+                    cursor.execute(execute_sql, params)
+                    if cursor.description:
+                        cursor.fetchall()
+
+                plain_result = measure(plain, repeat=REPEAT)
+                prepared_result = measure(prepared, repeat=REPEAT)
+                rows.append((
+                    name,
+                    f"{planning_ms(cursor, sql, params):.3f}",
+                    f"{planning_ms(cursor, execute_sql, params):.3f}",
+                    f"{plain_result['p50_ms']:.3f}",
+                    f"{prepared_result['p50_ms']:.3f}",
+                    f"{(1 - prepared_result['p50_ms'] / plain_result['p50_ms']) * 100:+.0f}%",
+                ))
+        drop_bench_users(connection)
+    finally:
+        db.release_connection(connection)
+
+    print(f"Пользователь с {HISTORY_SIZE:,} расходами, {REPEAT} вызовов на запрос")
+    print_table(('statement', 'plan ms', 'plan ms prepared', 'p50 ms', 'p50 ms prepared', 'saved'), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+# benchmarks/webhook_server.py
+# Запросов/с и задержки POST /webhook: сервер разработки Flask
+# (python app.py) против gunicorn (gunicorn.conf.py). Бот ходит в
+# поддельный Bot API (benchmarks.fake_bot_api), поэтому сеть не нужна.
+#     DATABASE_URL=postgresql://... python -m benchmarks.webhook_server
+import os
+import sys
+import json
+import time
+import signal
+import threading
+import subprocess
+import http.client
+
+from benchmarks.common import print_table
+from benchmarks.fake_bot_api import FakeBotAPI
+
+REQUESTS = 4000
+CLIENTS = 16
+SERVER_PORT = 18080
+TOKEN = '123456:bench'
+
+SERVERS = (
+    ('flask dev server', [sys.executable, 'app.py'], {}),
+    ('gunicorn gthread 1x8', [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app'],
+     {'WEB_CONCURRENCY': '1'}),
+    ('gunicorn gthread 2x8', [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app'],
+     {'WEB_CONCURRENCY': '2', 'STATE_BACKEND': 'postgres'}),
+)
+
+
+def update_body(i):
+    user_id = 1000 + i % 500
+    return json.dumps({
+        'update_id': i,
+        'message': {
+            'message_id': i,
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': {'id': user_id, 'is_bot': False, 'first_name': 'Bench'},
+            'text': '/categories',
+            'entities': [{'type': 'bot_command', 'offset': 0, 'length': 11}],
+        },
+    }).encode()
+
+
+def wait_ready(timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', SERVER_PORT, timeout=2)
+            connection.request('GET', '/healthz')
+            health = json.loads(connection.getresponse().read())
+            if health.get('bot_initialized'):
+                return True
+        except (OSError, ValueError):
+            pass
+        time.sleep(0.3)
+    return False
+
+
+def load(requests, clients):
+    """requests запросов из clients потоков (keep-alive, если сервер позволяет)"""
+    latencies, errors = [], []
+    counter = iter(range(requests))
+    lock = threading.Lock()
+
+    def client():
+        connection = http.client.HTTPConnection('127.0.0.1', SERVER_PORT, timeout=30)
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                break
+            started = time.perf_counter()
+            try:
+                connection.request('POST', '/webhook', body=update_body(i),
+                                   headers={'Content-Type': 'application/json'})
+                response = connection.getresponse()
+                response.read()
+                ok = response.status == 200
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                ok = False
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                (latencies if ok else errors).append(elapsed)
+        connection.close()
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started, sorted(latencies), len(errors)
+
+
+def percentile(samples, p):
+    return samples[min(len(samples) - 1, int(len(samples) * p))] if samples else 0.0
+
+
+def main():
+    with FakeBotAPI() as api:
+        env = dict(
+            os.environ,
+            TELEGRAM_BOT_TOKEN=TOKEN,
+            TELEGRAM_API_URL=api.url,
+            PORT=str(SERVER_PORT),
+            PYTHONUNBUFFERED='1',
+            # Меряем прием вебхука, а не обработку: очередь не должна отвечать 503
+            UPDATE_QUEUE_SIZE=str(REQUESTS * 2),
+        )
+
+        rows = []
+        for name, command, extra_env in SERVERS:
+            process = subprocess.Popen(command, env=dict(env, **extra_env),
+                                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                if not wait_ready():
+                    rows.append((name, '-', '-', '-', '-', 'не запустился'))
+                    continue
+                load(200, CLIENTS)  # прогрев
+                elapsed, latencies, errors = load(REQUESTS, CLIENTS)
+                rows.append((
+                    name,
+                    f"{len(latencies) / elapsed:,.0f}",
+                    f"{percentile(latencies, 0.5):.1f}",
+                    f"{percentile(latencies, 0.99):.1f}",
+                    f"{latencies[-1] if latencies else 0:.1f}",
+                    errors,
+                ))
+            finally:
+                process.send_signal(signal.SIGTERM)
+                try:
+                    process.wait(60)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+
+    print(f"{REQUESTS} запросов, {CLIENTS} клиентов, ответов Bot API: {api.calls}")
+    print_table(['server', 'req/s', 'p50 ms', 'p99 ms', 'max ms', 'errors'], rows)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+# benchmarks/write_behind.py
+# Пропускная способность добавления расходов (строк/с): отдельный INSERT
+# на каждый расход против отложенной записи пачками при одновременных
+# add_expense от многих пользователей, плюс прямая вставка add_expenses.
+import time
+import asyncio
+import logging
+
+import config
+from benchmarks.common import BENCH_USER_BASE, drop_bench_users, print_table
+from database_postgres import db
+from database_async import AsyncPostgreSQLDatabase
+from write_behind import ExpenseBatcher
+
+USERS = 50
+ROWS = 5000
+BATCH_SIZE = 100
+BATCH_DELAY = 0.01
+
+
+def expense(i):
+    return BENCH_USER_BASE + i % USERS, 100 + i % 900, config.CATEGORIES[i % len(config.CATEGORIES)], 'bench'
+
+
+async def concurrent_adds(database, rows):
+    """ROWS вызовов add_expense, не больше USERS одновременно (как от USERS пользователей)"""
+    semaphore = asyncio.Semaphore(USERS)
+
+    async def add(i):
+        async with semaphore:
+            return await database.add_expense(*expense(i))
+
+    results = await asyncio.gather(*(add(i) for i in range(rows)))
+    assert all(results), "не все расходы записаны"
+
+
+async def main():
+    connection = db.get_connection()
+    try:
+        drop_bench_users(connection)
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                "INSERT INTO users (user_id, username) VALUES (%s, 'bench')",
+                [(BENCH_USER_BASE + i,) for i in range(USERS)]
+            )
+    finally:
+        db.release_connection(connection)
+
+    # Логи по каждой вставке искажают замер
+    logging.disable(logging.INFO)
+
+    single = AsyncPostgreSQLDatabase()
+    single.batcher = None
+    batched = AsyncPostgreSQLDatabase()
+    batched.batcher = ExpenseBatcher(
+        batched.add_expenses, batched._insert_expense,
+        max_size=BATCH_SIZE, max_delay=BATCH_DELAY
+    )
+
+    rows = []
+    for name, database in (('single-row INSERT', single), (f'write-behind ({BATCH_SIZE}/{BATCH_DELAY * 1000:.0f} ms)', batched)):
+        await database.get_pool()
+        started = time.perf_counter()
+        await concurrent_adds(database, ROWS)
+        elapsed = time.perf_counter() - started
+        rows.append((name, ROWS, f"{elapsed:.2f}", f"{ROWS / elapsed:,.0f}"))
+        await database.close()
+
+    started = time.perf_counter()
+    for offset in range(0, ROWS, 1000):
+        db.add_expenses(expense(i) for i in range(offset, offset + 1000))
+    elapsed = time.perf_counter() - started
+    rows.append(('add_expenses (1000/оператор)', ROWS, f"{elapsed:.2f}", f"{ROWS / elapsed:,.0f}"))
+
+    logging.disable(logging.NOTSET)
+    print_table(('path', 'rows', 'seconds', 'rows/s'), rows)
+    print(batched.batcher.stats())
+    print('Агрегаты:', 'OK' if db.verify_rollups() == [] else 'расхождения!')
+
+    connection = db.get_connection()
+    try:
+        drop_bench_users(connection)
+    finally:
+        db.release_connection(connection)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,296 @@
+import os
+import time
+import select
+import logging
+import threading
+from datetime import date
+from collections import OrderedDict
+
+import psycopg2
+
+logger = logging.getLogger(__name__)
+
+# Параметры кеша (переопределяются переменными окружения)
+CACHE_ENABLED = os.environ.get('CACHE_ENABLED', '1') != '0'
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 10000))
+CACHE_TTL = float(os.environ.get('CACHE_TTL', 300))
+# local - инвалидация только внутри процесса, postgres - еще и через LISTEN/NOTIFY
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'local')
+
+# Канал, в который триггеры на expenses и category_aliases публикуют
+# user_id измененных пользователей
+INVALIDATION_CHANNEL = 'expense_cache'
+
+# Методы чтения, результаты которых кешируются, и методы записи,
+# после которых кеш пользователя сбрасывается
+READ_METHODS = (
+    'get_today_expenses', 'get_month_expenses',
+    'get_expenses_by_category', 'get_total_expenses',
+    'get_today_total', 'get_month_total',
+    'get_user_summary', 'get_expenses_page', 'get_category_aliases',
+)
+WRITE_METHODS = (
+    'add_expense', 'clear_user_expenses', 'delete_all_expenses', 'copy_expenses',
+    'set_category_alias', 'delete_category_alias',
+)
+
+# Методы, результат которых зависит от текущего дня или месяца (CURRENT_DATE
+# в запросах): период входит в ключ, чтобы после полуночи или смены месяца
+# не отдавать данные прошлого периода. Дата берется по часам процесса -
+# приложение и БД должны работать в одном часовом поясе (на Render - UTC)
+DAY_BOUND_METHODS = ('get_today_expenses', 'get_today_total', 'get_user_summary', 'get_expenses_page')
+MONTH_BOUND_METHODS = ('get_month_expenses', 'get_month_total')
+
+_MISSING = object()
+
+
+def period_key(name):
+    """Текущий день или месяц для методов, зависящих от даты, иначе None"""
+    if name in DAY_BOUND_METHODS:
+        return date.today().isoformat()
+    if name in MONTH_BOUND_METHODS:
+        return date.today().strftime('%Y-%m')
+    return None
+
+
+class UserCache:
+    """LRU-кеш результатов запросов с TTL и версиями пользователей.
+
+    Ключ записи включает текущую версию пользователя, поэтому
+    invalidate(user_id) за O(1) делает недоступными все его записи,
+    а старые вытесняются по LRU.
+
+    Версии выдаются из общего счетчика. Когда версий становится вдвое
+    больше max_entries, версии пользователей без записей в кеше удаляются,
+    а версией по умолчанию становится новое значение счетчика - так
+    запрос, начатый до удаления версии, не сохранит устаревший результат.
+    """
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._default_version = 0
+        self._counter = 0
+        self._epoch = 0
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'expirations': 0,
+            'invalidations': 0,
+            'versions_pruned': 0,
+        }
+
+    def _version(self, user_id):
+        return self._epoch, self._versions.get(user_id, self._default_version)
+
+    def _prune_versions(self):
+        """Удаление версий пользователей, у которых не осталось записей"""
+        cached_users = {key[0] for key in self._entries}
+        # Пользователи с записями на версии по умолчанию получают ее явно:
+        # версия по умолчанию сейчас сменится
+        for user_id in cached_users:
+            self._versions.setdefault(user_id, self._default_version)
+        pruned = [user_id for user_id in self._versions if user_id not in cached_users]
+        for user_id in pruned:
+            del self._versions[user_id]
+        self._counter += 1
+        self._default_version = self._counter
+        self._stats['versions_pruned'] += len(pruned)
+
+    def _key(self, user_id, name, args):
+        return user_id, self._version(user_id), name, args
+
+    def get(self, user_id, name, args=()):
+        """Значение из кеша или _MISSING"""
+        with self._lock:
+            key = self._key(user_id, name, args)
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return _MISSING
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self._stats['expirations'] += 1
+                self._stats['misses'] += 1
+                return _MISSING
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return value
+
+    def version(self, user_id):
+        with self._lock:
+            return self._version(user_id)
+
+    def put(self, user_id, name, args, value, version=None):
+        """Сохранение значения.
+
+        version - версия пользователя на момент начала запроса: если за
+        время запроса пришла инвалидация, устаревший результат не сохраняется.
+        """
+        with self._lock:
+            if version is not None and version != self._version(user_id):
+                return
+            key = self._key(user_id, name, args)
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def invalidate(self, user_id):
+        """Сброс всех записей пользователя"""
+        with self._lock:
+            self._counter += 1
+            self._versions[user_id] = self._counter
+            self._stats['invalidations'] += 1
+            if len(self._versions) > 2 * self.max_entries:
+                self._prune_versions()
+
+    def clear(self):
+        """Сброс всего кеша (например, после потери канала инвалидации)"""
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+            self._epoch += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+            stats['versions'] = len(self._versions)
+            stats['max_entries'] = self.max_entries
+            stats['ttl'] = self.ttl
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+
+class CachedAsyncDatabase:
+    """Кеширующая обертка над AsyncPostgreSQLDatabase.
+
+    Методы чтения отдают результат из кеша, методы записи после выполнения
+    сбрасывают кеш пользователя. Остальные атрибуты проксируются как есть.
+    Закешированные значения общие для всех вызывающих - не изменяйте их.
+    """
+
+    def __init__(self, database, cache):
+        self._database = database
+        self.cache = cache
+
+        for name in READ_METHODS:
+            setattr(self, name, self._cached_read(name))
+        for name in WRITE_METHODS:
+            setattr(self, name, self._invalidating_write(name))
+
+    def __getattr__(self, name):
+        return getattr(self._database, name)
+
+    def _cached_read(self, name):
+        method = getattr(self._database, name)
+
+        async def read(user_id, *args):
+            period = period_key(name)
+            key_args = args if period is None else args + (period,)
+            value = self.cache.get(user_id, name, key_args)
+            if value is not _MISSING:
+                return value
+            version = self.cache.version(user_id)
+            errors = self._database.error_count
+            value = await method(user_id, *args)
+            # Пустой результат из-за ошибки БД не кешируем
+            if self._database.error_count == errors:
+                self.cache.put(user_id, name, key_args, value, version)
+            return value
+
+        read.__name__ = name
+        read.__doc__ = method.__doc__
+        return read
+
+    def _invalidating_write(self, name):
+        method = getattr(self._database, name)
+
+        async def write(user_id, *args, **kwargs):
+            try:
+                return await method(user_id, *args, **kwargs)
+            finally:
+                self.cache.invalidate(user_id)
+
+        write.__name__ = name
+        write.__doc__ = method.__doc__
+        return write
+
+    async def add_expenses(self, rows):
+        rows = list(rows)
+        try:
+            return await self._database.add_expenses(rows)
+        finally:
+            for user_id in {row[0] for row in rows}:
+                self.cache.invalidate(user_id)
+
+    def get_cache_stats(self):
+        return self.cache.stats()
+
+
+class PostgresInvalidationListener:
+    """Общая инвалидация для нескольких процессов через LISTEN/NOTIFY.
+
+    Триггер на expenses (миграция 0004) публикует user_id при любой записи,
+    поток-слушатель сбрасывает кеш этого пользователя в своем процессе.
+    Если соединение теряется, кеш очищается целиком: уведомления за время
+    разрыва могли пропасть.
+    """
+
+    def __init__(self, connection_string, cache, channel=INVALIDATION_CHANNEL, reconnect_delay=5.0):
+        self.connection_string = connection_string
+        self.cache = cache
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='cache-invalidation', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            connection = None
+            try:
+                connection = psycopg2.connect(self.connection_string, connect_timeout=10)
+                connection.autocommit = True
+                with connection.cursor() as cursor:
+                    cursor.execute(f"LISTEN {self.channel}")
+                # Пока не слушали, могли пропустить уведомления
+                self.cache.clear()
+                logger.info(f"✅ Подписка на инвалидацию кеша ({self.channel})")
+
+                while not self._stop.is_set():
+                    if select.select([connection], [], [], 1.0) == ([], [], []):
+                        continue
+                    connection.poll()
+                    while connection.notifies:
+                        notify = connection.notifies.pop(0)
+                        try:
+                            self.cache.invalidate(int(notify.payload))
+                        except ValueError:
+                            self.cache.clear()
+            except Exception as e:
+                logger.error(f"❌ Ошибка канала инвалидации кеша: {e}")
+                self.cache.clear()
+                self._stop.wait(self.reconnect_delay)
+            finally:
+                if connection is not None:
+                    connection.close()
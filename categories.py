@@ -0,0 +1,131 @@
+import re
+
+from config import CATEGORIES
+
+_NON_LETTERS_RE = re.compile(r'[^\w\s]', re.UNICODE)
+_SPACES_RE = re.compile(r'\s+')
+
+# Префикс короче этого не считается совпадением ("до" - и "домашние", и "другое")
+MIN_PREFIX = 3
+# Опечатки ищутся только в словах не короче этого (иначе слишком много совпадений)
+MIN_FUZZY = 4
+
+
+def normalize_category(text):
+    """Название категории без эмодзи, лишних пробелов и регистра"""
+    return _SPACES_RE.sub(' ', _NON_LETTERS_RE.sub('', text)).strip().lower()
+
+
+def _deletions(word):
+    """Варианты слова без одной буквы"""
+    return {word[:i] + word[i + 1:] for i in range(len(word))}
+
+
+class CategoryMatcher:
+    """Поиск категории по тексту пользователя.
+
+    Индексы строятся один раз, поиск - несколько обращений к словарям:
+
+    * точное совпадение без эмодзи и регистра ("еда" -> "🍔 Еда");
+    * однозначный префикс названия или слова ("транс", "живот");
+    * одна опечатка (замена, пропуск, лишняя или переставленная буква):
+      в индексе лежат варианты слов без одной буквы, а запрос проверяется
+      вместе со своими такими вариантами - O(k) обращений для слова длины k.
+
+    Псевдонимы пользователя (нормализованный текст -> категория)
+    проверяются раньше всего.
+    """
+
+    def __init__(self, categories=CATEGORIES):
+        self.categories = tuple(categories)
+        self._order = {category: index for index, category in enumerate(self.categories)}
+        self._exact = {}
+        self._prefixes = {}
+        self._typos = {}
+
+        for category in self.categories:
+            name = normalize_category(category)
+            self._exact[name] = category
+            for key in {name, *name.split()}:
+                for size in range(MIN_PREFIX, len(key) + 1):
+                    self._prefixes.setdefault(key[:size], set()).add(category)
+                if len(key) >= MIN_FUZZY:
+                    for variant in _deletions(key) | {key}:
+                        self._typos.setdefault(variant, set()).add(category)
+
+    def exact(self, text, aliases=None):
+        """Категория по точному названию или псевдониму, иначе None"""
+        key = normalize_category(text)
+        if aliases and key in aliases:
+            return aliases[key]
+        return self._exact.get(key)
+
+    def _typo_matches(self, key):
+        if len(key) < MIN_FUZZY:
+            return set()
+        found = set()
+        for variant in _deletions(key) | {key}:
+            found |= self._typos.get(variant, set())
+        return found
+
+    def match(self, text, aliases=None):
+        """Категория по названию, псевдониму, префиксу или с опечаткой.
+
+        None, если ничего не подошло или подходит несколько категорий.
+        """
+        category = self.exact(text, aliases)
+        if category is not None:
+            return category
+
+        key = normalize_category(text)
+        prefixed = self._prefixes.get(key, ())
+        if len(prefixed) == 1:
+            return next(iter(prefixed))
+        if prefixed:
+            return None
+
+        typos = self._typo_matches(key)
+        if len(typos) == 1:
+            return next(iter(typos))
+        return None
+
+    def candidates(self, text):
+        """Категории, похожие на текст (для подсказки), в порядке списка"""
+        key = normalize_category(text)
+        found = set(self._prefixes.get(key, ())) | self._typo_matches(key)
+        return sorted(found, key=self._order.get)
+
+
+class CategoryIds:
+    """Соответствие названий категорий и их SMALLINT id в таблице categories.
+
+    Загружается из БД один раз на процесс (load), дальше перевод в обе
+    стороны - обращение к словарю, без JOIN в запросах.
+    """
+
+    def __init__(self):
+        self._ids = {}
+        self._names = {}
+
+    @property
+    def loaded(self):
+        return bool(self._ids)
+
+    def load(self, rows):
+        """rows - пары (id, название) из queries.SYNC_CATEGORIES"""
+        rows = list(rows)
+        self._ids = {name: category_id for category_id, name in rows}
+        self._names = {category_id: name for category_id, name in rows}
+
+    def id(self, name):
+        """id категории по названию (KeyError для неизвестной)"""
+        return self._ids[name]
+
+    def name(self, category_id):
+        """Название категории по id"""
+        return self._names.get(category_id, f"#{category_id}")
+
+
+# Общий индекс встроенных категорий и справочник id
+CATEGORY_MATCHER = CategoryMatcher()
+CATEGORY_IDS = CategoryIds()
@@ -24,5 +24,25 @@ COMMANDS = [
     ('month', 'Расходы за месяц'),
     ('stats', 'Статистика расходов'),
     ('categories', 'Список категорий'),
-    ('clear', 'Очистить все расходы')
-]
\ No newline at end of file
+    ('alias', 'Свои названия категорий'),
+    ('clear', 'Очистить все расходы'),
+    ('import', 'Импорт расходов из CSV'),
+    ('export', 'Выгрузка расходов в CSV')
+]
+
+# Сколько расходов показывать на одной странице /today и /month
+EXPENSES_PAGE_SIZE = 10
+
+# Сколько расходов можно добавить одним сообщением (/add 1500 еда обед)
+QUICK_ADD_MAX_LINES = 50
+
+# Импорт CSV: строк в одной пачке COPY, как часто сообщать о прогрессе
+# и максимальный размер файла (лимит скачивания Bot API - 20 МБ)
+IMPORT_CHUNK_SIZE = 5000
+IMPORT_PROGRESS_ROWS = 10000
+IMPORT_MAX_FILE_SIZE = 20 * 1024 * 1024
+
+# Экспорт CSV: строк за одно чтение серверного курсора и лимит
+# отправки файла ботом (Bot API - 50 МБ)
+EXPORT_FETCH_SIZE = 2000
+EXPORT_MAX_FILE_SIZE = 50 * 1024 * 1024
@@ -0,0 +1,539 @@
+import os
+import json
+import asyncio
+import logging
+
+from psycopg_pool import AsyncConnectionPool
+
+import queries
+from config import CATEGORIES, EXPENSES_PAGE_SIZE, EXPORT_FETCH_SIZE
+from categories import CATEGORY_IDS
+from metrics import timed_query
+from write_behind import ExpenseBatcher
+from cache import (
+    CACHE_ENABLED, CACHE_BACKEND,
+    UserCache, CachedAsyncDatabase, PostgresInvalidationListener,
+)
+from database_postgres import (
+    get_connection_string, empty_summary, build_summary,
+    page_params, empty_page, build_page, expense_columns, expense_rows, export_row,
+    POOL_MIN_SIZE, POOL_MAX_SIZE, POOL_TIMEOUT, POOL_MAX_AGE, PREPARED_STATEMENTS,
+)
+
+logger = logging.getLogger(__name__)
+
+# Отложенная запись расходов пачками (0 - каждый расход отдельным INSERT)
+WRITE_BEHIND = os.environ.get('WRITE_BEHIND', '0') != '0'
+WRITE_BATCH_SIZE = int(os.environ.get('WRITE_BATCH_SIZE', 100))
+WRITE_BATCH_DELAY = float(os.environ.get('WRITE_BATCH_DELAY', 0.05))
+
+
+def _columns(rows):
+    """Строки -> списки по столбцам (параметры для unnest)"""
+    return [list(column) for column in zip(*rows)]
+
+
+class AsyncPostgreSQLDatabase:
+    """Асинхронный слой БД для обработчиков бота (psycopg 3).
+
+    Повторяет операции PostgreSQLDatabase, но не блокирует event loop:
+    пока один запрос ждет ответа сервера, loop обслуживает других
+    пользователей. Синхронный PostgreSQLDatabase остается для скриптов.
+    """
+
+    def __init__(self):
+        self.connection_string = get_connection_string()
+        self.connection_pool = None
+        self._opened = False
+        self._open_lock = asyncio.Lock()
+        # Число ошибок запросов (по нему кеш отличает пустой результат от сбоя)
+        self.error_count = 0
+
+        self.batcher = None
+        if WRITE_BEHIND:
+            self.batcher = ExpenseBatcher(
+                self.add_expenses,
+                self._insert_expense,
+                max_size=WRITE_BATCH_SIZE,
+                max_delay=WRITE_BATCH_DELAY
+            )
+
+        if self.connection_string:
+            # Пул открывается при первом запросе внутри работающего event loop
+            self.connection_pool = AsyncConnectionPool(
+                self.connection_string,
+                min_size=POOL_MIN_SIZE,
+                max_size=POOL_MAX_SIZE,
+                timeout=POOL_TIMEOUT,
+                max_lifetime=POOL_MAX_AGE,
+                check=AsyncConnectionPool.check_connection,
+                # psycopg 3 сам готовит запрос после prepare_threshold выполнений
+                kwargs={
+                    'autocommit': True,
+                    'connect_timeout': 10,
+                    'prepare_threshold': 5 if PREPARED_STATEMENTS else None,
+                },
+                name='async-db',
+                open=False
+            )
+
+    async def get_pool(self):
+        """Открытый пул соединений"""
+        if not self.connection_pool:
+            logger.error("❌ DATABASE_URL не установлен")
+            return None
+
+        if not self._opened:
+            async with self._open_lock:
+                if not self._opened:
+                    await self.connection_pool.open()
+                    self._opened = True
+                    logger.info("✅ Асинхронный пул соединений открыт")
+        if not CATEGORY_IDS.loaded:
+            await self._load_categories()
+        return self.connection_pool
+
+    async def _load_categories(self):
+        """Справочник категорий в CATEGORY_IDS, если его еще не загрузил синхронный слой"""
+        try:
+            async with self.connection_pool.connection() as connection:
+                cursor = await connection.execute(queries.SYNC_CATEGORIES, (CATEGORIES,))
+                CATEGORY_IDS.load(await cursor.fetchall())
+        except Exception as e:
+            self.error_count += 1
+            logger.error(f"❌ Не удалось загрузить справочник категорий: {e}")
+
+    def get_pool_stats(self):
+        """Статистика пула соединений"""
+        if not self.connection_pool:
+            return {}
+        return self.connection_pool.get_stats()
+
+    def get_cache_stats(self):
+        """Статистика кеша (без кеша - пусто)"""
+        return {}
+
+    def get_write_stats(self):
+        """Статистика буфера отложенной записи (без буфера - пусто)"""
+        return self.batcher.stats() if self.batcher else {}
+
+    async def close(self):
+        """Запись буфера расходов и закрытие пула соединений"""
+        if self.batcher:
+            await self.batcher.close()
+        if self.connection_pool and self._opened:
+            await self.connection_pool.close()
+            self._opened = False
+
+    @timed_query('async')
+    async def add_user(self, user_id, username=None, first_name=None, last_name=None, language_code=None):
+        """Добавление пользователя"""
+        pool = await self.get_pool()
+        if not pool:
+            return False
+
+        try:
+            async with pool.connection() as connection:
+                await connection.execute(
+                    queries.ADD_USER,
+                    (user_id, username, first_name, last_name, language_code)
+                )
+            logger.info(f"✅ Пользователь {user_id} добавлен")
+            return True
+        except Exception as e:
+            self.error_count += 1
+            logger.error(f"❌ Ошибка добавления пользователя: {e}")
+            return False
+
+    @timed_query('async')
+    async def add_expense(self, user_id, amount, category, description=None):
+        """Добавление расхода (через буфер, если включен WRITE_BEHIND)"""
+        if self.batcher:
+            return await self.batcher.add(user_id, amount, category, description)
+        return await self._insert_expense(user_id, amount, category, description)
+
+    async def _insert_expense(self, user_id, amount, category, description=None):
+        pool = await self.get_pool()
+        if not pool:
+            return False
+
+        try:
+            async with pool.connection() as connection:
+                await connection.execute(
+                    queries.ADD_EXPENSE,
+                    (user_id, amount, CATEGORY_IDS.id(category), description)
+                )
+            logger.info(f"✅ Расход {amount} руб. добавлен для пользователя {user_id}")
+            return True
+        except Exception as e:
+            self.error_count += 1
+            logger.error(f"❌ Ошибка добавления расхода: {e}")
+            return False
+
+    @timed_query('async')
+    async def add_expenses(self, rows):
+        """Добавление пачки расходов одним оператором (см. PostgreSQLDatabase.add_expenses)"""
+        rows = list(rows)
+        if not rows:
+            return True
+
+        pool = await self.get_pool()
+        if not pool:
+            return False
+
+        try:
+            async with pool.connection() as connection:
+                await connection.execute(queries.ADD_EXPENSES, expense_columns(rows))
+            logger.info(f"✅ Добавлено расходов: {len(rows)}")
+            return True
+        except Exception as e:
+            self.error_count += 1
+            logger.error(f"❌ Ошибка добавления пачки расходов: {e}")
+            return False
+
+    @timed_query('async')
+    async def copy_expenses(self, user_id, rows):
+        """Загрузка пачки расходов пользователя через COPY.
+
+        rows - кортежи (amount, category, description, created_at), created_at
+        может быть None (тогда текущее время). Пачка пишется одной транзакцией
+        вместе с агрегатами. Возвращает число строк или None при ошибке.
+        """
+        pool = await self.get_pool()
+        if not pool:
+            return None
+
+        try:
+            async with pool.connection() as connection:
+                async with connection.transaction():
+                    await connection.execute(queries.CREATE_IMPORT_STAGING)
+                    async with connection.cursor() as cursor:
+                        count = 0
+                        async with cursor.copy(queries.COPY_IMPORT_STAGING) as copy:
+                            for amount, category, description, created_at in rows:
+                                category_id = CATEGORY_IDS.id(category)
+                                await copy.write_row((amount, category_id, description, created_at))
+                                count += 1
+                        await cursor.execute(queries.INSERT_FROM_IMPORT_STAGING, (user_id,))
+            logger.info(f"✅ Импортирована пачка расходов пользователя {user_id}")
+            return count
+        except Exception as e:
+            self.error_count += 1
+            logger.error(f"❌ Ошибка импорта расходов: {e}")
+            return None
+
+    @timed_query('async')
+    async def get_today_expenses(self, user_id):
+        """Получение расходов за сегодня"""
+        pool = await self.get_pool()
+        if not pool:
+            return []
+
+        try:
+            async with pool.connection() as connection:
+                cursor = await connection.execute(queries.TODAY_EXPENSES, (user_id,))
+                return expense_rows(await cursor.fetchall())
+        except Exception as e:
+            self.error_count += 1
+            logger.error(f"❌ Ошибка получения расходов за сегодня: {e}")
+            return []
+
+    @timed_query('async')
+    async def get_month_expenses(self, user_id):
+        """Получение расходов за текущий месяц"""
+        pool = await self.get_pool()
+        if not pool:
+            return []
+
+        try:
+            async with pool.connection() as connection:
+                cursor = await connection.execute(queries.MONTH_EXPENSES, (user_id,))
+                return expense_rows(await cursor.fetchall())
+        except Exception as e:
+            self.error_count += 1
+            logger.error(f"❌ Ошибка получения расходов за месяц: {e}")
+            return []
+
+    @timed_query('async')
+    async def get_expenses_page(self, user_id, period, direction='first', cursor=None, page_size=EXPENSES_PAGE_SIZE):
+        """Страница расходов за период (см. PostgreSQLDatabase.get_expenses_page)"""
+        pool = await self.get_pool()
+        if not pool:
+            return empty_page()
+
+        try:
+            async with pool.connection() as connection:
+                db_cursor = await connection.execute(
+                    queries.EXPENSES_PAGE[(period, direction)],
+                    page_params(user_id, direction, cursor, page_size)
+                )
+                return build_page(direction, await db_cursor.fetchall(), page_size)
+        except Exception as e:
+            self.error_count += 1
+            logger.error(f"❌ Ошибка получения страницы расходов: {e}")
+            return empty_page()
+
+    async def iter_expenses(self, user_id, fetch_size=EXPORT_FETCH_SIZE):
+        """Все расходы пользователя по одной строке (created_at, amount, category, description).
+
+        Читает именованный серверный курсор по fetch_size строк, поэтому
+        память не зависит от числа расходов. Соединение занято, пока
+        итерация не закончится. Ошибка БД пробрасывается - иначе обрыв
+        выгрузки нельзя отличить от ее конца.
+        """
+        pool = await self.get_pool()
+        if not pool:
+            raise RuntimeError("DATABASE_URL не установлен")
+
+        try:
+            async with pool.connection() as connection:
+                # Серверный курсор живет только внутри транзакции
+                async with connection.transaction():
+                    async with connection.cursor(name='export_expenses') as cursor:
+                        cursor.itersize = fetch_size
+                        await cursor.execute(queries.EXPORT_EXPENSES, (user_id,))
+                        async for row in cursor:
+                            yield export_row(row)
+        except Exception as e:
+            self.error_count += 1
+            logger.error(f"❌ Ошибка выгрузки расходов: {e}")
+            raise
+
+    @timed_query('async')
+    async def get_expenses_by_category(self, user_id):
+        """Получение статистики по категориям"""
+        pool = await self.get_pool()
+        if not pool:
+            return {}
+
+        try:
+            async with pool.connection() as connection:
+                cursor = await connection.execute(queries.EXPENSES_BY_CATEGORY, (user_id,))
+                result = await cursor.fetchall()
+                return {CATEGORY_IDS.name(row[0]): float(row[1]) for row in result}
+        except Exception as e:
+            self.error_count += 1
+            logger.error(f"❌ Ошибка получения статистики: {e}")
+            return {}
+
+    @timed_query('async')
+    async def get_total_expenses(self, user_id):
+        """Получение общей суммы расходов"""
+        pool = await self.get_pool()
+        if not pool:
+            return 0
+
+        try:
+            async with pool.connection() as connection:
+                cursor = await connection.execute(queries.TOTAL_EXPENSES, (user_id,))
+                result = await cursor.fetchone()
+                return float(result[0]) if result else 0
+        except Exception as e:
+            self.error_count += 1
+            logger.error(f"❌ Ошибка получения общей суммы: {e}")
+            return 0
+
+    @timed_query('async')
+    async def get_user_summary(self, user_id, period='all'):
+        """Сводка расходов одним запросом (см. PostgreSQLDatabase.get_user_summary)"""
+        pool = await self.get_pool()
+        if not pool:
+            return empty_summary(period)
+
+        try:
+            async with pool.connection() as connection:
+                cursor = await connection.execute(queries.USER_SUMMARY[period], (user_id,))
+                return build_summary(period, await cursor.fetchall())
+        except Exception as e:
+            self.error_count += 1
+            logger.error(f"❌ Ошибка получения сводки: {e}")
+            return empty_summary(period)
+
+    @timed_query('async')
+    async def get_today_total(self, user_id):
+        """Сумма расходов за сегодня"""
+        return await self._fetch_total(queries.TODAY_TOTAL, user_id)
+
+    @timed_query('async')
+    async def get_month_total(self, user_id):
+        """Сумма расходов за текущий месяц"""
+        return await self._fetch_total(queries.MONTH_TOTAL, user_id)
+
+    async def _fetch_total(self, query, user_id):
+        pool = await self.get_pool()
+        if not pool:
+            return 0
+
+        try:
+            async with pool.connection() as connection:
+                cursor = await connection.execute(query, (user_id,))
+                result = await cursor.fetchone()
+                return float(result[0]) if result else 0
+        except Exception as e:
+            self.error_count += 1
+            logger.error(f"❌ Ошибка получения суммы за период: {e}")
+            return 0
+
+    @timed_query('async')
+    async def clear_user_expenses(self, user_id):
+        """Очистка всех расходов пользователя"""
+        pool = await self.get_pool()
+        if not pool:
+            return False
+
+        try:
+            async with pool.connection() as connection:
+                await connection.execute(queries.CLEAR_USER_EXPENSES, {'user_id': user_id})
+            logger.info(f"✅ Расходы пользователя {user_id} очищены")
+            return True
+        except Exception as e:
+            self.error_count += 1
+            logger.error(f"❌ Ошибка очистки расходов: {e}")
+            return False
+
+    @timed_query('async')
+    async def delete_all_expenses(self, user_id):
+        """Удаление всех расходов пользователя, возвращает удаленную сумму (None при ошибке)"""
+        pool = await self.get_pool()
+        if not pool:
+            return None
+
+        try:
+            async with pool.connection() as connection:
+                cursor = await connection.execute(queries.DELETE_ALL_EXPENSES, {'user_id': user_id})
+                total = float((await cursor.fetchone())[0])
+            logger.info(f"✅ Расходы пользователя {user_id} очищены")
+            return total
+        except Exception as e:
+            self.error_count += 1
+            logger.error(f"❌ Ошибка очистки расходов: {e}")
+            return None
+
+    @timed_query('async')
+    async def get_category_aliases(self, user_id):
+        """Псевдонимы категорий пользователя: {нормализованный псевдоним: категория}"""
+        pool = await self.get_pool()
+        if not pool:
+            return {}
+
+        try:
+            async with pool.connection() as connection:
+                cursor = await connection.execute(queries.CATEGORY_ALIASES, (user_id,))
+                rows = await cursor.fetchall()
+                return {alias: CATEGORY_IDS.name(category_id) for alias, category_id in rows}
+        except Exception as e:
+            self.error_count += 1
+            logger.error(f"❌ Ошибка получения псевдонимов категорий: {e}")
+            return {}
+
+    @timed_query('async')
+    async def set_category_alias(self, user_id, alias, category):
+        """Добавление или замена псевдонима категории (alias уже нормализован)"""
+        pool = await self.get_pool()
+        if not pool:
+            return False
+
+        try:
+            async with pool.connection() as connection:
+                await connection.execute(
+                    queries.SET_CATEGORY_ALIAS,
+                    (user_id, alias, CATEGORY_IDS.id(category))
+                )
+            return True
+        except Exception as e:
+            self.error_count += 1
+            logger.error(f"❌ Ошибка сохранения псевдонима категории: {e}")
+            return False
+
+    @timed_query('async')
+    async def delete_category_alias(self, user_id, alias):
+        """Удаление псевдонима, True - если он был"""
+        pool = await self.get_pool()
+        if not pool:
+            return False
+
+        try:
+            async with pool.connection() as connection:
+                cursor = await connection.execute(queries.DELETE_CATEGORY_ALIAS, (user_id, alias))
+                return cursor.rowcount > 0
+        except Exception as e:
+            self.error_count += 1
+            logger.error(f"❌ Ошибка удаления псевдонима категории: {e}")
+            return False
+
+    @timed_query('async')
+    async def load_bot_state(self, user_id):
+        """Состояние диалогов пользователя: (user_data или None, {(name, key): state}).
+
+        Значения - разобранный JSON (см. persistence). None при ошибке.
+        """
+        pool = await self.get_pool()
+        if not pool:
+            return None
+
+        try:
+            async with pool.connection() as connection:
+                cursor = await connection.execute(queries.LOAD_BOT_STATE, {'user_id': user_id})
+                user_data, conversations = None, {}
+                for name, key, data in await cursor.fetchall():
+                    if name is None:
+                        user_data = data
+                    else:
+                        conversations[(name, tuple(key))] = data
+                return user_data, conversations
+        except Exception as e:
+            self.error_count += 1
+            logger.error(f"❌ Ошибка загрузки состояния диалогов: {e}")
+            return None
+
+    @timed_query('async')
+    async def save_bot_state(self, user_data, conversations):
+        """Запись накопленных изменений состояния одной транзакцией.
+
+        user_data - {user_id: JSON-строка или None (удалить)}, conversations -
+        {(name, key): (user_id, JSON-строка или None)}. Каждый вид изменений -
+        один оператор над массивами, независимо от числа пользователей.
+        """
+        pool = await self.get_pool()
+        if not pool:
+            return False
+
+        saved_users = [(user_id, data) for user_id, data in user_data.items() if data is not None]
+        dropped_users = [user_id for user_id, data in user_data.items() if data is None]
+        saved_conversations = [
+            (name, json.dumps(key), user_id, state)
+            for (name, key), (user_id, state) in conversations.items() if state is not None
+        ]
+        dropped_conversations = [
+            (name, json.dumps(key))
+            for (name, key), (_, state) in conversations.items() if state is None
+        ]
+
+        try:
+            async with pool.connection() as connection:
+                async with connection.transaction():
+                    if saved_users:
+                        await connection.execute(queries.SAVE_BOT_USER_DATA, _columns(saved_users))
+                    if dropped_users:
+                        await connection.execute(queries.DELETE_BOT_USER_DATA, (dropped_users,))
+                    if saved_conversations:
+                        await connection.execute(queries.SAVE_BOT_CONVERSATIONS, _columns(saved_conversations))
+                    if dropped_conversations:
+                        await connection.execute(queries.DELETE_BOT_CONVERSATIONS, _columns(dropped_conversations))
+            return True
+        except Exception as e:
+            self.error_count += 1
+            logger.error(f"❌ Ошибка записи состояния диалогов: {e}")
+            return False
+
+
+# Глобальный экземпляр для асинхронных обработчиков (с кешем чтения)
+adb = AsyncPostgreSQLDatabase()
+# Слушатель создается здесь, а запускается при старте бота (app.start_bot):
+# импорт модуля не открывает соединений и не запускает потоков
+invalidation_listener = None
+
+if CACHE_ENABLED:
+    adb = CachedAsyncDatabase(adb, UserCache())
+    if CACHE_BACKEND == 'postgres' and adb.connection_string:
+        invalidation_listener = PostgresInvalidationListener(adb.connection_string, adb.cache)
@@ -0,0 +1,269 @@
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import extensions
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeoutError(Exception):
+    """Не удалось получить соединение из пула за отведенное время"""
+
+
+class PoolClosedError(Exception):
+    """Пул уже закрыт"""
+
+
+class _PooledConnection:
+    """Соединение и его служебные счетчики"""
+
+    __slots__ = ('connection', 'created_at', 'last_used_at', 'uses')
+
+    def __init__(self, connection):
+        now = time.monotonic()
+        self.connection = connection
+        self.created_at = now
+        self.last_used_at = now
+        self.uses = 0
+
+
+class ConnectionPool:
+    """Ограниченный пул соединений psycopg2.
+
+    Держит от min_size до max_size соединений. При выдаче соединения
+    проверяет, что оно живо, а после max_uses выдач или по достижении
+    max_age секунд закрывает его и открывает новое.
+    """
+
+    def __init__(self, dsn, min_size=1, max_size=10, timeout=10.0,
+                 max_uses=1000, max_age=1800.0, check_after=30.0,
+                 connect_timeout=10, configure=None):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError(f"Некорректные размеры пула: min={min_size}, max={max_size}")
+
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_uses = max_uses
+        self.max_age = max_age
+        self.check_after = check_after
+        self.connect_timeout = connect_timeout
+        self.configure = configure
+
+        self._idle = deque()
+        self._in_use = {}
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+        self._stats = {
+            'connections_opened': 0,
+            'connect_seconds': 0.0,
+            'connections_closed': 0,
+            'checkouts': 0,
+            'checkout_timeouts': 0,
+            'checkout_wait_seconds': 0.0,
+            'failed_health_checks': 0,
+            'recycled': 0,
+        }
+
+    # ---------- открытие / закрытие соединений ----------
+
+    def _connect(self):
+        """Открытие нового физического соединения"""
+        started = time.monotonic()
+        connection = psycopg2.connect(self.dsn, connect_timeout=self.connect_timeout)
+        connection.autocommit = True
+        if self.configure:
+            self.configure(connection)
+        with self._cond:
+            self._stats['connections_opened'] += 1
+            self._stats['connect_seconds'] += time.monotonic() - started
+        return _PooledConnection(connection)
+
+    def _close(self, record):
+        """Закрытие физического соединения без учета размера пула"""
+        try:
+            if not record.connection.closed:
+                record.connection.close()
+        except Exception as e:
+            logger.warning(f"⚠️ Ошибка закрытия соединения: {e}")
+        with self._cond:
+            self._stats['connections_closed'] += 1
+
+    def _is_expired(self, record, now):
+        if self.max_uses and record.uses >= self.max_uses:
+            return True
+        if self.max_age and now - record.created_at >= self.max_age:
+            return True
+        return False
+
+    def _is_alive(self, record, now):
+        """Проверка соединения перед выдачей"""
+        connection = record.connection
+        if connection.closed:
+            return False
+        if connection.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+            return False
+        if now - record.last_used_at < self.check_after:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            return True
+        except Exception:
+            return False
+
+    def open(self):
+        """Заполнение пула до min_size соединений"""
+        while True:
+            with self._cond:
+                if self._closed or self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                record = self._connect()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._idle.append(record)
+                self._cond.notify()
+
+    # ---------- выдача / возврат ----------
+
+    def getconn(self, timeout=None):
+        """Получение соединения из пула"""
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+
+        while True:
+            record = None
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolClosedError("Пул соединений закрыт")
+                    if self._idle:
+                        record = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['checkout_timeouts'] += 1
+                        raise PoolTimeoutError(
+                            f"Нет свободных соединений за {timeout:.1f} с "
+                            f"(размер пула {self.max_size})"
+                        )
+                    self._cond.wait(remaining)
+
+            now = time.monotonic()
+            if record is not None:
+                if self._is_expired(record, now):
+                    self._close(record)
+                    with self._cond:
+                        self._stats['recycled'] += 1
+                    record = None
+                elif not self._is_alive(record, now):
+                    self._close(record)
+                    with self._cond:
+                        self._stats['failed_health_checks'] += 1
+                    record = None
+
+            if record is None:
+                # Место в пуле уже зарезервировано за нами - открываем соединение
+                try:
+                    record = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+
+            record.uses += 1
+            record.last_used_at = time.monotonic()
+            with self._cond:
+                self._in_use[id(record.connection)] = record
+                self._stats['checkouts'] += 1
+                self._stats['checkout_wait_seconds'] += record.last_used_at - started
+            return record.connection
+
+    def putconn(self, connection, discard=False):
+        """Возврат соединения в пул"""
+        with self._cond:
+            record = self._in_use.pop(id(connection), None)
+        if record is None:
+            logger.warning("⚠️ Попытка вернуть в пул чужое соединение")
+            connection.close()
+            return
+
+        if not discard and not connection.closed:
+            status = connection.info.transaction_status
+            if status != extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    connection.rollback()
+                except Exception:
+                    discard = True
+
+        record.last_used_at = time.monotonic()
+        if discard or connection.closed or self._closed:
+            self._close(record)
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            return
+
+        with self._cond:
+            self._idle.append(record)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """Контекстный менеджер: соединение возвращается в пул автоматически"""
+        connection = self.getconn(timeout)
+        try:
+            yield connection
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            self.putconn(connection, discard=True)
+            raise
+        except BaseException:
+            self.putconn(connection)
+            raise
+        else:
+            self.putconn(connection)
+
+    def closeall(self):
+        """Закрытие всех соединений пула"""
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for record in idle:
+            self._close(record)
+
+    # ---------- статистика ----------
+
+    def stats(self):
+        """Текущее состояние пула"""
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': len(self._in_use),
+                'closed': self._closed,
+            })
+        return stats
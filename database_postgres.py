@@ -1,90 +1,300 @@
 import os
-import psycopg2
 import logging
+import threading
+
+import psycopg2
+from psycopg2 import errors
+
+import queries
+from config import CATEGORIES, EXPENSES_PAGE_SIZE, EXPORT_FETCH_SIZE
+from categories import CATEGORY_IDS
+from database_pool import ConnectionPool
+from metrics import timed_query
+from migrate import migrate, get_current_version, latest_version
 
 logger = logging.getLogger(__name__)
 
+# Параметры пула соединений (переопределяются переменными окружения)
+POOL_MIN_SIZE = int(os.environ.get('DB_POOL_MIN_SIZE', 1))
+POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', 10))
+POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 10))
+POOL_MAX_USES = int(os.environ.get('DB_POOL_MAX_USES', 1000))
+POOL_MAX_AGE = float(os.environ.get('DB_POOL_MAX_AGE', 1800))
+# Применять недостающие миграции при старте (0 - только проверять версию)
+AUTO_MIGRATE = os.environ.get('DB_AUTO_MIGRATE', '1') != '0'
+# Подготовленные операторы для частых запросов (0 - обычные запросы,
+# например за PgBouncer в режиме transaction)
+PREPARED_STATEMENTS = os.environ.get('DB_PREPARED_STATEMENTS', '1') != '0'
+# На сколько месяцев вперед держать готовые разделы expenses
+PARTITION_MONTHS_AHEAD = int(os.environ.get('PARTITION_MONTHS_AHEAD', 3))
+# Создавать разделы при старте (0 - только по расписанию: python partitions.py ensure)
+ENSURE_PARTITIONS_ON_START = os.environ.get('DB_ENSURE_PARTITIONS', '1') != '0'
 
-class PostgreSQLDatabase:
-    def __init__(self):
-        self.connection_string = os.environ.get('DATABASE_URL')
 
-        # Добавляем параметры SSL для Render
-        if self.connection_string:
-            logger.info(f"Original connection string: {self.connection_string[:50]}...")
+def get_connection_string():
+    """Строка подключения из DATABASE_URL с обязательным SSL для Render"""
+    connection_string = os.environ.get('DATABASE_URL')
+
+    if connection_string:
+        logger.info(f"Original connection string: {connection_string[:50]}...")
+
+        # Обязательно добавляем sslmode=require для Render
+        if 'postgresql://' in connection_string:
+            if '?' not in connection_string:
+                connection_string += '?sslmode=require'
+            elif 'sslmode' not in connection_string:
+                connection_string += '&sslmode=require'
+
+        logger.info(f"Updated connection string: {connection_string[:50]}...")
+
+    return connection_string
+
+
+def prepare_statements(connection):
+    """PREPARE частых запросов на соединении.
+
+    Пул вызывает ее для каждого нового соединения, поэтому после
+    переподключения операторы готовятся заново. Ошибка (например, до
+    миграций таблиц еще нет) не мешает соединению - повтор при первом вызове.
+    """
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(queries.DEALLOCATE_STATEMENTS)
+            for sql in queries.PREPARE_STATEMENTS.values():
+                cursor.execute(sql)
+        return True
+    except psycopg2.Error as e:
+        logger.warning(f"⚠️ Операторы не подготовлены: {e}")
+        return False
+
+
+def execute_prepared(cursor, name, query, params):
+    """Выполнение частого запроса по имени подготовленного оператора"""
+    if not PREPARED_STATEMENTS:
+        cursor.execute(query, params)
+        return
+    try:
+        cursor.execute(queries.EXECUTE_STATEMENTS[name], params)
+    except errors.InvalidSqlStatementName:
+        # На этом соединении PREPARE не удался - готовим сейчас
+        if prepare_statements(cursor.connection):
+            cursor.execute(queries.EXECUTE_STATEMENTS[name], params)
+        else:
+            cursor.execute(query, params)
+
+
+def empty_summary(period):
+    """Сводка для пользователя без расходов"""
+    return {
+        'period': period,
+        'total': 0.0,
+        'count': 0,
+        'by_category': {},
+        'today_total': 0.0,
+        'month_total': 0.0,
+    }
+
+
+def build_summary(period, rows):
+    """Сводка из строк запроса USER_SUMMARY (итоговая строка идет первой)"""
+    summary = empty_summary(period)
+    for is_total, category, period_total, period_count, today_total, month_total in rows:
+        if is_total:
+            summary['total'] = float(period_total)
+            summary['count'] = int(period_count)
+            summary['today_total'] = float(today_total)
+            summary['month_total'] = float(month_total)
+        elif period_count:
+            summary['by_category'][CATEGORY_IDS.name(category)] = float(period_total)
+    return summary
+
 
-            # Обязательно добавляем sslmode=require для Render
-            if 'postgresql://' in self.connection_string:
-                if '?' not in self.connection_string:
-                    self.connection_string += '?sslmode=require'
-                elif 'sslmode' not in self.connection_string:
-                    self.connection_string += '&sslmode=require'
+def page_params(user_id, direction, cursor, page_size):
+    """Параметры запроса EXPENSES_PAGE (на одну строку больше - чтобы узнать, есть ли еще)"""
+    params = {'user_id': user_id, 'limit': page_size + 1}
+    if direction != 'first':
+        params['created_at'], params['id'] = cursor
+    return params
 
-            logger.info(f"Updated connection string: {self.connection_string[:50]}...")
+
+def empty_page():
+    return {'rows': [], 'total': 0.0, 'count': 0, 'has_older': False, 'has_newer': False}
+
+
+def build_page(direction, rows, page_size):
+    """Страница из строк запроса EXPENSES_PAGE.
+
+    rows всегда возвращаются от новых к старым; has_older/has_newer -
+    есть ли расходы за периодом страницы в соответствующую сторону.
+    """
+    page = empty_page()
+    if not rows:
+        return page
+
+    page['total'] = float(rows[0][5])
+    page['count'] = int(rows[0][6])
+    expenses = expense_rows(row[:5] for row in rows if row[0] is not None)
+
+    has_more = len(expenses) > page_size
+    expenses = expenses[:page_size]
+    if direction == 'newer':
+        expenses.reverse()
+        page['has_newer'], page['has_older'] = has_more, True
+    else:
+        page['has_older'], page['has_newer'] = has_more, direction == 'older'
+
+    page['rows'] = expenses
+    return page
+
+
+def expense_columns(rows):
+    """Параметры ADD_EXPENSES: строки (user_id, amount, category, description) -> 4 массива"""
+    user_ids, amounts, category_ids, descriptions = [], [], [], []
+    for user_id, amount, category, description in rows:
+        user_ids.append(user_id)
+        amounts.append(amount)
+        category_ids.append(CATEGORY_IDS.id(category))
+        descriptions.append(description)
+    return user_ids, amounts, category_ids, descriptions
+
+
+def expense_rows(rows):
+    """Строки (id, amount, category_id, description, created_at) с названием категории"""
+    return [
+        (expense_id, amount, CATEGORY_IDS.name(category_id), description, created_at)
+        for expense_id, amount, category_id, description, created_at in rows
+    ]
+
+
+def export_row(row):
+    """Строка EXPORT_EXPENSES с названием категории вместо id"""
+    created_at, amount, category_id, description = row
+    return created_at, amount, CATEGORY_IDS.name(category_id), description
+
+
+class PostgreSQLDatabase:
+    def __init__(self):
+        self.connection_string = get_connection_string()
 
         self.connection_pool = None
-        self.create_tables()
+        if self.connection_string:
+            self.connection_pool = ConnectionPool(
+                self.connection_string,
+                min_size=POOL_MIN_SIZE,
+                max_size=POOL_MAX_SIZE,
+                timeout=POOL_TIMEOUT,
+                max_uses=POOL_MAX_USES,
+                max_age=POOL_MAX_AGE,
+                connect_timeout=10,
+                configure=prepare_statements if PREPARED_STATEMENTS else None
+            )
+            try:
+                self.connection_pool.open()
+            except Exception as e:
+                logger.error(f"❌ Не удалось заполнить пул соединений: {e}")
+
+        self.ensure_schema()
 
     def get_connection(self):
-        """Получение соединения с БД"""
+        """Получение соединения из пула"""
         try:
-            if not self.connection_string:
+            if not self.connection_pool:
                 logger.error("❌ DATABASE_URL не установлен")
                 return None
 
-            # Создаем новое соединение каждый раз
-            connection = psycopg2.connect(
-                self.connection_string,
-                connect_timeout=10
-            )
-            connection.autocommit = True
-            return connection
+            return self.connection_pool.getconn()
         except Exception as e:
             logger.error(f"❌ Ошибка подключения к БД: {e}")
             return None
 
-    def create_tables(self):
-        """Создание таблиц в базе данных"""
+    def release_connection(self, connection):
+        """Возврат соединения в пул"""
+        if self.connection_pool:
+            self.connection_pool.putconn(connection)
+        else:
+            connection.close()
+
+    def get_pool_stats(self):
+        """Статистика пула соединений"""
+        if not self.connection_pool:
+            return {}
+        return self.connection_pool.stats()
+
+    def close(self):
+        """Закрытие всех соединений пула"""
+        if self.connection_pool:
+            self.connection_pool.closeall()
+
+    @timed_query('sync')
+    def ensure_schema(self):
+        """Проверка версии схемы и применение недостающих миграций"""
         connection = self.get_connection()
         if not connection:
-            logger.error("❌ Не удалось подключиться к БД для создания таблиц")
+            logger.error("❌ Не удалось подключиться к БД для проверки схемы")
             return False
 
         try:
-            with connection.cursor() as cursor:
-                # Таблица пользователей
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS users (
-                        user_id BIGINT PRIMARY KEY,
-                        username VARCHAR(100),
-                        first_name VARCHAR(100),
-                        last_name VARCHAR(100),
-                        language_code VARCHAR(10),
-                        registered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                """)
-
-                # Таблица расходов
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS expenses (
-                        id SERIAL PRIMARY KEY,
-                        user_id BIGINT REFERENCES users(user_id) ON DELETE CASCADE,
-                        amount DECIMAL(10, 2) NOT NULL,
-                        category VARCHAR(50) NOT NULL,
-                        description TEXT,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                """)
-
-            logger.info("✅ Таблицы созданы успешно")
+            current = get_current_version(connection)
+            expected = latest_version()
+            if current >= expected:
+                logger.info(f"✅ Схема БД актуальна (версия {current})")
+                self._after_schema_check(connection)
+                return True
+
+            if not AUTO_MIGRATE:
+                logger.error(
+                    f"❌ Схема БД устарела: версия {current}, нужна {expected}. "
+                    "Выполните: python migrate.py up"
+                )
+                return False
+
+            applied = migrate(connection)
+            logger.info(f"✅ Схема БД обновлена до версии {expected} (миграций: {len(applied)})")
+            self._after_schema_check(connection)
             return True
 
         except Exception as e:
-            logger.error(f"❌ Ошибка создания таблиц: {e}")
+            logger.error(f"❌ Ошибка миграции схемы: {e}")
             return False
         finally:
-            connection.close()
+            self.release_connection(connection)
+
+    def _after_schema_check(self, connection):
+        """Шаги старта после сверки версии.
+
+        Справочник категорий нужен процессу всегда: CATEGORY_IDS живет в
+        памяти, а SYNC_CATEGORIES при совпадении с config ничего не
+        вставляет - это один запрос. Разделы создаются здесь, пока нет
+        расписания (на бесплатном Render его нет); с DB_ENSURE_PARTITIONS=0
+        это делает только python partitions.py ensure.
+        """
+        if ENSURE_PARTITIONS_ON_START:
+            self._ensure_partitions(connection)
+        self._load_categories(connection)
+
+    def _ensure_partitions(self, connection):
+        """Разделы expenses на ближайшие месяцы (строки без раздела попадают в expenses_default)"""
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(queries.ENSURE_EXPENSE_PARTITIONS, (PARTITION_MONTHS_AHEAD,))
+                created = cursor.fetchone()[0]
+            if created:
+                logger.info(f"✅ Создано разделов expenses: {created}")
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось создать разделы expenses: {e}")
+
+    def _load_categories(self, connection):
+        """Справочник категорий в CATEGORY_IDS (один раз на процесс)"""
+        if CATEGORY_IDS.loaded:
+            return
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(queries.SYNC_CATEGORIES, (CATEGORIES,))
+                CATEGORY_IDS.load(cursor.fetchall())
+        except Exception as e:
+            logger.error(f"❌ Не удалось загрузить справочник категорий: {e}")
 
+    @timed_query('sync')
     def add_user(self, user_id, username=None, first_name=None, last_name=None, language_code=None):
         """Добавление пользователя"""
         connection = self.get_connection()
@@ -93,19 +303,16 @@ class PostgreSQLDatabase:
 
         try:
             with connection.cursor() as cursor:
-                cursor.execute("""
-                    INSERT INTO users (user_id, username, first_name, last_name, language_code)
-                    VALUES (%s, %s, %s, %s, %s)
-                    ON CONFLICT (user_id) DO NOTHING
-                """, (user_id, username, first_name, last_name, language_code))
+                cursor.execute(queries.ADD_USER, (user_id, username, first_name, last_name, language_code))
             logger.info(f"✅ Пользователь {user_id} добавлен")
             return True
         except Exception as e:
             logger.error(f"❌ Ошибка добавления пользователя: {e}")
             return False
         finally:
-            connection.close()
+            self.release_connection(connection)
 
+    @timed_query('sync')
     def add_expense(self, user_id, amount, category, description=None):
         """Добавление расхода"""
         connection = self.get_connection()
@@ -114,18 +321,45 @@ class PostgreSQLDatabase:
 
         try:
             with connection.cursor() as cursor:
-                cursor.execute("""
-                    INSERT INTO expenses (user_id, amount, category, description)
-                    VALUES (%s, %s, %s, %s)
-                """, (user_id, amount, category, description))
+                execute_prepared(
+                    cursor, 'add_expense', queries.ADD_EXPENSE,
+                    (user_id, amount, CATEGORY_IDS.id(category), description)
+                )
             logger.info(f"✅ Расход {amount} руб. добавлен для пользователя {user_id}")
             return True
         except Exception as e:
             logger.error(f"❌ Ошибка добавления расхода: {e}")
             return False
         finally:
-            connection.close()
+            self.release_connection(connection)
+
+    @timed_query('sync')
+    def add_expenses(self, rows):
+        """Добавление пачки расходов одним оператором.
+
+        rows - список кортежей (user_id, amount, category, description).
+        Все или ничего: при ошибке не добавляется ни одна строка.
+        """
+        rows = list(rows)
+        if not rows:
+            return True
+
+        connection = self.get_connection()
+        if not connection:
+            return False
+
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(queries.ADD_EXPENSES, expense_columns(rows))
+            logger.info(f"✅ Добавлено расходов: {len(rows)}")
+            return True
+        except Exception as e:
+            logger.error(f"❌ Ошибка добавления пачки расходов: {e}")
+            return False
+        finally:
+            self.release_connection(connection)
 
+    @timed_query('sync')
     def get_today_expenses(self, user_id):
         """Получение расходов за сегодня"""
         connection = self.get_connection()
@@ -134,20 +368,15 @@ class PostgreSQLDatabase:
 
         try:
             with connection.cursor() as cursor:
-                cursor.execute("""
-                    SELECT id, amount, category, description, created_at 
-                    FROM expenses 
-                    WHERE user_id = %s 
-                    AND DATE(created_at) = CURRENT_DATE
-                    ORDER BY created_at DESC
-                """, (user_id,))
-                return cursor.fetchall()
+                execute_prepared(cursor, 'today_expenses', queries.TODAY_EXPENSES, (user_id,))
+                return expense_rows(cursor.fetchall())
         except Exception as e:
             logger.error(f"❌ Ошибка получения расходов за сегодня: {e}")
             return []
         finally:
-            connection.close()
+            self.release_connection(connection)
 
+    @timed_query('sync')
     def get_month_expenses(self, user_id):
         """Получение расходов за текущий месяц"""
         connection = self.get_connection()
@@ -156,21 +385,71 @@ class PostgreSQLDatabase:
 
         try:
             with connection.cursor() as cursor:
-                cursor.execute("""
-                    SELECT id, amount, category, description, created_at 
-                    FROM expenses 
-                    WHERE user_id = %s 
-                    AND EXTRACT(MONTH FROM created_at) = EXTRACT(MONTH FROM CURRENT_DATE)
-                    AND EXTRACT(YEAR FROM created_at) = EXTRACT(YEAR FROM CURRENT_DATE)
-                    ORDER BY created_at DESC
-                """, (user_id,))
-                return cursor.fetchall()
+                execute_prepared(cursor, 'month_expenses', queries.MONTH_EXPENSES, (user_id,))
+                return expense_rows(cursor.fetchall())
         except Exception as e:
             logger.error(f"❌ Ошибка получения расходов за месяц: {e}")
             return []
         finally:
-            connection.close()
+            self.release_connection(connection)
+
+    @timed_query('sync')
+    def get_expenses_page(self, user_id, period, direction='first', cursor=None, page_size=EXPENSES_PAGE_SIZE):
+        """Страница расходов за период ('today' или 'month').
+
+        direction - 'first', 'older' или 'newer'; cursor - (created_at, id)
+        крайнего расхода текущей страницы в сторону перехода.
+        """
+        connection = self.get_connection()
+        if not connection:
+            return empty_page()
+
+        try:
+            with connection.cursor() as db_cursor:
+                db_cursor.execute(
+                    queries.EXPENSES_PAGE[(period, direction)],
+                    page_params(user_id, direction, cursor, page_size)
+                )
+                return build_page(direction, db_cursor.fetchall(), page_size)
+        except Exception as e:
+            logger.error(f"❌ Ошибка получения страницы расходов: {e}")
+            return empty_page()
+        finally:
+            self.release_connection(connection)
 
+    def iter_expenses(self, user_id, fetch_size=EXPORT_FETCH_SIZE):
+        """Все расходы пользователя по одной строке (created_at, amount, category, description).
+
+        Именованный (серверный) курсор отдает по fetch_size строк за запрос,
+        поэтому память не зависит от числа расходов. Соединение возвращается
+        в пул, когда итерация закончится или генератор будет закрыт.
+        Ошибка БД пробрасывается.
+        """
+        connection = self.get_connection()
+        if not connection:
+            raise RuntimeError("Нет соединения с БД")
+
+        # Именованному курсору нужна транзакция, а соединения пула в autocommit
+        connection.autocommit = False
+        try:
+            with connection.cursor(name='export_expenses') as cursor:
+                cursor.itersize = fetch_size
+                cursor.execute(queries.EXPORT_EXPENSES, (user_id,))
+                for row in cursor:
+                    yield export_row(row)
+        except Exception as e:
+            logger.error(f"❌ Ошибка выгрузки расходов: {e}")
+            raise
+        finally:
+            try:
+                connection.rollback()
+                connection.autocommit = True
+            except Exception:
+                # Сломанное соединение пул не вернет в оборот
+                connection.close()
+            self.release_connection(connection)
+
+    @timed_query('sync')
     def get_expenses_by_category(self, user_id):
         """Получение статистики по категориям"""
         connection = self.get_connection()
@@ -179,21 +458,16 @@ class PostgreSQLDatabase:
 
         try:
             with connection.cursor() as cursor:
-                cursor.execute("""
-                    SELECT category, SUM(amount) as total
-                    FROM expenses 
-                    WHERE user_id = %s
-                    GROUP BY category
-                    ORDER BY total DESC
-                """, (user_id,))
+                execute_prepared(cursor, 'expenses_by_category', queries.EXPENSES_BY_CATEGORY, (user_id,))
                 result = cursor.fetchall()
-                return {row[0]: float(row[1]) for row in result}
+                return {CATEGORY_IDS.name(row[0]): float(row[1]) for row in result}
         except Exception as e:
             logger.error(f"❌ Ошибка получения статистики: {e}")
             return {}
         finally:
-            connection.close()
+            self.release_connection(connection)
 
+    @timed_query('sync')
     def get_total_expenses(self, user_id):
         """Получение общей суммы расходов"""
         connection = self.get_connection()
@@ -202,19 +476,65 @@ class PostgreSQLDatabase:
 
         try:
             with connection.cursor() as cursor:
-                cursor.execute("""
-                    SELECT COALESCE(SUM(amount), 0)
-                    FROM expenses 
-                    WHERE user_id = %s
-                """, (user_id,))
+                execute_prepared(cursor, 'total_expenses', queries.TOTAL_EXPENSES, (user_id,))
                 result = cursor.fetchone()
                 return float(result[0]) if result else 0
         except Exception as e:
             logger.error(f"❌ Ошибка получения общей суммы: {e}")
             return 0
         finally:
-            connection.close()
+            self.release_connection(connection)
+
+    @timed_query('sync')
+    def get_user_summary(self, user_id, period='all'):
+        """Сводка расходов одним запросом.
+
+        period - 'all', 'month' или 'today': за какой период считаются
+        total, count и by_category. today_total и month_total
+        возвращаются всегда.
+        """
+        summary = empty_summary(period)
+        connection = self.get_connection()
+        if not connection:
+            return summary
+
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(queries.USER_SUMMARY[period], (user_id,))
+                return build_summary(period, cursor.fetchall())
+        except Exception as e:
+            logger.error(f"❌ Ошибка получения сводки: {e}")
+            return summary
+        finally:
+            self.release_connection(connection)
+
+    @timed_query('sync')
+    def get_today_total(self, user_id):
+        """Сумма расходов за сегодня"""
+        return self._fetch_total('today_total', queries.TODAY_TOTAL, user_id)
+
+    @timed_query('sync')
+    def get_month_total(self, user_id):
+        """Сумма расходов за текущий месяц"""
+        return self._fetch_total('month_total', queries.MONTH_TOTAL, user_id)
 
+    def _fetch_total(self, name, query, user_id):
+        connection = self.get_connection()
+        if not connection:
+            return 0
+
+        try:
+            with connection.cursor() as cursor:
+                execute_prepared(cursor, name, query, (user_id,))
+                result = cursor.fetchone()
+                return float(result[0]) if result else 0
+        except Exception as e:
+            logger.error(f"❌ Ошибка получения суммы за период: {e}")
+            return 0
+        finally:
+            self.release_connection(connection)
+
+    @timed_query('sync')
     def clear_user_expenses(self, user_id):
         """Очистка всех расходов пользователя"""
         connection = self.get_connection()
@@ -223,18 +543,123 @@ class PostgreSQLDatabase:
 
         try:
             with connection.cursor() as cursor:
-                cursor.execute("""
-                    DELETE FROM expenses 
-                    WHERE user_id = %s
-                """, (user_id,))
+                cursor.execute(queries.CLEAR_USER_EXPENSES, {'user_id': user_id})
             logger.info(f"✅ Расходы пользователя {user_id} очищены")
             return True
         except Exception as e:
             logger.error(f"❌ Ошибка очистки расходов: {e}")
             return False
         finally:
-            connection.close()
+            self.release_connection(connection)
+
+    @timed_query('sync')
+    def delete_all_expenses(self, user_id):
+        """Удаление всех расходов пользователя, возвращает удаленную сумму (None при ошибке)"""
+        connection = self.get_connection()
+        if not connection:
+            return None
+
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(queries.DELETE_ALL_EXPENSES, {'user_id': user_id})
+                total = float(cursor.fetchone()[0])
+            logger.info(f"✅ Расходы пользователя {user_id} очищены")
+            return total
+        except Exception as e:
+            logger.error(f"❌ Ошибка очистки расходов: {e}")
+            return None
+        finally:
+            self.release_connection(connection)
+
+    @timed_query('sync')
+    def verify_rollups(self, user_id=None):
+        """Сверка expense_rollups с таблицей expenses.
+
+        Возвращает список расхождений: (user_id, period_kind, period_start,
+        category, фактическая сумма, сумма в агрегате, фактическое число,
+        число в агрегате). Пустой список - агрегаты верны.
+        """
+        connection = self.get_connection()
+        if not connection:
+            return None
+
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(queries.VERIFY_ROLLUPS, {'user_id': user_id})
+                return [
+                    row[:3] + (CATEGORY_IDS.name(row[3]),) + row[4:]
+                    for row in cursor.fetchall()
+                ]
+        except Exception as e:
+            logger.error(f"❌ Ошибка сверки агрегатов: {e}")
+            return None
+        finally:
+            self.release_connection(connection)
+
+    @timed_query('sync')
+    def rebuild_rollups(self, user_id=None):
+        """Пересборка expense_rollups по таблице expenses (для всех или одного пользователя)"""
+        connection = self.get_connection()
+        if not connection:
+            return False
+
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("BEGIN")
+                try:
+                    cursor.execute(queries.LOCK_EXPENSES_FOR_ROLLUP)
+                    cursor.execute(queries.DELETE_ROLLUPS, {'user_id': user_id})
+                    cursor.execute(queries.REBUILD_ROLLUPS, {'user_id': user_id})
+                    rows = cursor.rowcount
+                    cursor.execute("COMMIT")
+                except Exception:
+                    cursor.execute("ROLLBACK")
+                    raise
+            logger.info(f"✅ Агрегаты пересобраны (строк: {rows})")
+            return True
+        except Exception as e:
+            logger.error(f"❌ Ошибка пересборки агрегатов: {e}")
+            return False
+        finally:
+            self.release_connection(connection)
+
+
+class LazyDatabase:
+    """PostgreSQLDatabase, которая создается при первом обращении.
+
+    Импорт модуля не открывает соединений и не проверяет схему - это
+    происходит при первом вызове метода или явном get() (например, в
+    фоновом прогреве app.py), один раз на процесс.
+    """
+
+    def __init__(self):
+        self._instance = None
+        self._lock = threading.Lock()
+
+    @property
+    def initialized(self):
+        """Создана ли база (без подключения к ней)"""
+        return self._instance is not None
+
+    def get(self):
+        """Экземпляр PostgreSQLDatabase (создается при первом вызове)"""
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    self._instance = PostgreSQLDatabase()
+        return self._instance
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+    def __setattr__(self, name, value):
+        # Без этого db.connection_pool = ... осело бы на прокси, а методы
+        # базы продолжили бы работать со старым пулом
+        if name.startswith('_'):
+            super().__setattr__(name, value)
+        else:
+            setattr(self.get(), name, value)
 
 
-# Создаем глобальный экземпляр базы данных
-db = PostgreSQLDatabase()
\ No newline at end of file
+# Глобальный экземпляр базы данных (подключение - при первом обращении)
+db = LazyDatabase()
\ No newline at end of file
@@ -0,0 +1,95 @@
+import asyncio
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundEventLoop:
+    """Долгоживущий event loop в отдельном потоке.
+
+    Синхронный код (маршруты Flask) отправляет сюда корутины и ждет
+    результат. Loop один на все приложение, поэтому HTTP-соединения
+    бота переиспользуются, а обновления обрабатываются параллельно.
+    """
+
+    def __init__(self, name='bot-event-loop'):
+        self.name = name
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self):
+        """Event loop (запускается при первом обращении)"""
+        self.start()
+        return self._loop
+
+    @property
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Запуск потока с event loop"""
+        with self._lock:
+            if self.is_running:
+                return
+
+            started = threading.Event()
+            self._loop = asyncio.new_event_loop()
+
+            def run():
+                asyncio.set_event_loop(self._loop)
+                self._loop.call_soon(started.set)
+                self._loop.run_forever()
+
+            self._thread = threading.Thread(target=run, name=self.name, daemon=True)
+            self._thread.start()
+            started.wait()
+            logger.info(f"✅ Event loop '{self.name}' запущен")
+
+    def submit(self, coro):
+        """Отправка корутины в loop, возвращает concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout=None):
+        """Выполнение корутины с ожиданием результата.
+
+        При превышении timeout задача отменяется и выбрасывается TimeoutError.
+        """
+        future = self.submit(coro)
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            future.cancel()
+            raise
+
+    def stop(self, timeout=10.0):
+        """Отмена оставшихся задач и остановка loop"""
+        with self._lock:
+            if not self.is_running:
+                return
+            loop, thread = self._loop, self._thread
+
+        async def cancel_pending():
+            current = asyncio.current_task()
+            tasks = [t for t in asyncio.all_tasks() if t is not current]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await loop.shutdown_asyncgens()
+
+        try:
+            asyncio.run_coroutine_threadsafe(cancel_pending(), loop).result(timeout)
+        except Exception as e:
+            logger.warning(f"⚠️ Не все задачи завершились при остановке loop: {e}")
+
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout)
+        if not thread.is_alive():
+            loop.close()
+        logger.info(f"🛑 Event loop '{self.name}' остановлен")
+
+        with self._lock:
+            self._loop = None
+            self._thread = None
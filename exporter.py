@@ -0,0 +1,78 @@
+import io
+import csv
+import zlib
+import gzip
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Заголовок совпадает с названиями столбцов, которые понимает /import
+EXPORT_HEADER = ('Дата', 'Сумма', 'Категория', 'Описание')
+# Разделитель ';' - так файл сразу открывается в русском Excel
+EXPORT_DELIMITER = ';'
+# Сколько строк CSV собирать в один кусок HTTP-ответа
+CHUNK_ROWS = 1000
+
+
+def format_row(row):
+    """Строка EXPORT_EXPENSES -> ячейки CSV"""
+    created_at, amount, category, description = row
+    return created_at.strftime('%Y-%m-%d %H:%M:%S'), f"{amount:.2f}", category, description or ''
+
+
+def iter_csv(rows, chunk_rows=CHUNK_ROWS):
+    """CSV кусками по chunk_rows строк (str). Целиком в памяти не собирается"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=EXPORT_DELIMITER)
+    # BOM - чтобы Excel узнал UTF-8
+    buffer.write('\ufeff')
+    writer.writerow(EXPORT_HEADER)
+
+    count = 0
+    for row in rows:
+        writer.writerow(format_row(row))
+        count += 1
+        if count % chunk_rows == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def iter_encoded(chunks, compress=False):
+    """Куски str -> байты UTF-8, при compress - поток gzip"""
+    if not compress:
+        for chunk in chunks:
+            yield chunk.encode('utf-8')
+        return
+
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+async def write_export(database, user_id, path, compress=False):
+    """Выгрузка расходов пользователя в файл path (для отправки ботом).
+
+    Строки читаются из серверного курсора и сразу пишутся в файл,
+    поэтому память не зависит от числа расходов. Возвращает число строк.
+    """
+    if compress:
+        f = gzip.open(path, 'wt', encoding='utf-8', newline='')
+    else:
+        f = open(path, 'w', encoding='utf-8', newline='')
+
+    count = 0
+    with f:
+        f.write('\ufeff')
+        writer = csv.writer(f, delimiter=EXPORT_DELIMITER)
+        writer.writerow(EXPORT_HEADER)
+        async for row in database.iter_expenses(user_id):
+            writer.writerow(format_row(row))
+            count += 1
+
+    logger.info(f"✅ Выгружено расходов пользователя {user_id}: {count}")
+    return count
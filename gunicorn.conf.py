@@ -0,0 +1,54 @@
+# gunicorn.conf.py
+# Запуск в продакшене:
+#     gunicorn -c gunicorn.conf.py app:app
+#
+# Каждый воркер - отдельный процесс со своим event loop бота, пулами
+# соединений и очередью обновлений. Бот инициализируется в хуке
+# post_worker_init ровно один раз на воркер (с LAZY_START=1 - в фоне,
+# воркер принимает запросы сразу), очистка - в worker_exit.
+import os
+import sys
+
+from gunicorn.arbiter import Arbiter
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 10000)}"
+
+# Больше одного воркера - только с STATE_BACKEND=postgres, иначе шаги
+# диалога /add окажутся в памяти разных процессов
+workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+# Маршруты Flask синхронные и в основном ждут event loop бота или БД -
+# потоки дешевле процессов
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+
+# Приложение импортируется в каждом воркере после fork: потоки (event
+# loop, слушатель кеша) и сокеты пулов не переживают fork
+preload_app = False
+
+timeout = 60
+keepalive = 5
+# Успеть дождаться очереди обновлений (UPDATE_DRAIN_TIMEOUT) при остановке
+graceful_timeout = int(float(os.environ.get('UPDATE_DRAIN_TIMEOUT', 25))) + 10
+
+
+def post_worker_init(worker):
+    from app import LAZY_START, start_bot, start_bot_background
+
+    # Из окружения, а не из persistence: тот импортирует telegram
+    if workers > 1 and os.environ.get('STATE_BACKEND', 'memory') != 'postgres':
+        worker.log.warning("⚠️ Несколько воркеров без STATE_BACKEND=postgres: диалоги могут теряться")
+
+    if LAZY_START:
+        # Воркер сразу начинает отвечать, бот и БД поднимаются в фоне
+        start_bot_background()
+        return
+
+    if not start_bot():
+        worker.log.error("❌ Не удалось инициализировать бота!")
+        # Мастер не будет бесконечно перезапускать воркер с той же ошибкой
+        sys.exit(Arbiter.WORKER_BOOT_ERROR)
+
+
+def worker_exit(server, worker):
+    from app import cleanup
+    cleanup()
@@ -1,79 +1,194 @@
+import os
 import logging
-from telegram import Update
+import tempfile
+from datetime import datetime
+from telegram import (
+    Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, ReplyKeyboardRemove
+)
 from telegram.ext import CallbackContext, ConversationHandler
-from config import CATEGORIES
-from database_postgres import db
+from config import CATEGORIES, IMPORT_MAX_FILE_SIZE, EXPORT_MAX_FILE_SIZE
+from database_async import adb
+from importer import import_expenses
+from metrics import timed_handler
+from exporter import write_export
+from quick_add import parse_expense_text
+from categories import CATEGORY_MATCHER, normalize_category
 
 logger = logging.getLogger(__name__)
-AMOUNT, CATEGORY, DESCRIPTION = range(3)
+AMOUNT, CATEGORY, DESCRIPTION, IMPORT_FILE = range(4)
 
+# Список и клавиатура категорий не меняются - собираются один раз
+CATEGORIES_TEXT = "\n".join(f"• {category}" for category in CATEGORIES)
+CATEGORY_KEYBOARD = ReplyKeyboardMarkup(
+    [CATEGORIES[i:i + 2] for i in range(0, len(CATEGORIES), 2)],
+    resize_keyboard=True,
+    one_time_keyboard=True
+)
+REMOVE_KEYBOARD = ReplyKeyboardRemove()
 
+
+@timed_handler
 async def start_command(update: Update, context: CallbackContext) -> int:
     """Обработчик команды /start"""
     user = update.effective_user
     context.user_data.clear()
 
-    db.add_user(user.id, user.username, user.first_name, user.last_name, user.language_code)
+    await adb.add_user(user.id, user.username, user.first_name, user.last_name, user.language_code)
 
     await update.message.reply_text(
         f"👋 Привет, {user.first_name}!\n\n"
         "🤖 Я бот для учёта расходов.\n\n"
         "📌 **Команды:**\n"
-        "/add - Добавить расход\n"
+        "/add - Добавить расход (или /add 1500 еда обед)\n"
         "/today - Расходы за сегодня\n"
         "/month - Расходы за месяц\n"
         "/stats - Статистика\n"
         "/categories - Категории\n"
+        "/alias - Свои названия категорий\n"
         "/clear - Очистить\n"
+        "/import - Импорт из CSV\n"
+        "/export - Выгрузка в CSV\n"
         "/help - Помощь",
         parse_mode='Markdown'
     )
     return ConversationHandler.END
 
 
+@timed_handler
 async def help_command(update: Update, context: CallbackContext) -> int:
     """Команда помощи /help"""
     context.user_data.clear()
     await update.message.reply_text(
         "📚 **Справка:**\n\n"
-        "/add - Добавить расход\n"
+        "/add - Добавить расход (или /add 1500 еда обед)\n"
         "/today - Расходы за сегодня\n"
         "/month - Расходы за месяц\n"
         "/stats - Статистика\n"
         "/categories - Категории\n"
+        "/alias - Свои названия категорий\n"
         "/clear - Очистить\n"
+        "/import - Импорт из CSV\n"
+        "/export - Выгрузка в CSV\n"
         "/cancel - Отмена",
         parse_mode='Markdown'
     )
     return ConversationHandler.END
 
 
+@timed_handler
 async def show_categories(update: Update, context: CallbackContext) -> int:
     """Показать все категории"""
     context.user_data.clear()
-    categories = "\n".join([f"• {cat}" for cat in CATEGORIES])
     await update.message.reply_text(
-        f"📋 **Категории:**\n\n{categories}",
+        f"📋 **Категории:**\n\n{CATEGORIES_TEXT}\n\n"
+        "Можно писать начало названия или свое слово: /alias кафе еда",
         parse_mode='Markdown'
     )
     return ConversationHandler.END
 
 
+@timed_handler
+async def manage_aliases(update: Update, context: CallbackContext) -> int:
+    """Псевдонимы категорий: /alias, /alias кафе еда, /alias кафе -"""
+    context.user_data.clear()
+    user_id = update.effective_user.id
+    args = context.args or []
+
+    if not args:
+        aliases = await adb.get_category_aliases(user_id)
+        listed = "\n".join(f"• {alias} → {category}" for alias, category in sorted(aliases.items()))
+        await update.message.reply_text(
+            (f"🔖 Ваши псевдонимы:\n{listed}\n\n" if aliases else "🔖 Псевдонимов пока нет.\n\n")
+            + "Добавить: /alias кафе еда\nУдалить: /alias кафе -"
+        )
+        return ConversationHandler.END
+
+    alias = normalize_category(args[0])
+    target = ' '.join(args[1:])
+    if not alias or not target:
+        await update.message.reply_text("❌ Формат: /alias кафе еда")
+        return ConversationHandler.END
+
+    if target == '-':
+        if await adb.delete_category_alias(user_id, alias):
+            await update.message.reply_text(f"🗑️ Псевдоним «{alias}» удален.")
+        else:
+            await update.message.reply_text("❌ Такого псевдонима нет.")
+        return ConversationHandler.END
+
+    category = CATEGORY_MATCHER.match(target)
+    if category is None:
+        await update.message.reply_text(f"❌ Категория «{target}» не найдена.\n\n{CATEGORIES_TEXT}")
+        return ConversationHandler.END
+
+    if await adb.set_category_alias(user_id, alias, category):
+        await update.message.reply_text(f"✅ «{alias}» → {category}")
+    else:
+        await update.message.reply_text("❌ Ошибка сохранения")
+    return ConversationHandler.END
+
+
 # ========== ДИАЛОГ ДОБАВЛЕНИЯ РАСХОДА ==========
+@timed_handler
 async def add_expense_start(update: Update, context: CallbackContext) -> int:
-    """Начало добавления расхода"""
-    logger.info(f"Пользователь {update.effective_user.id} начал добавление расхода")
+    """Начало добавления расхода; /add 1500 еда обед добавляет сразу"""
     context.user_data.clear()
 
+    # Текст после команды целиком: в context.args теряются переводы строк
+    parts = update.message.text.split(None, 1)
+    if len(parts) > 1:
+        return await add_expenses_from_text(update, parts[1])
+
+    logger.info(f"Пользователь {update.effective_user.id} начал добавление расхода")
     await update.message.reply_text(
         "💸 **Введите сумму расхода:**\n"
         "Например: 1500 или 1500.50\n\n"
+        "Или сразу одним сообщением: /add 1500 еда обед\n"
         "/cancel для отмены",
         parse_mode='Markdown'
     )
     return AMOUNT
 
 
+@timed_handler
+async def quick_add_expenses(update: Update, context: CallbackContext) -> int:
+    """Сообщение вида "1500 еда обед" вне диалога - добавление без /add"""
+    return await add_expenses_from_text(update, update.message.text)
+
+
+async def add_expenses_from_text(update: Update, text: str) -> int:
+    """Добавление расходов из одного сообщения (по расходу в строке) одним оператором"""
+    user_id = update.effective_user.id
+    expenses, errors = parse_expense_text(text, await adb.get_category_aliases(user_id))
+
+    if not expenses:
+        await update.message.reply_text(
+            "❌ Не удалось разобрать расход.\n\n"
+            + "".join(f"• {error}\n" for error in errors)
+            + "\nФормат: сумма категория [описание], по расходу в строке.\n"
+            "Например: 1500 еда обед"
+        )
+        return ConversationHandler.END
+
+    rows = [(user_id, amount, category, description) for amount, category, description in expenses]
+    if not await adb.add_expenses(rows):
+        await update.message.reply_text("❌ Ошибка сохранения")
+        return ConversationHandler.END
+    logger.info(f"Добавлено расходов одним сообщением: {len(rows)} для пользователя {user_id}")
+
+    # Без Markdown: описание - произвольный текст пользователя
+    lines = [f"✅ Расходов добавлено: {len(expenses)}\n"]
+    for amount, category, description in expenses:
+        lines.append(f"💰 {amount:.2f} руб. - {category}" + (f" ({description})" if description else ""))
+    if len(expenses) > 1:
+        lines.append(f"\nИтого: {sum(amount for amount, _, _ in expenses):.2f} руб.")
+    if errors:
+        lines.append("\n⚠️ Пропущено:\n" + "\n".join(f"• {error}" for error in errors))
+    await update.message.reply_text("\n".join(lines))
+    return ConversationHandler.END
+
+
+@timed_handler
 async def process_amount(update: Update, context: CallbackContext) -> int:
     """Обработка суммы"""
     try:
@@ -86,13 +201,12 @@ async def process_amount(update: Update, context: CallbackContext) -> int:
         context.user_data['amount'] = amount
         logger.info(f"Сумма сохранена: {amount}")
 
-        categories = "\n".join([f"• {cat}" for cat in CATEGORIES])
-
         await update.message.reply_text(
             f"✅ Сумма: {amount:.2f} руб.\n\n"
-            f"📋 **Выберите категорию:**\n\n{categories}\n\n"
-            "✏️ **Введите название категории из списка выше**",
-            parse_mode='Markdown'
+            "📋 **Выберите категорию** кнопкой или введите ее название "
+            "(можно начало, например «транс»)",
+            parse_mode='Markdown',
+            reply_markup=CATEGORY_KEYBOARD
         )
         return CATEGORY
 
@@ -101,33 +215,42 @@ async def process_amount(update: Update, context: CallbackContext) -> int:
         return AMOUNT
 
 
+@timed_handler
 async def process_category(update: Update, context: CallbackContext) -> int:
     """Обработка выбора категории"""
     text = update.message.text.strip()
     logger.info(f"Получена категория: '{text}'")
 
-    if text in CATEGORIES:
-        context.user_data['category'] = text
-        logger.info(f"Категория сохранена: {text}")
+    category = CATEGORY_MATCHER.match(text, await adb.get_category_aliases(update.effective_user.id))
+    if category is not None:
+        context.user_data['category'] = category
+        logger.info(f"Категория сохранена: {category}")
 
         await update.message.reply_text(
-            f"✅ Категория: {text}\n\n"
+            f"✅ Категория: {category}\n\n"
             "📝 **Введите описание (необязательно):**\n"
             "Напишите описание или /skip чтобы пропустить\n"
             "/cancel для отмены",
-            parse_mode='Markdown'
+            parse_mode='Markdown',
+            reply_markup=REMOVE_KEYBOARD
         )
         return DESCRIPTION
+
+    # Вместо всего списка - похожие категории, если они есть
+    candidates = CATEGORY_MATCHER.candidates(text)
+    if candidates:
+        hint = "Возможно, вы имели в виду:\n" + "\n".join(f"• {category}" for category in candidates)
     else:
-        categories = "\n".join([f"• {cat}" for cat in CATEGORIES])
-        await update.message.reply_text(
-            f"❌ Категория не найдена.\n\n**Доступные категории:**\n{categories}\n"
-            "Введите категорию точно как в списке:",
-            parse_mode='Markdown'
-        )
-        return CATEGORY
+        hint = f"**Доступные категории:**\n{CATEGORIES_TEXT}"
+    await update.message.reply_text(
+        f"❌ Категория не найдена.\n\n{hint}\n\nВыберите кнопкой или введите название:",
+        parse_mode='Markdown',
+        reply_markup=CATEGORY_KEYBOARD
+    )
+    return CATEGORY
 
 
+@timed_handler
 async def process_description(update: Update, context: CallbackContext) -> int:
     """Обработка описания"""
     text = update.message.text.strip()
@@ -144,7 +267,7 @@ async def process_description(update: Update, context: CallbackContext) -> int:
         context.user_data.clear()
         return ConversationHandler.END
 
-    success = db.add_expense(user_id, amount, category, text)
+    success = await adb.add_expense(user_id, amount, category, text)
 
     if success:
         response = f"✅ **Расход добавлен!**\n\n💰 {amount:.2f} руб. - {category}"
@@ -160,75 +283,247 @@ async def process_description(update: Update, context: CallbackContext) -> int:
     return ConversationHandler.END
 
 
+# ========== ИМПОРТ ИЗ CSV ==========
+@timed_handler
+async def import_start(update: Update, context: CallbackContext) -> int:
+    """Начало импорта расходов из файла"""
+    context.user_data.clear()
+    await update.message.reply_text(
+        "📥 **Импорт расходов**\n\n"
+        "Отправьте CSV-файл (разделитель `,` или `;`).\n"
+        "Столбцы: сумма, категория, описание, дата - по порядку "
+        "или с заголовком `сумма;категория;описание;дата`.\n"
+        "Дата: 2024-01-31 или 31.01.2024, можно со временем.\n"
+        "В банковской выписке импортируются только списания (с минусом).\n\n"
+        "/cancel для отмены",
+        parse_mode='Markdown'
+    )
+    return IMPORT_FILE
+
+
+def _detect_encoding(path):
+    """UTF-8 или cp1251 (частая кодировка банковских выписок)"""
+    with open(path, 'rb') as f:
+        sample = f.read(64 * 1024)
+    try:
+        sample.decode('utf-8')
+        return 'utf-8-sig'
+    except UnicodeDecodeError as e:
+        # Обрезанный на границе выборки символ - все равно UTF-8
+        if e.start >= len(sample) - 3:
+            return 'utf-8-sig'
+        return 'cp1251'
+
+
+@timed_handler
+async def process_import_file(update: Update, context: CallbackContext) -> int:
+    """Загрузка присланного файла пачками через COPY"""
+    document = update.message.document
+    user_id = update.effective_user.id
+
+    if document.file_size and document.file_size > IMPORT_MAX_FILE_SIZE:
+        await update.message.reply_text("❌ Файл больше 20 МБ. Разбейте его на части.")
+        return IMPORT_FILE
+
+    status = await update.message.reply_text("⏳ Загружаем файл...")
+
+    async def on_progress(result):
+        # Сбой правки статуса (RetryAfter, "message is not modified") не
+        # должен прерывать импорт: часть пачек уже записана
+        try:
+            await status.edit_text(
+                f"⏳ Импорт: добавлено {result['imported']}, пропущено {result['skipped']}"
+            )
+        except Exception as e:
+            logger.warning(f"Не удалось обновить прогресс импорта для пользователя {user_id}: {e}")
+
+    result = {}
+    fd, path = tempfile.mkstemp(suffix='.csv')
+    os.close(fd)
+    try:
+        telegram_file = await document.get_file()
+        await telegram_file.download_to_drive(path)
+
+        with open(path, encoding=_detect_encoding(path), newline='') as f:
+            await import_expenses(adb, user_id, f, on_progress=on_progress, result=result)
+    except Exception as e:
+        logger.error(f"Ошибка импорта для пользователя {user_id}: {e}", exc_info=True)
+        if result.get('imported'):
+            await status.edit_text(
+                f"❌ Импорт прерван из-за ошибки.\n\n"
+                f"Уже добавлено: {result['imported']} (эти расходы сохранены)"
+            )
+        else:
+            await status.edit_text("❌ Не удалось прочитать файл.")
+        return ConversationHandler.END
+    finally:
+        os.remove(path)
+
+    parts = [f"✅ Импорт завершен\n\nДобавлено: {result['imported']}\nПропущено: {result['skipped']}"]
+    if result['income']:
+        parts.append(f"\nЗачисления (не расходы): {result['income']}")
+    if result['failed_chunks']:
+        parts.append(f"\n⚠️ Не записано пачек из-за ошибки БД: {result['failed_chunks']}")
+    if result['errors']:
+        parts.append("\n\nОшибки:\n" + "\n".join(f"• {error}" for error in result['errors']))
+    await status.edit_text("".join(parts))
+    return ConversationHandler.END
+
+
+# ========== ЭКСПОРТ В CSV ==========
+@timed_handler
+async def export_expenses(update: Update, context: CallbackContext) -> int:
+    """Выгрузка всех расходов файлом: /export или /export gz"""
+    context.user_data.clear()
+    user_id = update.effective_user.id
+    compress = bool(context.args) and context.args[0].lower() in ('gz', 'gzip', 'zip')
+    filename = f"expenses_{datetime.now().strftime('%Y%m%d')}.csv" + ('.gz' if compress else '')
+
+    status = await update.message.reply_text("⏳ Готовим выгрузку...")
+
+    fd, path = tempfile.mkstemp(suffix='.csv.gz' if compress else '.csv')
+    os.close(fd)
+    try:
+        count = await write_export(adb, user_id, path, compress)
+        if count == 0:
+            await status.edit_text("📭 Расходов пока нет.")
+            return ConversationHandler.END
+
+        if os.path.getsize(path) > EXPORT_MAX_FILE_SIZE:
+            await status.edit_text("❌ Файл больше 50 МБ. Попробуйте /export gz")
+            return ConversationHandler.END
+
+        with open(path, 'rb') as f:
+            await update.message.reply_document(
+                document=f,
+                filename=filename,
+                caption=f"📤 Расходов: {count}"
+            )
+        await status.delete()
+    except Exception as e:
+        logger.error(f"Ошибка экспорта для пользователя {user_id}: {e}", exc_info=True)
+        await status.edit_text("❌ Не удалось выгрузить расходы.")
+    finally:
+        os.remove(path)
+    return ConversationHandler.END
+
+
+@timed_handler
 async def cancel(update: Update, context: CallbackContext) -> int:
     """Отмена диалога"""
     logger.info(f"Отмена пользователем {update.effective_user.id}")
     context.user_data.clear()
-    await update.message.reply_text("🚫 Операция отменена.")
+    await update.message.reply_text("🚫 Операция отменена.", reply_markup=REMOVE_KEYBOARD)
     return ConversationHandler.END
 
 
 # ========== КОМАНДЫ ПРОСМОТРА ==========
-async def show_today_expenses(update: Update, context: CallbackContext) -> int:
-    """Расходы за сегодня"""
-    context.user_data.clear()
-    user_id = update.effective_user.id
-    expenses = db.get_today_expenses(user_id)
+# Оформление списков по периодам: заголовок, текст без расходов,
+# формат и значок времени расхода
+EXPENSE_LISTS = {
+    'today': ("📅 **Расходы за сегодня:**", "📅 **Сегодня нет расходов.**", "%H:%M", "⏰"),
+    'month': ("📈 **Расходы за месяц:**", "📈 **В этом месяце нет расходов.**", "%d.%m", "📅"),
+}
+PAGE_CALLBACK_PREFIX = 'exp'
+
+
+def render_expenses_page(period, page):
+    """Текст и клавиатура страницы списка расходов"""
+    title, _, date_format, date_icon = EXPENSE_LISTS[period]
+
+    parts = [title, "\n\n"]
+    for _, amount, category, description, date in page['rows']:
+        parts.append(f"• **{amount:.2f} руб.** - {category}\n")
+        if description:
+            parts.append(f"  📝 {description}\n")
+        parts.append(f"  {date_icon} {date.strftime(date_format)}\n\n")
+    parts.append(f"💰 **Итого: {page['total']:.2f} руб.** ({page['count']} зап.)")
 
-    if not expenses:
-        await update.message.reply_text("📅 **Сегодня нет расходов.**")
-        return ConversationHandler.END
+    buttons = []
+    if page['has_newer']:
+        buttons.append(InlineKeyboardButton("⬅️ Новее", callback_data=page_callback_data(period, 'newer', page['rows'][0])))
+    if page['has_older']:
+        buttons.append(InlineKeyboardButton("Старее ➡️", callback_data=page_callback_data(period, 'older', page['rows'][-1])))
 
-    total = sum(exp[1] for exp in expenses)
-    message = "📅 **Расходы за сегодня:**\n\n"
+    keyboard = InlineKeyboardMarkup([buttons]) if buttons else None
+    return "".join(parts), keyboard
 
-    for exp in expenses:
-        amount, category, description, date = exp[1], exp[2], exp[3], exp[4]
-        time_str = date.strftime("%H:%M")
-        message += f"• **{amount:.2f} руб.** - {category}\n"
-        if description:
-            message += f"  📝 {description}\n"
-        message += f"  ⏰ {time_str}\n\n"
 
-    message += f"💰 **Итого: {total:.2f} руб.**"
+def page_callback_data(period, direction, expense):
+    """callback_data кнопки: exp:<период>:<направление>:<created_at>:<id> (до 64 байт)"""
+    return f"{PAGE_CALLBACK_PREFIX}:{period}:{direction}:{expense[4].isoformat()}:{expense[0]}"
 
-    await update.message.reply_text(message, parse_mode='Markdown')
+
+def parse_page_callback(data):
+    """Разбор callback_data кнопки страницы, None при неверном формате"""
+    try:
+        prefix, period, direction, rest = data.split(':', 3)
+        created_at, expense_id = rest.rsplit(':', 1)
+        if prefix != PAGE_CALLBACK_PREFIX or period not in EXPENSE_LISTS or direction not in ('older', 'newer'):
+            return None
+        return period, direction, (datetime.fromisoformat(created_at), int(expense_id))
+    except ValueError:
+        return None
+
+
+async def send_expenses_list(update: Update, period: str) -> int:
+    """Первая страница списка расходов за период"""
+    user_id = update.effective_user.id
+    page = await adb.get_expenses_page(user_id, period, 'first', None)
+
+    if not page['rows']:
+        await update.message.reply_text(EXPENSE_LISTS[period][1])
+        return ConversationHandler.END
+
+    text, keyboard = render_expenses_page(period, page)
+    await update.message.reply_text(text, parse_mode='Markdown', reply_markup=keyboard)
     return ConversationHandler.END
 
 
+@timed_handler
+async def show_today_expenses(update: Update, context: CallbackContext) -> int:
+    """Расходы за сегодня"""
+    context.user_data.clear()
+    return await send_expenses_list(update, 'today')
+
+
+@timed_handler
 async def show_month_expenses(update: Update, context: CallbackContext) -> int:
     """Расходы за месяц"""
     context.user_data.clear()
-    user_id = update.effective_user.id
-    expenses = db.get_month_expenses(user_id)
+    return await send_expenses_list(update, 'month')
 
-    if not expenses:
-        await update.message.reply_text("📈 **В этом месяце нет расходов.**")
-        return ConversationHandler.END
 
-    total = sum(exp[1] for exp in expenses)
-    message = "📈 **Расходы за месяц:**\n\n"
+@timed_handler
+async def show_expenses_page(update: Update, context: CallbackContext) -> int:
+    """Переход по страницам списка расходов (inline-кнопки)"""
+    query = update.callback_query
+    parsed = parse_page_callback(query.data)
+    if not parsed:
+        await query.answer("❌ Устаревшая кнопка")
+        return ConversationHandler.END
 
-    for exp in expenses:
-        amount, category, description, date = exp[1], exp[2], exp[3], exp[4]
-        date_str = date.strftime("%d.%m")
-        message += f"• **{amount:.2f} руб.** - {category}\n"
-        if description:
-            message += f"  📝 {description}\n"
-        message += f"  📅 {date_str}\n\n"
+    period, direction, cursor = parsed
+    page = await adb.get_expenses_page(update.effective_user.id, period, direction, cursor)
+    await query.answer()
 
-    message += f"💰 **Итого: {total:.2f} руб.**"
+    if not page['rows']:
+        await query.edit_message_text(EXPENSE_LISTS[period][1])
+        return ConversationHandler.END
 
-    await update.message.reply_text(message, parse_mode='Markdown')
+    text, keyboard = render_expenses_page(period, page)
+    await query.edit_message_text(text, parse_mode='Markdown', reply_markup=keyboard)
     return ConversationHandler.END
 
 
+@timed_handler
 async def show_stats(update: Update, context: CallbackContext) -> int:
     """Статистика"""
     context.user_data.clear()
     user_id = update.effective_user.id
-    stats = db.get_expenses_by_category(user_id)
-    total = db.get_total_expenses(user_id)
+    summary = await adb.get_user_summary(user_id, 'all')
+    stats = summary['by_category']
+    total = summary['total']
 
     if not stats:
         await update.message.reply_text("📊 **Нет статистики.**")
@@ -246,11 +541,12 @@ async def show_stats(update: Update, context: CallbackContext) -> int:
     return ConversationHandler.END
 
 
+@timed_handler
 async def clear_expenses_start(update: Update, context: CallbackContext) -> int:
     """Начало очистки"""
     context.user_data.clear()
     user_id = update.effective_user.id
-    total = db.get_total_expenses(user_id)
+    total = (await adb.get_user_summary(user_id, 'all'))['total']
 
     if total == 0:
         await update.message.reply_text("🗑️ **Нет расходов для очистки.**")
@@ -267,17 +563,17 @@ async def clear_expenses_start(update: Update, context: CallbackContext) -> int:
     return ConversationHandler.END
 
 
+@timed_handler
 async def handle_clear_confirmation(update: Update, context: CallbackContext) -> int:
     """Обработка подтверждения очистки"""
     text = update.message.text.strip().upper()
     user_id = update.effective_user.id
 
     if text == 'ДА':
-        # Получаем сумму перед удалением для отображения
-        total = db.get_total_expenses(user_id)
-        success = db.clear_user_expenses(user_id)
+        # Удаление возвращает удаленную сумму для отображения
+        total = await adb.delete_all_expenses(user_id)
 
-        if success:
+        if total is not None:
             await update.message.reply_text(f"✅ **Все расходы ({total:.2f} руб.) удалены!**")
         else:
             await update.message.reply_text("❌ Ошибка удаления.")
@@ -290,6 +586,7 @@ async def handle_clear_confirmation(update: Update, context: CallbackContext) ->
     return ConversationHandler.END
 
 
+@timed_handler
 async def handle_message(update: Update, context: CallbackContext) -> int:
     """УМНЫЙ обработчик сообщений - проверяет контекст"""
     text = update.message.text.strip()
@@ -299,11 +596,10 @@ async def handle_message(update: Update, context: CallbackContext) -> int:
     if context.user_data.get('clearing'):
         if text.upper() == 'ДА':
             user_id = update.effective_user.id
-            # Получаем сумму перед удалением для отображения
-            total = db.get_total_expenses(user_id)
-            success = db.clear_user_expenses(user_id)
+            # Удаление возвращает удаленную сумму для отображения
+            total = await adb.delete_all_expenses(user_id)
 
-            if success:
+            if total is not None:
                 await update.message.reply_text(f"✅ **Все расходы ({total:.2f} руб.) удалены!**")
             else:
                 await update.message.reply_text("❌ Ошибка удаления.")
@@ -320,12 +616,15 @@ async def handle_message(update: Update, context: CallbackContext) -> int:
     # 2. Если это не очистка, показываем подсказку
     await update.message.reply_text(
         "🤖 Используйте команды:\n"
-        "/add - Добавить расход\n"
+        "/add - Добавить расход (или /add 1500 еда обед)\n"
         "/today - Расходы за сегодня\n"
         "/month - Расходы за месяц\n"
         "/stats - Статистика\n"
         "/categories - Категории\n"
+        "/alias - Свои названия категорий\n"
         "/clear - Очистить\n"
+        "/import - Импорт из CSV\n"
+        "/export - Выгрузка в CSV\n"
         "/help - Помощь\n"
         "/cancel - Отмена"
     )
@@ -0,0 +1,226 @@
+import csv
+import logging
+from itertools import chain
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from config import IMPORT_CHUNK_SIZE, IMPORT_PROGRESS_ROWS
+from categories import CATEGORY_MATCHER
+
+logger = logging.getLogger(__name__)
+
+# Максимальная сумма, которая помещается в DECIMAL(10, 2)
+MAX_AMOUNT = Decimal('99999999.99')
+# Сколько ошибочных строк показывать пользователю
+MAX_REPORTED_ERRORS = 5
+
+# Названия столбцов в заголовке файла
+COLUMN_ALIASES = {
+    'amount': ('amount', 'sum', 'сумма', 'сумма операции'),
+    'category': ('category', 'категория'),
+    'description': ('description', 'comment', 'описание', 'комментарий', 'назначение'),
+    'date': ('date', 'дата', 'дата операции'),
+}
+# Порядок столбцов в файле без заголовка
+DEFAULT_COLUMNS = ('amount', 'category', 'description', 'date')
+
+DATE_FORMATS = ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d',
+                '%d.%m.%Y %H:%M:%S', '%d.%m.%Y %H:%M', '%d.%m.%Y')
+
+class _SemicolonDialect(csv.excel):
+    """Выписки банков обычно разделены ';'"""
+    delimiter = ';'
+
+
+csv.register_dialect('excel-semicolon', _SemicolonDialect)
+
+
+# Ошибка строки-зачисления: такие строки считаются отдельно от ошибочных
+INCOME = "зачисление, не расход"
+
+
+def parse_signed_amount(text):
+    """Сумма со знаком из строки: '1500', '1 500,50', '-1500.5'"""
+    try:
+        amount = Decimal(text.replace('\xa0', '').replace(' ', '').replace(',', '.'))
+    except InvalidOperation:
+        raise ValueError(f"неверная сумма: {text}")
+    # NaN и Infinity: сравнение NaN бросило бы InvalidOperation, а не ValueError
+    if not amount.is_finite():
+        raise ValueError(f"неверная сумма: {text}")
+    if amount == 0 or abs(amount) > MAX_AMOUNT:
+        raise ValueError(f"сумма вне диапазона: {text}")
+    return amount.quantize(Decimal('0.01'))
+
+
+def parse_amount(text):
+    """Сумма расхода из строки: '1500', '1 500,50' (отрицательная - ошибка)"""
+    amount = parse_signed_amount(text)
+    if amount < 0:
+        raise ValueError("сумма должна быть больше 0")
+    return amount
+
+
+def parse_date(text):
+    """Дата из строки в одном из DATE_FORMATS, None для пустой"""
+    text = text.strip()
+    if not text:
+        return None
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, date_format)
+        except ValueError:
+            continue
+    raise ValueError(f"неизвестный формат даты: {text}")
+
+
+def _column_positions(header):
+    """Позиции столбцов по заголовку, None если первая строка не заголовок"""
+    names = [cell.strip().lower() for cell in header]
+    positions = {}
+    for column, aliases in COLUMN_ALIASES.items():
+        for index, name in enumerate(names):
+            if name in aliases:
+                positions[column] = index
+                break
+    if 'amount' in positions and 'category' in positions:
+        return positions
+    return None
+
+
+def _csv_rows(lines):
+    """(номер строки, ячейки, позиции столбцов) для непустых строк CSV"""
+    lines = iter(lines)
+    first = next(lines, None)
+    if first is None:
+        return
+
+    dialect = 'excel-semicolon' if first.count(';') > first.count(',') else 'excel'
+
+    reader = csv.reader(chain([first], lines), dialect=dialect)
+    header = next(reader)
+    positions = _column_positions(header)
+    if positions is None:
+        # Заголовка нет - первая строка тоже данные
+        positions = {column: index for index, column in enumerate(DEFAULT_COLUMNS)}
+        reader_rows = chain([header], reader)
+    else:
+        reader_rows = reader
+
+    for cells in reader_rows:
+        if any(cell.strip() for cell in cells):
+            yield reader.line_num, cells, positions
+
+
+def expense_sign(lines):
+    """Знак, которым в файле записаны расходы.
+
+    В банковской выписке списания идут с минусом, а зачисления (доход,
+    возвраты, входящие переводы) - с плюсом: если в файле есть хоть одна
+    отрицательная сумма, расходы - отрицательные суммы (-1). Иначе это
+    список расходов, как в /export, и расходы - все суммы (1).
+    """
+    for _, cells, positions in _csv_rows(lines):
+        try:
+            if parse_signed_amount(_cell(cells, positions, 'amount')) < 0:
+                return -1
+        except ValueError:
+            continue
+    return 1
+
+
+def read_expense_rows(lines, aliases=None, sign=1):
+    """Построчный разбор CSV (',' или ';').
+
+    lines - итератор строк (открытый файл). Файл целиком в память не
+    читается. Выдает (номер строки, (amount, category, description,
+    created_at), None) или (номер строки, None, текст ошибки). aliases -
+    псевдонимы категорий пользователя. sign - знак расходов (expense_sign):
+    строки с суммой другого знака выдаются с ошибкой INCOME.
+    """
+    for line_no, cells, positions in _csv_rows(lines):
+        try:
+            amount = parse_signed_amount(_cell(cells, positions, 'amount'))
+            if amount * sign < 0:
+                yield line_no, None, INCOME
+                continue
+            amount = abs(amount)
+            # Только точное название: угаданная категория при импорте осталась бы незамеченной
+            category = CATEGORY_MATCHER.exact(_cell(cells, positions, 'category'), aliases)
+            if category is None:
+                raise ValueError(f"неизвестная категория: {_cell(cells, positions, 'category')}")
+            description = _cell(cells, positions, 'description').strip() or None
+            created_at = parse_date(_cell(cells, positions, 'date'))
+        except ValueError as e:
+            yield line_no, None, str(e)
+            continue
+        yield line_no, (amount, category, description, created_at), None
+
+
+def _cell(cells, positions, column):
+    index = positions.get(column)
+    if index is None or index >= len(cells):
+        return ''
+    return cells[index]
+
+
+async def import_expenses(database, user_id, lines, on_progress=None,
+                          chunk_size=IMPORT_CHUNK_SIZE, progress_every=IMPORT_PROGRESS_ROWS, result=None):
+    """Потоковый импорт расходов пользователя.
+
+    Строки разбираются по одной и уходят в БД пачками по chunk_size через
+    COPY, поэтому память не зависит от размера файла. on_progress(result)
+    вызывается примерно каждые progress_every обработанных строк.
+
+    lines - открытый файл: он читается дважды, сначала expense_sign
+    определяет знак расходов. Зачисления выписки не импортируются и
+    считаются в result['income'].
+
+    result - словарь для итогов: если импорт прервется исключением, в нем
+    останется число уже записанных строк.
+    """
+    if result is None:
+        result = {}
+    result.update({'imported': 0, 'skipped': 0, 'income': 0, 'failed_chunks': 0, 'errors': []})
+    chunk = []
+    next_progress = progress_every
+    aliases = await database.get_category_aliases(user_id)
+    sign = expense_sign(lines)
+    lines.seek(0)
+
+    async def flush():
+        count = await database.copy_expenses(user_id, chunk)
+        if count is None:
+            result['failed_chunks'] += 1
+            result['skipped'] += len(chunk)
+        else:
+            result['imported'] += count
+        chunk.clear()
+
+    for line_no, row, error in read_expense_rows(lines, aliases, sign):
+        if error == INCOME:
+            result['income'] += 1
+            continue
+        if error:
+            result['skipped'] += 1
+            if len(result['errors']) < MAX_REPORTED_ERRORS:
+                result['errors'].append(f"строка {line_no}: {error}")
+            continue
+
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            await flush()
+
+        processed = result['imported'] + result['skipped'] + result['income'] + len(chunk)
+        if on_progress and processed >= next_progress:
+            next_progress += progress_every
+            await on_progress(result)
+
+    if chunk:
+        await flush()
+
+    logger.info(
+        f"✅ Импорт для пользователя {user_id}: добавлено {result['imported']}, "
+        f"пропущено {result['skipped']}, зачислений {result['income']}"
+    )
+    return result
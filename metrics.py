@@ -0,0 +1,229 @@
+import time
+import inspect
+import threading
+from bisect import bisect_left
+from functools import wraps
+
+# Границы корзин гистограмм задержки, с
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{value}"' for name, value in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Registry:
+    """Набор метрик и функций, которые отдают значения в момент запроса /metrics"""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collect):
+        """collect() -> [(имя, тип, описание, [(метки dict, значение), ...]), ...]"""
+        self._collectors.append(collect)
+
+    def render(self):
+        """Все метрики в текстовом формате Prometheus"""
+        lines = []
+        for metric in self._metrics:
+            metric.render(lines)
+        for collect in self._collectors:
+            for name, kind, help_text, samples in collect():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    label_text = _format_labels(labels.keys(), labels.values())
+                    lines.append(f"{name}{label_text} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+class _CounterChild:
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Counter:
+    """Счетчик с метками. Наборы меток создаются заранее через labels()"""
+
+    def __init__(self, name, help_text, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._children[()] = _CounterChild()
+        registry.register(self)
+
+    def labels(self, *values):
+        """Счетчик для набора меток (получать один раз, а не на каждый вызов)"""
+        values = tuple(str(value) for value in values)
+        with self._lock:
+            child = self._children.get(values)
+            if child is None:
+                child = self._children[values] = _CounterChild()
+            return child
+
+    def inc(self, amount=1):
+        self._children[()].inc(amount)
+
+    def render(self, lines):
+        lines.append(f"# HELP {self.name} {self.help_text}")
+        lines.append(f"# TYPE {self.name} counter")
+        with self._lock:
+            children = list(self._children.items())
+        for values, child in children:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, values)} {child.value}")
+
+
+class _HistogramChild:
+    __slots__ = ('upper_bounds', 'counts', 'sum', '_lock')
+
+    def __init__(self, upper_bounds):
+        self.upper_bounds = upper_bounds
+        # Последняя корзина - +Inf
+        self.counts = [0] * (len(upper_bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.upper_bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.sum
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами. observe() - поиск корзины и два сложения"""
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS, registry=REGISTRY):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._children[()] = _HistogramChild(self.buckets)
+        registry.register(self)
+
+    def labels(self, *values):
+        """Гистограмма для набора меток (получать один раз, а не на каждый вызов)"""
+        values = tuple(str(value) for value in values)
+        with self._lock:
+            child = self._children.get(values)
+            if child is None:
+                child = self._children[values] = _HistogramChild(self.buckets)
+            return child
+
+    def observe(self, value):
+        self._children[()].observe(value)
+
+    def render(self, lines):
+        lines.append(f"# HELP {self.name} {self.help_text}")
+        lines.append(f"# TYPE {self.name} histogram")
+        with self._lock:
+            children = list(self._children.items())
+        for values, child in children:
+            counts, total = child.snapshot()
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, values, [('le', _format_value(bound))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {total!r}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+
+
+def _timed(func, histogram, errors=None):
+    """Обертка, которая пишет время вызова func в histogram (и исключения в errors)"""
+    if inspect.iscoroutinefunction(func):
+        @wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            except BaseException:
+                if errors is not None:
+                    errors.inc()
+                raise
+            finally:
+                histogram.observe(time.perf_counter() - started)
+        return async_wrapper
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except BaseException:
+            if errors is not None:
+                errors.inc()
+            raise
+        finally:
+            histogram.observe(time.perf_counter() - started)
+    return wrapper
+
+
+# ========== МЕТРИКИ ПРИЛОЖЕНИЯ ==========
+
+HANDLER_LATENCY = Histogram(
+    'tgbot_handler_duration_seconds', 'Время обработчика Telegram', ['handler']
+)
+HANDLER_EXCEPTIONS = Counter(
+    'tgbot_handler_exceptions_total', 'Необработанные исключения в обработчиках', ['handler']
+)
+DB_QUERY_LATENCY = Histogram(
+    'tgbot_db_query_duration_seconds', 'Время метода слоя БД', ['layer', 'method']
+)
+
+WEBHOOK_OUTCOMES = ('ok', 'queue_full', 'bad_request', 'not_initialized', 'error')
+WEBHOOK_REQUESTS = Counter(
+    'tgbot_webhook_requests_total', 'Запросы к /webhook по результату', ['outcome']
+)
+# Все исходы заранее: ряды есть с нуля, а в маршруте - готовые объекты
+WEBHOOK_RESULT = {outcome: WEBHOOK_REQUESTS.labels(outcome) for outcome in WEBHOOK_OUTCOMES}
+
+
+def timed_handler(func):
+    """Декоратор обработчика: гистограмма времени и счетчик исключений по имени функции"""
+    return _timed(func, HANDLER_LATENCY.labels(func.__name__), HANDLER_EXCEPTIONS.labels(func.__name__))
+
+
+def timed_query(layer):
+    """Декоратор метода БД: гистограмма времени с метками layer и именем метода"""
+    def decorator(func):
+        return _timed(func, DB_QUERY_LATENCY.labels(layer, func.__name__))
+    return decorator
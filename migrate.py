@@ -0,0 +1,245 @@
+# migrate.py
+# Версионные миграции схемы БД.
+#
+# Скрипты лежат в migrations/ и называются NNNN_описание.sql. Они
+# применяются по порядку номеров, примененные версии записываются в
+# таблицу schema_version. Параллельные процессы сериализуются advisory
+# lock'ом, поэтому несколько воркеров могут стартовать одновременно.
+#
+# Скрипт с первой строкой "-- migrate: no-transaction" выполняется вне
+# транзакции по одному оператору (нужно для CREATE INDEX CONCURRENTLY).
+# Операторы в таком скрипте должны заканчиваться ';' в конце строки.
+#
+#     python migrate.py status
+#     python migrate.py up [--target N]
+import os
+import re
+import sys
+import time
+import logging
+import argparse
+
+import psycopg2
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+# Произвольный постоянный ключ advisory lock для миграций
+MIGRATION_LOCK_ID = 73910001
+# Сколько ждать, пока миграции применяет другой процесс, с
+LOCK_TIMEOUT = 600
+LOCK_POLL_INTERVAL = 0.5
+
+NO_TRANSACTION_MARKER = '-- migrate: no-transaction'
+_FILENAME_RE = re.compile(r'^(\d+)_([\w-]+)\.sql$')
+
+
+class MigrationError(Exception):
+    """Ошибка загрузки или применения миграции"""
+
+
+class Migration:
+    """Один скрипт миграции"""
+
+    def __init__(self, version, name, sql):
+        self.version = version
+        self.name = name
+        self.sql = sql
+        self.transactional = not sql.lstrip().startswith(NO_TRANSACTION_MARKER)
+
+    def statements(self):
+        """Операторы скрипта по отдельности (для no-transaction миграций)"""
+        statements, current, in_body = [], [], False
+        for line in self.sql.splitlines():
+            if line.strip().startswith('--') and not current:
+                continue
+            current.append(line)
+            # ';' внутри тела $$ ... $$ (DO-блок) не завершает оператор
+            if line.count('$$') % 2:
+                in_body = not in_body
+            if not in_body and line.rstrip().endswith(';'):
+                statement = '\n'.join(current).strip()
+                if statement.rstrip(';').strip():
+                    statements.append(statement)
+                current = []
+        tail = '\n'.join(current).strip()
+        if tail:
+            statements.append(tail)
+        return statements
+
+    def __repr__(self):
+        return f"Migration({self.version}, {self.name!r})"
+
+
+def load_migrations(directory=MIGRATIONS_DIR):
+    """Все миграции из каталога, отсортированные по версии"""
+    migrations = {}
+    for filename in sorted(os.listdir(directory)):
+        match = _FILENAME_RE.match(filename)
+        if not match:
+            continue
+        version = int(match.group(1))
+        if version in migrations:
+            raise MigrationError(f"Повторяющаяся версия миграции {version}: {filename}")
+        with open(os.path.join(directory, filename), encoding='utf-8') as f:
+            migrations[version] = Migration(version, match.group(2), f.read())
+    return [migrations[v] for v in sorted(migrations)]
+
+
+def latest_version(migrations=None):
+    """Версия схемы, которую ожидает код"""
+    migrations = load_migrations() if migrations is None else migrations
+    return migrations[-1].version if migrations else 0
+
+
+def get_current_version(connection):
+    """Текущая версия схемы в БД (0, если миграции не применялись).
+
+    Один запрос - используется как дешевая проверка при старте.
+    """
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+        except psycopg2.errors.UndefinedTable:
+            return 0
+        return cursor.fetchone()[0]
+
+
+def get_applied_versions(connection):
+    """Множество примененных версий (пустое, если миграции не применялись)"""
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute("SELECT version FROM schema_version")
+        except psycopg2.errors.UndefinedTable:
+            return set()
+        return {row[0] for row in cursor.fetchall()}
+
+
+def _ensure_version_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name VARCHAR(200) NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def _apply(connection, migration):
+    """Применение одной миграции с записью версии"""
+    with connection.cursor() as cursor:
+        if migration.transactional:
+            cursor.execute("BEGIN")
+            try:
+                cursor.execute(migration.sql)
+                cursor.execute(
+                    "INSERT INTO schema_version (version, name) VALUES (%s, %s)",
+                    (migration.version, migration.name)
+                )
+                cursor.execute("COMMIT")
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+        else:
+            for statement in migration.statements():
+                cursor.execute(statement)
+            cursor.execute(
+                "INSERT INTO schema_version (version, name) VALUES (%s, %s)",
+                (migration.version, migration.name)
+            )
+
+
+def _acquire_lock(connection, timeout=LOCK_TIMEOUT):
+    """Захват advisory lock миграций.
+
+    Ждем через pg_try_advisory_lock, а не блокирующий pg_advisory_lock:
+    сессия, висящая в ожидании блокировки, держит открытую транзакцию,
+    и CREATE INDEX CONCURRENTLY у владельца блокировки ждал бы ее вечно.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_try_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+            if cursor.fetchone()[0]:
+                return
+        if time.monotonic() >= deadline:
+            raise MigrationError(f"Не удалось захватить блокировку миграций за {timeout} с")
+        time.sleep(LOCK_POLL_INTERVAL)
+
+
+def migrate(connection, target=None, migrations=None):
+    """Применение всех недостающих миграций (до target включительно).
+
+    Соединение должно быть в режиме autocommit. Возвращает список
+    примененных миграций.
+    """
+    migrations = load_migrations() if migrations is None else migrations
+    applied_now = []
+
+    _acquire_lock(connection)
+    try:
+        with connection.cursor() as cursor:
+            _ensure_version_table(cursor)
+            cursor.execute("SELECT version FROM schema_version")
+            applied = {row[0] for row in cursor.fetchall()}
+
+        for migration in migrations:
+            if target is not None and migration.version > target:
+                break
+            if migration.version in applied:
+                continue
+            logger.info(f"🔄 Применяем миграцию {migration.version:04d}_{migration.name}...")
+            try:
+                _apply(connection, migration)
+            except Exception as e:
+                raise MigrationError(
+                    f"Миграция {migration.version:04d}_{migration.name} не применена: {e}"
+                ) from e
+            applied_now.append(migration)
+            logger.info(f"✅ Миграция {migration.version:04d}_{migration.name} применена")
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
+
+    return applied_now
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Миграции схемы БД")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('status', help="Текущая и ожидаемая версии схемы")
+    up = subparsers.add_parser('up', help="Применить недостающие миграции")
+    up.add_argument('--target', type=int, default=None, help="Применить до версии N включительно")
+    args = parser.parse_args(argv)
+
+    from database_postgres import get_connection_string
+
+    connection_string = get_connection_string()
+    if not connection_string:
+        print("❌ DATABASE_URL не установлен")
+        return 1
+
+    connection = psycopg2.connect(connection_string, connect_timeout=10)
+    connection.autocommit = True
+    try:
+        migrations = load_migrations()
+        if args.command == 'status':
+            current = get_current_version(connection)
+            applied = get_applied_versions(connection)
+            print(f"Версия схемы в БД: {current}")
+            print(f"Последняя миграция: {latest_version(migrations)}")
+            for migration in migrations:
+                # Пропущенная младшая версия не считается примененной
+                mark = '✅' if migration.version in applied else '⏳'
+                print(f"  {mark} {migration.version:04d}_{migration.name}")
+        else:
+            applied = migrate(connection, target=args.target, migrations=migrations)
+            print(f"Применено миграций: {len(applied)}")
+    finally:
+        connection.close()
+    return 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+    sys.exit(main())
@@ -0,0 +1,34 @@
+-- migrate: no-transaction
+-- Индекс для выборок пользователя за период. INCLUDE позволяет считать суммы
+-- по категориям index-only сканом; description не включаем - длинный текст
+-- превысит лимит размера строки индекса.
+-- CONCURRENTLY не блокирует запись в expenses на время построения.
+
+-- Прерванное построение CONCURRENTLY оставляет индекс INVALID, а IF NOT EXISTS
+-- такой индекс пропустил бы - удаляем его и строим заново
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM pg_index
+        WHERE indexrelid = to_regclass('idx_expenses_user_created') AND NOT indisvalid
+    ) THEN
+        DROP INDEX idx_expenses_user_created;
+    END IF;
+END
+$$;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_expenses_user_created
+    ON expenses (user_id, created_at DESC)
+    INCLUDE (id, amount, category);
+
+-- Миграция не записывается примененной, пока индекс не стал валидным
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM pg_index
+        WHERE indexrelid = to_regclass('idx_expenses_user_created') AND NOT indisvalid
+    ) THEN
+        RAISE EXCEPTION 'Индекс idx_expenses_user_created не построен (INVALID)';
+    END IF;
+END
+$$;
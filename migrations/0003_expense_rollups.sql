@@ -0,0 +1,29 @@
+-- Агрегаты расходов по пользователю, периоду и категории.
+-- period_kind: 'd' - день (period_start = дата), 'm' - месяц (первое число).
+-- Обновляются тем же оператором, что добавляет/удаляет расходы, поэтому
+-- статистика читается отсюда, а не суммированием всей истории.
+
+CREATE TABLE IF NOT EXISTS expense_rollups (
+    user_id BIGINT NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+    period_kind CHAR(1) NOT NULL CHECK (period_kind IN ('d', 'm')),
+    period_start DATE NOT NULL,
+    category VARCHAR(50) NOT NULL,
+    total DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    expense_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, period_kind, period_start, category)
+);
+
+-- Заполнение по уже существующим расходам
+INSERT INTO expense_rollups (user_id, period_kind, period_start, category, total, expense_count)
+SELECT e.user_id,
+       k.kind,
+       CASE k.kind WHEN 'd' THEN e.created_at::date
+                   ELSE date_trunc('month', e.created_at)::date END,
+       e.category,
+       SUM(e.amount),
+       COUNT(*)
+FROM expenses e
+CROSS JOIN (VALUES ('d'), ('m')) AS k(kind)
+WHERE e.user_id IS NOT NULL
+GROUP BY 1, 2, 3, 4
+ON CONFLICT (user_id, period_kind, period_start, category) DO NOTHING;
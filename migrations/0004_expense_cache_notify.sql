@@ -0,0 +1,35 @@
+-- Уведомление о записи в expenses для сброса кеша в других процессах
+-- (cache.PostgresInvalidationListener, CACHE_BACKEND=postgres).
+-- Триггеры уровня оператора с таблицами переходов: при массовой вставке
+-- уходит по одному уведомлению на пользователя, а не на строку.
+
+CREATE OR REPLACE FUNCTION notify_expense_cache() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        PERFORM pg_notify('expense_cache', user_id::text)
+        FROM (SELECT DISTINCT user_id FROM old_rows WHERE user_id IS NOT NULL) AS changed;
+    ELSE
+        PERFORM pg_notify('expense_cache', user_id::text)
+        FROM (SELECT DISTINCT user_id FROM new_rows WHERE user_id IS NOT NULL) AS changed;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS expenses_cache_insert ON expenses;
+CREATE TRIGGER expenses_cache_insert
+    AFTER INSERT ON expenses
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_expense_cache();
+
+DROP TRIGGER IF EXISTS expenses_cache_delete ON expenses;
+CREATE TRIGGER expenses_cache_delete
+    AFTER DELETE ON expenses
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_expense_cache();
+
+DROP TRIGGER IF EXISTS expenses_cache_update ON expenses;
+CREATE TRIGGER expenses_cache_update
+    AFTER UPDATE ON expenses
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_expense_cache();
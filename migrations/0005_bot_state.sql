@@ -0,0 +1,22 @@
+-- Состояние диалогов бота (persistence.PostgresPersistence, STATE_BACKEND=postgres).
+-- Общее для всех воркеров: следующее сообщение пользователя может попасть
+-- в другой процесс. Значения сериализованы pickle - строки короткие.
+
+CREATE TABLE IF NOT EXISTS bot_user_data (
+    user_id BIGINT PRIMARY KEY,
+    data BYTEA NOT NULL,
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+-- key - ключ ConversationHandler ([chat_id, user_id]), user_id - для
+-- загрузки всех диалогов пользователя одним запросом
+CREATE TABLE IF NOT EXISTS bot_conversations (
+    name TEXT NOT NULL,
+    key JSONB NOT NULL,
+    user_id BIGINT,
+    state BYTEA NOT NULL,
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (name, key)
+);
+
+CREATE INDEX IF NOT EXISTS idx_bot_conversations_user ON bot_conversations (user_id);
@@ -0,0 +1,150 @@
+-- Секционирование expenses по месяцам created_at.
+-- Запросы за день/месяц (полуоткрытые диапазоны по created_at) читают
+-- только свои разделы, удаление и VACUUM идут по небольшим таблицам,
+-- старые месяцы можно отсоединить целиком (partitions.py archive).
+--
+-- Разделы expenses_YYYY_MM создает create_expense_partition; строки вне
+-- существующих разделов попадают в expenses_default и переносятся в свой
+-- раздел при следующем ensure_expense_partitions. Данные копируются в
+-- новую таблицу в транзакции миграции.
+
+ALTER TABLE expenses RENAME TO expenses_unpartitioned;
+ALTER TABLE expenses_unpartitioned RENAME CONSTRAINT expenses_pkey TO expenses_unpartitioned_pkey;
+ALTER INDEX IF EXISTS idx_expenses_user_created RENAME TO idx_expenses_unpartitioned_user_created;
+DROP TRIGGER IF EXISTS expenses_cache_insert ON expenses_unpartitioned;
+DROP TRIGGER IF EXISTS expenses_cache_delete ON expenses_unpartitioned;
+DROP TRIGGER IF EXISTS expenses_cache_update ON expenses_unpartitioned;
+
+-- Первичный ключ секционированной таблицы обязан включать ключ секционирования
+CREATE TABLE expenses (
+    id INTEGER NOT NULL DEFAULT nextval('expenses_id_seq'),
+    user_id BIGINT REFERENCES users(user_id) ON DELETE CASCADE,
+    amount DECIMAL(10, 2) NOT NULL,
+    category VARCHAR(50) NOT NULL,
+    description TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+ALTER SEQUENCE expenses_id_seq OWNED BY expenses.id;
+
+CREATE TABLE expenses_default PARTITION OF expenses DEFAULT;
+
+CREATE INDEX idx_expenses_user_created
+    ON expenses (user_id, created_at DESC)
+    INCLUDE (id, amount, category);
+
+CREATE SCHEMA IF NOT EXISTS expenses_archive;
+
+-- Раздел месяца, в который попадает month. Строки этого месяца из
+-- expenses_default переносятся в него. false - раздел уже есть
+CREATE OR REPLACE FUNCTION create_expense_partition(month DATE) RETURNS BOOLEAN AS $$
+DECLARE
+    start_at DATE := date_trunc('month', month)::date;
+    end_at DATE := (date_trunc('month', month) + INTERVAL '1 month')::date;
+    partition_name TEXT := 'expenses_' || to_char(month, 'YYYY_MM');
+BEGIN
+    -- Разделы создаются одним процессом за раз
+    PERFORM pg_advisory_xact_lock(73910002);
+    IF to_regclass(partition_name) IS NOT NULL THEN
+        RETURN false;
+    END IF;
+
+    -- Запись в expenses ждет до конца транзакции: иначе параллельная
+    -- вставка попадет в expenses_default уже после переноса строк.
+    -- Отдельная таблица и ATTACH, а не PARTITION OF, - чтение при этом
+    -- не блокируется
+    LOCK TABLE expenses IN SHARE ROW EXCLUSIVE MODE;
+    EXECUTE format('CREATE TABLE %I (LIKE expenses INCLUDING DEFAULTS)', partition_name);
+    EXECUTE format(
+        'WITH moved AS (DELETE FROM expenses_default WHERE created_at >= %L AND created_at < %L RETURNING *) '
+        'INSERT INTO %I SELECT * FROM moved',
+        start_at, end_at, partition_name
+    );
+    EXECUTE format(
+        'ALTER TABLE expenses ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+        partition_name, start_at, end_at
+    );
+    RETURN true;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Разделы на текущий и months_ahead следующих месяцев, а также для
+-- месяцев, строки которых лежат в expenses_default. Возвращает число новых
+CREATE OR REPLACE FUNCTION ensure_expense_partitions(months_ahead INTEGER) RETURNS INTEGER AS $$
+DECLARE
+    month DATE;
+    created INTEGER := 0;
+BEGIN
+    FOR month IN
+        SELECT generate_series(
+            date_trunc('month', LOCALTIMESTAMP),
+            date_trunc('month', LOCALTIMESTAMP) + make_interval(months => months_ahead),
+            INTERVAL '1 month'
+        )::date
+        UNION
+        SELECT DISTINCT date_trunc('month', created_at)::date FROM expenses_default
+        ORDER BY 1
+    LOOP
+        IF create_expense_partition(month) THEN
+            created := created + 1;
+        END IF;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Отсоединение разделов месяцев раньше keep_from в схему expenses_archive.
+-- Внешний ключ на users остается: удаление пользователя чистит и архив
+CREATE OR REPLACE FUNCTION archive_expense_partitions(keep_from DATE) RETURNS SETOF TEXT AS $$
+DECLARE
+    partition_name TEXT;
+BEGIN
+    PERFORM pg_advisory_xact_lock(73910002);
+    FOR partition_name IN
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'expenses'::regclass
+        AND c.relname ~ '^expenses_\d{4}_\d{2}$'
+        AND to_date(substr(c.relname, 10), 'YYYY_MM') < keep_from
+        ORDER BY c.relname
+    LOOP
+        EXECUTE format('ALTER TABLE expenses DETACH PARTITION %I', partition_name);
+        EXECUTE format('ALTER TABLE %I SET SCHEMA expenses_archive', partition_name);
+        RETURN NEXT partition_name;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Разделы под уже накопленные расходы и на три месяца вперед
+SELECT create_expense_partition(month::date)
+FROM generate_series(
+    date_trunc('month', COALESCE((SELECT MIN(created_at) FROM expenses_unpartitioned), LOCALTIMESTAMP)),
+    date_trunc('month', LOCALTIMESTAMP) + INTERVAL '3 months',
+    INTERVAL '1 month'
+) AS month;
+
+INSERT INTO expenses (id, user_id, amount, category, description, created_at)
+SELECT id, user_id, amount, category, description, COALESCE(created_at, CURRENT_TIMESTAMP)
+FROM expenses_unpartitioned;
+
+DROP TABLE expenses_unpartitioned;
+
+-- Триггеры сброса кеша (0004) - на новой таблице, после переноса данных
+CREATE TRIGGER expenses_cache_insert
+    AFTER INSERT ON expenses
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_expense_cache();
+
+CREATE TRIGGER expenses_cache_delete
+    AFTER DELETE ON expenses
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_expense_cache();
+
+CREATE TRIGGER expenses_cache_update
+    AFTER UPDATE ON expenses
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_expense_cache();
+
+ANALYZE expenses;
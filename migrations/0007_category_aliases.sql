@@ -0,0 +1,29 @@
+-- Псевдонимы категорий пользователя (/alias кафе еда). alias хранится
+-- нормализованным (categories.normalize_category), поиск - по ключу.
+
+CREATE TABLE IF NOT EXISTS category_aliases (
+    user_id BIGINT NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+    alias VARCHAR(50) NOT NULL,
+    category VARCHAR(50) NOT NULL,
+    PRIMARY KEY (user_id, alias)
+);
+
+-- Псевдонимы кешируются вместе с остальными данными пользователя:
+-- изменения сбрасывают кеш и в других процессах (CACHE_BACKEND=postgres)
+DROP TRIGGER IF EXISTS category_aliases_cache_insert ON category_aliases;
+CREATE TRIGGER category_aliases_cache_insert
+    AFTER INSERT ON category_aliases
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_expense_cache();
+
+DROP TRIGGER IF EXISTS category_aliases_cache_delete ON category_aliases;
+CREATE TRIGGER category_aliases_cache_delete
+    AFTER DELETE ON category_aliases
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_expense_cache();
+
+DROP TRIGGER IF EXISTS category_aliases_cache_update ON category_aliases;
+CREATE TRIGGER category_aliases_cache_update
+    AFTER UPDATE ON category_aliases
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_expense_cache();
@@ -0,0 +1,65 @@
+-- Справочник категорий: вместо названия (VARCHAR с эмодзи в каждой строке)
+-- expenses, expense_rollups и category_aliases хранят SMALLINT id.
+-- Строка expenses становится короче, индекс idx_expenses_user_created
+-- (INCLUDE category_id) - тоже, GROUP BY сравнивает числа.
+--
+-- Столбцы меняются через ALTER COLUMN ... TYPE USING: таблица и ее
+-- индексы переписываются один раз, без мертвых версий строк, как после
+-- UPDATE. На время миграции запись и чтение таблиц блокируются.
+-- Отсоединенные разделы в expenses_archive не меняются.
+
+CREATE TABLE IF NOT EXISTS categories (
+    id SMALLINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    name VARCHAR(50) NOT NULL UNIQUE
+);
+
+-- Встроенные категории в порядке config.CATEGORIES (при старте
+-- приложение добавит новые из config), затем прочие уже записанные названия
+INSERT INTO categories (name)
+SELECT name
+FROM unnest(ARRAY[
+    '🍔 Еда', '🚗 Транспорт', '🏠 Жилье', '⚡ Коммунальные', '👕 Одежда',
+    '💊 Здоровье', '🎉 Развлечения', '🎁 Подарки', '📚 Образование', '💼 Бизнес',
+    '✈️ Путешествия', '📱 Техника', '🐶 Домашние животные', '💸 Другое'
+]) WITH ORDINALITY AS t(name, position)
+ORDER BY position
+ON CONFLICT (name) DO NOTHING;
+
+INSERT INTO categories (name)
+SELECT category FROM expenses
+UNION
+SELECT category FROM expense_rollups
+UNION
+SELECT category FROM category_aliases
+ORDER BY 1
+ON CONFLICT (name) DO NOTHING;
+
+-- Выражение USING не может содержать подзапрос - поиск id в функции
+CREATE FUNCTION category_id_by_name(category_name TEXT) RETURNS SMALLINT AS $$
+    SELECT id FROM categories WHERE name = category_name
+$$ LANGUAGE sql STABLE;
+
+-- Изменение типа распространяется на все разделы expenses
+ALTER TABLE expenses
+    ALTER COLUMN category TYPE SMALLINT USING category_id_by_name(category);
+ALTER TABLE expenses RENAME COLUMN category TO category_id;
+ALTER TABLE expenses
+    ADD CONSTRAINT expenses_category_id_fkey FOREIGN KEY (category_id) REFERENCES categories(id);
+
+ALTER TABLE expense_rollups
+    ALTER COLUMN category TYPE SMALLINT USING category_id_by_name(category);
+ALTER TABLE expense_rollups RENAME COLUMN category TO category_id;
+ALTER TABLE expense_rollups
+    ADD CONSTRAINT expense_rollups_category_id_fkey FOREIGN KEY (category_id) REFERENCES categories(id);
+
+ALTER TABLE category_aliases
+    ALTER COLUMN category TYPE SMALLINT USING category_id_by_name(category);
+ALTER TABLE category_aliases RENAME COLUMN category TO category_id;
+ALTER TABLE category_aliases
+    ADD CONSTRAINT category_aliases_category_id_fkey FOREIGN KEY (category_id) REFERENCES categories(id);
+
+DROP FUNCTION category_id_by_name(TEXT);
+
+ANALYZE categories;
+ANALYZE expenses;
+ANALYZE expense_rollups;
@@ -0,0 +1,28 @@
+-- Удаление расходов пользователя из отсоединенных разделов expenses_archive.
+-- "Удалить все расходы" удаляет и агрегаты архивных месяцев, а rollups.py
+-- rebuild их не восстанавливает - поэтому строки архива удаляются вместе
+-- с ними, иначе они пережили бы очистку без итогов в /stats.
+-- Возвращает число удаленных строк.
+
+CREATE OR REPLACE FUNCTION delete_archived_expenses(target_user_id BIGINT) RETURNS BIGINT AS $$
+DECLARE
+    partition_name TEXT;
+    deleted BIGINT := 0;
+    partition_deleted BIGINT;
+BEGIN
+    FOR partition_name IN
+        SELECT c.relname
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = 'expenses_archive'
+        AND c.relkind = 'r'
+        AND c.relname ~ '^expenses_\d{4}_\d{2}$'
+    LOOP
+        EXECUTE format('DELETE FROM expenses_archive.%I WHERE user_id = $1', partition_name)
+            USING target_user_id;
+        GET DIAGNOSTICS partition_deleted = ROW_COUNT;
+        deleted := deleted + partition_deleted;
+    END LOOP;
+    RETURN deleted;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,10 @@
+-- Состояние диалогов в JSONB вместо pickle: pickle.loads строки из общей
+-- таблицы выполнил бы код каждого, кто может писать в нее, во всех
+-- воркерах. user_data и состояния диалогов - числа и строки.
+-- Значения pickle не переносятся: незавершенные диалоги начнутся заново.
+
+DELETE FROM bot_user_data;
+DELETE FROM bot_conversations;
+
+ALTER TABLE bot_user_data ALTER COLUMN data TYPE JSONB USING convert_from(data, 'UTF8')::jsonb;
+ALTER TABLE bot_conversations ALTER COLUMN state TYPE JSONB USING convert_from(state, 'UTF8')::jsonb;
@@ -0,0 +1,251 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from datetime import timedelta
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+logger = logging.getLogger(__name__)
+
+# Лимиты Telegram: около 30 сообщений в секунду на бота, 1 в секунду в
+# личный чат и 20 в минуту в группу
+OUTBOUND_RATE = float(os.environ.get('OUTBOUND_RATE', 30))
+OUTBOUND_CHAT_RATE = float(os.environ.get('OUTBOUND_CHAT_RATE', 1))
+OUTBOUND_GROUP_RATE = float(os.environ.get('OUTBOUND_GROUP_RATE', 20 / 60))
+# Сколько раз повторять запрос после RetryAfter
+OUTBOUND_MAX_RETRIES = int(os.environ.get('OUTBOUND_MAX_RETRIES', 3))
+
+# Правки одного сообщения, из которых в очереди достаточно последней
+COALESCED_ENDPOINTS = frozenset((
+    'editMessageText', 'editMessageCaption', 'editMessageReplyMarkup', 'editMessageMedia'
+))
+# Состояние простаивающих чатов удаляется не чаще, чем раз в столько секунд
+PRUNE_INTERVAL = 60.0
+
+
+class TokenBucket:
+    """Ведро токенов: rate токенов в секунду, не больше burst подряд"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def is_full(self):
+        self._refill()
+        return self._tokens >= self.burst
+
+    async def acquire(self):
+        while True:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class _Chat:
+    __slots__ = ('lock', 'bucket', 'depth')
+
+    def __init__(self, bucket):
+        # asyncio.Lock пропускает ожидающих по очереди - порядок сообщений сохраняется
+        self.lock = asyncio.Lock()
+        self.bucket = bucket
+        self.depth = 0
+
+
+class _Edit:
+    __slots__ = ('future', 'started', 'superseded_by')
+
+    def __init__(self, future):
+        self.future = future
+        self.started = False
+        self.superseded_by = None
+
+
+class OutboundRateLimiter(BaseRateLimiter):
+    """Планировщик исходящих запросов к Bot API с учетом flood-лимитов.
+
+    Подключается к Application.builder().rate_limiter(), поэтому
+    обработчики по-прежнему вызывают reply_text/edit_message_text, а все
+    запросы с chat_id проходят через него:
+
+    * общее ведро на OUTBOUND_RATE сообщений в секунду и ведро на каждый
+      чат (личные - OUTBOUND_CHAT_RATE, группы - OUTBOUND_GROUP_RATE);
+    * запросы одного чата уходят строго по очереди;
+    * если несколько правок одного сообщения ждут очереди, отправляется
+      только последняя, а ожидавшие получают ее результат;
+    * на RetryAfter вся отправка ставится на паузу на указанное время,
+      запрос повторяется до max_retries раз (rate_limit_args={'max_retries': N}).
+
+    Запросы без chat_id (answerCallbackQuery, getFile и т.п.) не ограничиваются.
+    """
+
+    def __init__(self, rate=OUTBOUND_RATE, chat_rate=OUTBOUND_CHAT_RATE,
+                 group_rate=OUTBOUND_GROUP_RATE, max_retries=OUTBOUND_MAX_RETRIES):
+        self.rate = rate
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.max_retries = max_retries
+
+        self._bucket = TokenBucket(rate, rate)
+        self._chats = {}
+        self._edits = {}
+        self._paused_until = 0.0
+        self._last_prune = time.monotonic()
+
+        # Метрики читаются из потоков Flask
+        self._lock = threading.Lock()
+        self._stats = {
+            'sent': 0,
+            'coalesced': 0,
+            'retry_after': 0,
+            'failed': 0,
+            'wait_seconds_total': 0.0,
+            'wait_seconds_max': 0.0,
+        }
+        self._depths = {}
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        self._chats.clear()
+        self._edits.clear()
+
+    def _chat(self, chat_id):
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            # Отрицательный id или @username - группа или канал
+            private = isinstance(chat_id, int) and chat_id > 0
+            rate = self.chat_rate if private else self.group_rate
+            # Небольшой запас в личных чатах: ответ и сразу правка статуса
+            chat = self._chats[chat_id] = _Chat(TokenBucket(rate, 3 if private else 1))
+        return chat
+
+    def _prune(self):
+        """Удаление простаивающих чатов, ведра которых уже полны (ничего не теряется)"""
+        now = time.monotonic()
+        if now - self._last_prune < PRUNE_INTERVAL:
+            return
+        self._last_prune = now
+        idle = [
+            chat_id for chat_id, chat in self._chats.items()
+            if chat.depth == 0 and not chat.lock.locked() and chat.bucket.is_full()
+        ]
+        for chat_id in idle:
+            del self._chats[chat_id]
+
+    def _set_depth(self, chat_id, chat, delta):
+        chat.depth += delta
+        with self._lock:
+            if chat.depth:
+                self._depths[chat_id] = chat.depth
+            else:
+                self._depths.pop(chat_id, None)
+
+    async def _wait_pause(self):
+        while True:
+            delay = self._paused_until - time.monotonic()
+            if delay <= 0:
+                return
+            await asyncio.sleep(delay)
+
+    async def _send(self, callback, args, kwargs, max_retries):
+        for attempt in range(max_retries + 1):
+            await self._wait_pause()
+            await self._bucket.acquire()
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                delay = e.retry_after
+                if isinstance(delay, timedelta):
+                    delay = delay.total_seconds()
+                with self._lock:
+                    self._stats['retry_after'] += 1
+                if attempt == max_retries:
+                    raise
+                logger.warning(f"⚠️ Flood control: пауза отправки {delay} с (попытка {attempt + 1})")
+                self._paused_until = max(self._paused_until, time.monotonic() + delay + 0.1)
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        chat_id = data.get('chat_id')
+        if chat_id is None:
+            return await callback(*args, **kwargs)
+
+        max_retries = (rate_limit_args or {}).get('max_retries', self.max_retries)
+        self._prune()
+        chat = self._chat(chat_id)
+
+        edit = None
+        edit_key = None
+        if endpoint in COALESCED_ENDPOINTS and data.get('message_id') is not None:
+            edit_key = (chat_id, data['message_id'], endpoint)
+            edit = _Edit(asyncio.get_running_loop().create_future())
+            previous = self._edits.get(edit_key)
+            if previous is not None and not previous.started:
+                previous.superseded_by = edit
+            self._edits[edit_key] = edit
+
+        enqueued_at = time.monotonic()
+        self._set_depth(chat_id, chat, 1)
+        try:
+            async with chat.lock:
+                superseded = edit is not None and edit.superseded_by is not None
+                if not superseded:
+                    if edit is not None:
+                        edit.started = True
+                    await chat.bucket.acquire()
+                    wait = time.monotonic() - enqueued_at
+                    with self._lock:
+                        self._stats['wait_seconds_total'] += wait
+                        self._stats['wait_seconds_max'] = max(self._stats['wait_seconds_max'], wait)
+                    result = await self._send(callback, args, kwargs, max_retries)
+            if superseded:
+                # Правку заменила более новая: ее результат и есть итог
+                with self._lock:
+                    self._stats['coalesced'] += 1
+                result = await asyncio.shield(edit.superseded_by.future)
+            else:
+                with self._lock:
+                    self._stats['sent'] += 1
+        except BaseException as e:
+            if not isinstance(e, asyncio.CancelledError):
+                with self._lock:
+                    self._stats['failed'] += 1
+            if edit is not None and not edit.future.done():
+                # Ожидающие предыдущие правки получают ту же ошибку
+                if isinstance(e, asyncio.CancelledError):
+                    edit.future.cancel()
+                else:
+                    edit.future.set_exception(e)
+                    edit.future.exception()
+            raise
+        finally:
+            self._set_depth(chat_id, chat, -1)
+            if edit is not None and self._edits.get(edit_key) is edit:
+                del self._edits[edit_key]
+
+        if edit is not None:
+            edit.future.set_result(result)
+        return result
+
+    def stats(self):
+        """Метрики отправки: очереди по чатам, повторы после RetryAfter, объединенные правки"""
+        with self._lock:
+            stats = dict(self._stats)
+            depths = dict(self._depths)
+        stats['depth'] = sum(depths.values())
+        stats['chats_waiting'] = len(depths)
+        stats['chat_depths'] = depths
+        stats['paused_for'] = max(0.0, self._paused_until - time.monotonic())
+        return stats
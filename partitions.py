@@ -0,0 +1,124 @@
+# partitions.py
+# Обслуживание месячных разделов expenses (миграция 0006).
+#
+# ensure  - разделы на текущий и --ahead следующих месяцев, перенос строк
+#           из expenses_default в разделы их месяцев. То же выполняется
+#           при каждом старте приложения, если не DB_ENSURE_PARTITIONS=0.
+# archive - отсоединение разделов старше --retention месяцев в схему
+#           expenses_archive; с --export DIR они выгружаются в
+#           DIR/<раздел>.csv.gz и удаляются из БД.
+#
+# Агрегаты expense_rollups архивных месяцев остаются, поэтому общая
+# статистика их учитывает; rollups.py verify и rebuild сверяют и
+# пересчитывают только месяцы подключенных разделов. Очистка расходов
+# пользователя удаляет и его строки архива вместе с их агрегатами
+# (delete_archived_expenses, миграция 0009).
+#
+#     python partitions.py status
+#     python partitions.py ensure [--ahead 3]
+#     python partitions.py archive --retention 24 [--export /backups]
+import os
+import sys
+import gzip
+import logging
+import argparse
+
+import psycopg2
+
+import queries
+
+logger = logging.getLogger(__name__)
+
+# Хранить разделы за столько месяцев (0 - архивировать только явно с --retention)
+EXPENSE_RETENTION_MONTHS = int(os.environ.get('EXPENSE_RETENTION_MONTHS', 0))
+
+
+def ensure_partitions(connection, months_ahead):
+    """Создание недостающих разделов, возвращает их число"""
+    with connection.cursor() as cursor:
+        cursor.execute(queries.ENSURE_EXPENSE_PARTITIONS, (months_ahead,))
+        return cursor.fetchone()[0]
+
+
+def archive_partitions(connection, retention_months):
+    """Отсоединение разделов старше retention_months месяцев, возвращает их имена"""
+    if retention_months < 1:
+        raise ValueError("retention должен быть не меньше 1 месяца")
+    with connection.cursor() as cursor:
+        cursor.execute(queries.ARCHIVE_EXPENSE_PARTITIONS, (retention_months,))
+        return [row[0] for row in cursor.fetchall()]
+
+
+def export_archived(connection, name, directory):
+    """Выгрузка архивного раздела в CSV.gz и удаление таблицы"""
+    path = os.path.join(directory, f"{name}.csv.gz")
+    table = f'expenses_archive."{name}"'
+    with connection.cursor() as cursor, gzip.open(path, 'wb') as f:
+        cursor.copy_expert(f"COPY {table} TO STDOUT WITH (FORMAT csv, HEADER)", f)
+    with connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE {table}")
+    return path
+
+
+def print_status(connection):
+    with connection.cursor() as cursor:
+        cursor.execute(queries.EXPENSE_PARTITIONS)
+        partitions = cursor.fetchall()
+        cursor.execute(queries.ARCHIVED_EXPENSE_PARTITIONS)
+        archived = cursor.fetchall()
+
+    print(f"Разделов expenses: {len(partitions)}")
+    for name, bounds, rows, size in partitions:
+        print(f"  {name:<20} {bounds:<60} ~{max(rows, 0):>10,} строк {size / 1024 / 1024:8.1f} МБ")
+    print(f"В архиве (expenses_archive): {len(archived)}")
+    for name, rows, size in archived:
+        print(f"  {name:<20} ~{max(rows, 0):>10,} строк {size / 1024 / 1024:8.1f} МБ")
+
+
+def main(argv=None):
+    from database_postgres import get_connection_string, PARTITION_MONTHS_AHEAD
+
+    parser = argparse.ArgumentParser(description="Разделы таблицы expenses")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('status', help="Разделы и архив")
+    ensure = subparsers.add_parser('ensure', help="Создать недостающие разделы")
+    ensure.add_argument('--ahead', type=int, default=PARTITION_MONTHS_AHEAD, help="Месяцев вперед")
+    archive = subparsers.add_parser('archive', help="Отсоединить старые разделы")
+    archive.add_argument('--retention', type=int, default=EXPENSE_RETENTION_MONTHS,
+                         help="Сколько последних месяцев оставить")
+    archive.add_argument('--export', metavar='DIR', help="Выгрузить в DIR и удалить из БД")
+    args = parser.parse_args(argv)
+
+    connection_string = get_connection_string()
+    if not connection_string:
+        print("❌ DATABASE_URL не установлен")
+        return 1
+
+    connection = psycopg2.connect(connection_string, connect_timeout=10)
+    connection.autocommit = True
+    try:
+        if args.command == 'status':
+            print_status(connection)
+        elif args.command == 'ensure':
+            print(f"Создано разделов: {ensure_partitions(connection, args.ahead)}")
+        else:
+            if args.retention < 1:
+                print("❌ Укажите --retention или EXPENSE_RETENTION_MONTHS")
+                return 1
+            # Строки из expenses_default сначала раскладываются по разделам
+            ensure_partitions(connection, PARTITION_MONTHS_AHEAD)
+            archived = archive_partitions(connection, args.retention)
+            print(f"Отсоединено разделов: {len(archived)}")
+            for name in archived:
+                if args.export:
+                    print(f"  {name} -> {export_archived(connection, name, args.export)}")
+                else:
+                    print(f"  {name} -> expenses_archive.{name}")
+    finally:
+        connection.close()
+    return 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+    sys.exit(main())
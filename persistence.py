@@ -0,0 +1,225 @@
+import os
+import json
+import asyncio
+import logging
+
+from telegram.ext import BasePersistence, ConversationHandler, PersistenceInput
+
+logger = logging.getLogger(__name__)
+
+# memory - состояние диалогов только в памяти процесса (один воркер),
+# postgres - общее для всех воркеров через PostgresPersistence
+STATE_BACKEND = os.environ.get('STATE_BACKEND', 'memory')
+# Периодическая запись на случай, если запись после обновления не удалась, с
+STATE_UPDATE_INTERVAL = float(os.environ.get('STATE_UPDATE_INTERVAL', 60))
+
+
+def dumps(value):
+    """JSON-строка значения; одинаковые значения - одинаковые строки"""
+    return json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+
+
+def conversation_key(handler, update):
+    """Ключ диалога, как его строит ConversationHandler (None для per_message)"""
+    if handler.per_message:
+        return None
+    key = []
+    if handler.per_chat:
+        if update.effective_chat is None:
+            return None
+        key.append(update.effective_chat.id)
+    if handler.per_user:
+        if update.effective_user is None:
+            return None
+        key.append(update.effective_user.id)
+    return tuple(key)
+
+
+class PostgresPersistence(BasePersistence):
+    """Состояние диалогов (user_data и состояния ConversationHandler) в Postgres.
+
+    Позволяет запускать несколько воркеров: следующее сообщение
+    пользователя может попасть в любой из них.
+
+    * При старте ничего не загружается - состояние пользователя читается
+      одним запросом в load_update() перед обработкой его обновления.
+    * Изменения копятся в памяти (для ключа хранится только последнее
+      значение), неизмененный user_data не пишется вовсе. flush()
+      записывает все накопленное одной транзакцией; одновременные вызовы
+      не идут в БД параллельно, а забирают изменения друг друга.
+    * Значения хранятся в JSON, а не pickle: pickle.loads строки из общей
+      таблицы выполнил бы чужой код. В user_data и состояниях диалогов
+      только числа и строки - строка занимает десятки байт.
+    """
+
+    def __init__(self, database, update_interval=STATE_UPDATE_INTERVAL):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval
+        )
+        self.database = database
+        self.application = None
+        self._handlers = {}
+
+        # user_data в том виде, в каком он лежит в БД (чтобы не писать без изменений)
+        self._stored_user_data = {}
+        self._pending_user_data = {}
+        self._pending_conversations = {}
+        self._flush_lock = asyncio.Lock()
+        self._stats = {
+            'loads': 0,
+            'load_errors': 0,
+            'flushes': 0,
+            'flush_errors': 0,
+            'rows_written': 0,
+            'unchanged_skipped': 0,
+        }
+
+    def attach(self, application):
+        """Запоминает приложение и его сохраняемые ConversationHandler (после add_handler)"""
+        self.application = application
+        for handlers in application.handlers.values():
+            for handler in handlers:
+                if isinstance(handler, ConversationHandler) and handler.persistent:
+                    self._check_conversations(handler)
+                    self._handlers[handler.name] = handler
+
+    @staticmethod
+    def _check_conversations(handler):
+        """load_update пишет во внутреннее хранилище ConversationHandler
+        (TrackingDict): если в другой версии PTB его нет, лучше не
+        запуститься, чем молча терять состояние диалогов"""
+        conversations = getattr(handler, '_conversations', None)
+        if not (hasattr(conversations, 'update_no_track') and hasattr(conversations, 'data')):
+            raise RuntimeError(
+                f"ConversationHandler {handler.name}: нет _conversations.update_no_track - "
+                "версия python-telegram-bot не поддерживается (нужна 22.6 из requirements.txt)"
+            )
+
+    async def load_update(self, update):
+        """Загрузка состояния пользователя перед обработкой его обновления.
+
+        ConversationHandler проверяет состояние до вызова refresh_user_data,
+        поэтому состояние диалогов подставляется здесь, заранее. Изменения,
+        которые еще не записаны в БД, не перетираются.
+        """
+        user = update.effective_user
+        if user is None or self.application is None:
+            return
+
+        state = await self.database.load_bot_state(user.id)
+        if state is None:
+            # БД недоступна - работаем с тем, что есть в памяти
+            self._stats['load_errors'] += 1
+            return
+        self._stats['loads'] += 1
+        user_data, conversations = state
+
+        if user.id not in self._pending_user_data:
+            self._stored_user_data[user.id] = dumps(user_data) if user_data else None
+            local = self.application.user_data[user.id]
+            local.clear()
+            if user_data:
+                local.update(user_data)
+
+        for name, handler in self._handlers.items():
+            key = conversation_key(handler, update)
+            if key is None or (name, key) in self._pending_conversations:
+                continue
+            # Внутреннее хранилище состояний: другого способа обновить его у PTB нет
+            local = handler._conversations
+            stored = conversations.get((name, key))
+            if stored is None:
+                local.data.pop(key, None)
+            else:
+                local.update_no_track({key: stored})
+
+    async def flush(self):
+        """Запись накопленных изменений одной транзакцией"""
+        async with self._flush_lock:
+            if not self._pending_user_data and not self._pending_conversations:
+                return
+
+            user_data, self._pending_user_data = self._pending_user_data, {}
+            conversations, self._pending_conversations = self._pending_conversations, {}
+
+            if await self.database.save_bot_state(user_data, conversations):
+                self._stored_user_data.update(user_data)
+                self._stats['flushes'] += 1
+                self._stats['rows_written'] += len(user_data) + len(conversations)
+                return
+
+            # Повторим при следующей записи; более новые изменения важнее
+            self._stats['flush_errors'] += 1
+            for user_id, data in user_data.items():
+                self._pending_user_data.setdefault(user_id, data)
+            for key, value in conversations.items():
+                self._pending_conversations.setdefault(key, value)
+
+    def stats(self):
+        stats = dict(self._stats)
+        stats['pending'] = len(self._pending_user_data) + len(self._pending_conversations)
+        return stats
+
+    # ---------- user_data ----------
+
+    async def get_user_data(self):
+        # Загружается по требованию в load_update
+        return {}
+
+    async def update_user_data(self, user_id, data):
+        serialized = dumps(data) if data else None
+        if serialized == self._stored_user_data.get(user_id) and user_id not in self._pending_user_data:
+            self._stats['unchanged_skipped'] += 1
+            return
+        self._pending_user_data[user_id] = serialized
+
+    async def drop_user_data(self, user_id):
+        self._pending_user_data[user_id] = None
+
+    async def refresh_user_data(self, user_id, user_data):
+        # Уже обновлено в load_update
+        pass
+
+    # ---------- состояния диалогов ----------
+
+    async def get_conversations(self, name):
+        # Загружаются по требованию в load_update
+        return {}
+
+    async def update_conversation(self, name, key, new_state):
+        handler = self._handlers.get(name)
+        user_id = None
+        if handler is not None and handler.per_user:
+            user_id = key[1] if handler.per_chat else key[0]
+        serialized = dumps(new_state) if new_state is not None else None
+        self._pending_conversations[(name, key)] = (user_id, serialized)
+
+    # ---------- не используются (store_data) ----------
+
+    async def get_chat_data(self):
+        return {}
+
+    async def get_bot_data(self):
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def update_chat_data(self, chat_id, data):
+        pass
+
+    async def update_bot_data(self, data):
+        pass
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def drop_chat_data(self, chat_id):
+        pass
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        pass
+
+    async def refresh_bot_data(self, bot_data):
+        pass
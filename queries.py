@@ -0,0 +1,469 @@
+# queries.py
+# SQL-запросы, общие для синхронного (psycopg2) и асинхронного (psycopg 3)
+# слоев работы с БД. Оба драйвера используют плейсхолдеры %s.
+#
+# Фильтры по дате записаны полуоткрытыми диапазонами по самому столбцу
+# created_at (без DATE()/EXTRACT()), чтобы их обслуживал индекс
+# idx_expenses_user_created.
+#
+# Категория хранится как SMALLINT category_id (таблица categories):
+# названия подставляет и переводит в id categories.CATEGORY_IDS.
+
+ADD_USER = """
+    INSERT INTO users (user_id, username, first_name, last_name, language_code)
+    VALUES (%s, %s, %s, %s, %s)
+    ON CONFLICT (user_id) DO NOTHING
+"""
+
+# Вставка расхода и обновление expense_rollups одним оператором: оба
+# изменения выполняются в одной транзакции и за один round-trip
+ADD_EXPENSE = """
+    WITH inserted AS (
+        INSERT INTO expenses (user_id, amount, category_id, description)
+        VALUES (%s, %s, %s, %s)
+        RETURNING user_id, amount, category_id, created_at
+    )
+    INSERT INTO expense_rollups (user_id, period_kind, period_start, category_id, total, expense_count)
+    SELECT i.user_id,
+           k.kind,
+           CASE k.kind WHEN 'd' THEN i.created_at::date
+                       ELSE date_trunc('month', i.created_at)::date END,
+           i.category_id,
+           i.amount,
+           1
+    FROM inserted i
+    CROSS JOIN (VALUES ('d'), ('m')) AS k(kind)
+    ON CONFLICT (user_id, period_kind, period_start, category_id) DO UPDATE
+    SET total = expense_rollups.total + EXCLUDED.total,
+        expense_count = expense_rollups.expense_count + EXCLUDED.expense_count
+"""
+
+# Обновление expense_rollups по строкам, вставленным в CTE inserted.
+# Строки группируются заранее: ON CONFLICT не может дважды изменить одну
+# строку агрегатов за оператор
+_UPSERT_ROLLUPS_FROM_INSERTED = """
+    INSERT INTO expense_rollups (user_id, period_kind, period_start, category_id, total, expense_count)
+    SELECT i.user_id,
+           k.kind,
+           CASE k.kind WHEN 'd' THEN i.created_at::date
+                       ELSE date_trunc('month', i.created_at)::date END,
+           i.category_id,
+           SUM(i.amount),
+           COUNT(*)
+    FROM inserted i
+    CROSS JOIN (VALUES ('d'), ('m')) AS k(kind)
+    GROUP BY 1, 2, 3, 4
+    ON CONFLICT (user_id, period_kind, period_start, category_id) DO UPDATE
+    SET total = expense_rollups.total + EXCLUDED.total,
+        expense_count = expense_rollups.expense_count + EXCLUDED.expense_count
+"""
+
+# Вставка пачки расходов одним оператором: строки передаются массивами
+ADD_EXPENSES = """
+    WITH inserted AS (
+        INSERT INTO expenses (user_id, amount, category_id, description)
+        SELECT * FROM unnest(%s::bigint[], %s::numeric[], %s::smallint[], %s::text[])
+        RETURNING user_id, amount, category_id, created_at
+    )
+""" + _UPSERT_ROLLUPS_FROM_INSERTED
+
+# ---------- Импорт через COPY ----------
+
+# Промежуточная таблица сессии: COPY идет в нее, а в expenses строки
+# переносятся одним INSERT ... SELECT вместе с обновлением агрегатов
+CREATE_IMPORT_STAGING = """
+    CREATE TEMP TABLE IF NOT EXISTS import_staging (
+        amount DECIMAL(10, 2) NOT NULL,
+        category_id SMALLINT NOT NULL,
+        description TEXT,
+        created_at TIMESTAMP
+    ) ON COMMIT DELETE ROWS
+"""
+
+COPY_IMPORT_STAGING = """
+    COPY import_staging (amount, category_id, description, created_at) FROM STDIN
+"""
+
+INSERT_FROM_IMPORT_STAGING = """
+    WITH inserted AS (
+        INSERT INTO expenses (user_id, amount, category_id, description, created_at)
+        SELECT %s, amount, category_id, description, COALESCE(created_at, LOCALTIMESTAMP)
+        FROM import_staging
+        RETURNING user_id, amount, category_id, created_at
+    )
+""" + _UPSERT_ROLLUPS_FROM_INSERTED
+
+TODAY_EXPENSES = """
+    SELECT id, amount, category_id, description, created_at
+    FROM expenses
+    WHERE user_id = %s
+    AND created_at >= date_trunc('day', LOCALTIMESTAMP)
+    AND created_at < date_trunc('day', LOCALTIMESTAMP) + INTERVAL '1 day'
+    ORDER BY created_at DESC
+"""
+
+MONTH_EXPENSES = """
+    SELECT id, amount, category_id, description, created_at
+    FROM expenses
+    WHERE user_id = %s
+    AND created_at >= date_trunc('month', LOCALTIMESTAMP)
+    AND created_at < date_trunc('month', LOCALTIMESTAMP) + INTERVAL '1 month'
+    ORDER BY created_at DESC
+"""
+
+# Все расходы пользователя для выгрузки (читается серверным курсором)
+EXPORT_EXPENSES = """
+    SELECT created_at, amount, category_id, description
+    FROM expenses
+    WHERE user_id = %s
+    ORDER BY created_at, id
+"""
+
+# Статистика читается из месячных агрегатов: число строк зависит от
+# количества месяцев и категорий, а не от числа расходов
+EXPENSES_BY_CATEGORY = """
+    SELECT category_id, SUM(total) as total
+    FROM expense_rollups
+    WHERE user_id = %s AND period_kind = 'm'
+    GROUP BY category_id
+    ORDER BY total DESC
+"""
+
+TOTAL_EXPENSES = """
+    SELECT COALESCE(SUM(total), 0)
+    FROM expense_rollups
+    WHERE user_id = %s AND period_kind = 'm'
+"""
+
+TODAY_TOTAL = """
+    SELECT COALESCE(SUM(total), 0)
+    FROM expense_rollups
+    WHERE user_id = %s AND period_kind = 'd'
+    AND period_start = CURRENT_DATE
+"""
+
+MONTH_TOTAL = """
+    SELECT COALESCE(SUM(total), 0)
+    FROM expense_rollups
+    WHERE user_id = %s AND period_kind = 'm'
+    AND period_start = date_trunc('month', LOCALTIMESTAMP)::date
+"""
+
+# Страница списка расходов за период с keyset-пагинацией по (created_at, id)
+# и итогами периода из expense_rollups - один round-trip. LEFT JOIN
+# возвращает итоги, даже если страница пустая (тогда id = NULL).
+_EXPENSES_PAGE = """
+    WITH page AS (
+        SELECT id, amount, category_id, description, created_at
+        FROM expenses
+        WHERE user_id = %(user_id)s
+        AND created_at >= {start}
+        AND created_at < {start} + {length}
+        {keyset}
+        ORDER BY created_at {order}, id {order}
+        LIMIT %(limit)s
+    ),
+    totals AS (
+        SELECT COALESCE(SUM(total), 0) AS total,
+               COALESCE(SUM(expense_count), 0) AS expense_count
+        FROM expense_rollups
+        WHERE user_id = %(user_id)s AND {rollup}
+    )
+    SELECT page.id, page.amount, page.category_id, page.description, page.created_at,
+           totals.total, totals.expense_count
+    FROM totals
+    LEFT JOIN page ON TRUE
+    ORDER BY page.created_at {order}, page.id {order}
+"""
+
+_PAGE_PERIODS = {
+    'today': {
+        'start': "date_trunc('day', LOCALTIMESTAMP)",
+        'length': "INTERVAL '1 day'",
+        'rollup': "period_kind = 'd' AND period_start = CURRENT_DATE",
+    },
+    'month': {
+        'start': "date_trunc('month', LOCALTIMESTAMP)",
+        'length': "INTERVAL '1 month'",
+        'rollup': "period_kind = 'm' AND period_start = date_trunc('month', LOCALTIMESTAMP)::date",
+    },
+}
+
+_PAGE_DIRECTIONS = {
+    'first': {'keyset': '', 'order': 'DESC'},
+    'older': {'keyset': 'AND (created_at, id) < (%(created_at)s, %(id)s)', 'order': 'DESC'},
+    'newer': {'keyset': 'AND (created_at, id) > (%(created_at)s, %(id)s)', 'order': 'ASC'},
+}
+
+EXPENSES_PAGE = {
+    (period, direction): _EXPENSES_PAGE.format(**period_sql, **direction_sql)
+    for period, period_sql in _PAGE_PERIODS.items()
+    for direction, direction_sql in _PAGE_DIRECTIONS.items()
+}
+
+# Сводка пользователя одним запросом: GROUPING SETS дает строки по
+# категориям и итоговую строку, FILTER - суммы за выбранный период,
+# сегодня и текущий месяц. Из дневных агрегатов читается только сегодняшний день
+_USER_SUMMARY = """
+    SELECT GROUPING(category_id) AS is_total,
+           category_id,
+           COALESCE(SUM(total) FILTER (WHERE {period}), 0) AS period_total,
+           COALESCE(SUM(expense_count) FILTER (WHERE {period}), 0) AS period_count,
+           COALESCE(SUM(total) FILTER (WHERE period_kind = 'd'), 0) AS today_total,
+           COALESCE(SUM(total) FILTER (
+               WHERE period_kind = 'm'
+               AND period_start = date_trunc('month', LOCALTIMESTAMP)::date
+           ), 0) AS month_total
+    FROM expense_rollups
+    WHERE user_id = %s
+    AND (period_kind = 'm' OR period_start = CURRENT_DATE)
+    GROUP BY GROUPING SETS ((category_id), ())
+    ORDER BY is_total DESC, period_total DESC
+"""
+
+USER_SUMMARY = {
+    'all': _USER_SUMMARY.format(period="period_kind = 'm'"),
+    'month': _USER_SUMMARY.format(
+        period="period_kind = 'm' AND period_start = date_trunc('month', LOCALTIMESTAMP)::date"
+    ),
+    'today': _USER_SUMMARY.format(period="period_kind = 'd'"),
+}
+
+# Удаление расходов вместе с агрегатами (один оператор - одна транзакция).
+# Очищаются и отсоединенные разделы expenses_archive (миграция 0009):
+# агрегаты архивных месяцев удаляются тоже и rebuild их не восстановит
+CLEAR_USER_EXPENSES = """
+    WITH deleted AS (
+        DELETE FROM expenses
+        WHERE user_id = %(user_id)s
+    ),
+    removed AS (
+        DELETE FROM expense_rollups
+        WHERE user_id = %(user_id)s
+    )
+    SELECT delete_archived_expenses(%(user_id)s)
+"""
+
+# То же, но с возвратом удаленной суммы (вместе с архивными месяцами) -
+# для ответа пользователю без отдельного запроса итога перед удалением
+DELETE_ALL_EXPENSES = """
+    WITH deleted AS (
+        DELETE FROM expenses
+        WHERE user_id = %(user_id)s
+    ),
+    removed AS (
+        DELETE FROM expense_rollups
+        WHERE user_id = %(user_id)s
+        RETURNING period_kind, total
+    )
+    SELECT COALESCE(SUM(total) FILTER (WHERE period_kind = 'm'), 0),
+           delete_archived_expenses(%(user_id)s)
+    FROM removed
+"""
+
+# ---------- Сверка и пересборка expense_rollups ----------
+
+# Начало месяца самого старого подключенного раздела (или самой старой
+# строки в expenses_default). Агрегаты более ранних месяцев относятся к
+# архивным разделам, строк для них в expenses нет - сверка и пересборка
+# их не трогают, иначе rebuild стер бы архивные итоги из /stats
+_ROLLUP_HORIZON = r"""
+    (SELECT COALESCE(LEAST(
+                MIN(to_date(substr(c.relname, 10), 'YYYY_MM')),
+                (SELECT MIN(created_at)::date FROM expenses_default)
+            ), '-infinity'::date)
+     FROM pg_inherits i
+     JOIN pg_class c ON c.oid = i.inhrelid
+     WHERE i.inhparent = 'expenses'::regclass
+     AND c.relname ~ '^expenses_\d{4}_\d{2}$')
+"""
+
+_ACTUAL_ROLLUPS = """
+    SELECT e.user_id,
+           k.kind AS period_kind,
+           CASE k.kind WHEN 'd' THEN e.created_at::date
+                       ELSE date_trunc('month', e.created_at)::date END AS period_start,
+           e.category_id,
+           SUM(e.amount) AS total,
+           COUNT(*) AS expense_count
+    FROM expenses e
+    CROSS JOIN (VALUES ('d'), ('m')) AS k(kind)
+    WHERE e.user_id IS NOT NULL
+    AND (%(user_id)s::bigint IS NULL OR e.user_id = %(user_id)s::bigint)
+    GROUP BY 1, 2, 3, 4
+"""
+
+VERIFY_ROLLUPS = """
+    WITH actual AS (""" + _ACTUAL_ROLLUPS + """),
+    stored AS (
+        SELECT user_id, period_kind, period_start, category_id, total, expense_count
+        FROM expense_rollups
+        WHERE (%(user_id)s::bigint IS NULL OR user_id = %(user_id)s::bigint)
+        AND period_start >= """ + _ROLLUP_HORIZON + """
+    )
+    SELECT user_id, period_kind, period_start, category_id,
+           a.total, s.total, a.expense_count, s.expense_count
+    FROM actual a
+    FULL JOIN stored s USING (user_id, period_kind, period_start, category_id)
+    WHERE a.total IS DISTINCT FROM s.total
+    OR a.expense_count IS DISTINCT FROM s.expense_count
+    ORDER BY user_id, period_kind, period_start, category_id
+"""
+
+# Запрет записи в expenses на время пересборки, иначе параллельные
+# add_expense посчитаются дважды или потеряются
+LOCK_EXPENSES_FOR_ROLLUP = "LOCK TABLE expenses IN SHARE MODE"
+
+DELETE_ROLLUPS = """
+    DELETE FROM expense_rollups
+    WHERE (%(user_id)s::bigint IS NULL OR user_id = %(user_id)s::bigint)
+    AND period_start >= """ + _ROLLUP_HORIZON
+
+
+REBUILD_ROLLUPS = """
+    INSERT INTO expense_rollups (user_id, period_kind, period_start, category_id, total, expense_count)
+""" + _ACTUAL_ROLLUPS
+
+# ---------- Разделы expenses (миграция 0006) ----------
+
+# Разделы на months_ahead месяцев вперед и для строк из expenses_default
+ENSURE_EXPENSE_PARTITIONS = "SELECT ensure_expense_partitions(%s)"
+
+# Отсоединение в expenses_archive разделов старше retention месяцев
+# (текущий месяц не считается)
+ARCHIVE_EXPENSE_PARTITIONS = """
+    SELECT archive_expense_partitions(
+        (date_trunc('month', LOCALTIMESTAMP) - make_interval(months => %s))::date
+    )
+"""
+
+EXPENSE_PARTITIONS = """
+    SELECT c.relname,
+           pg_get_expr(c.relpartbound, c.oid),
+           c.reltuples::bigint,
+           pg_total_relation_size(c.oid)
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = 'expenses'::regclass
+    ORDER BY c.relname
+"""
+
+ARCHIVED_EXPENSE_PARTITIONS = """
+    SELECT c.relname, c.reltuples::bigint, pg_total_relation_size(c.oid)
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = 'expenses_archive' AND c.relkind = 'r'
+    ORDER BY c.relname
+"""
+
+# ---------- Справочник категорий (миграция 0008) ----------
+
+# Добавление категорий из config, которых еще нет в БД, и весь справочник
+# одним запросом. Строки, вставленные в CTE, основной запрос не видит -
+# поэтому UNION ALL. Запрос выполняется при каждом старте: уже известные
+# названия отсекает NOT EXISTS, ведь ON CONFLICT берет значение identity
+# и для пропущенной строки, и SMALLINT id закончились бы через пару тысяч
+# перезапусков. ON CONFLICT остается на случай одновременного старта
+SYNC_CATEGORIES = """
+    WITH added AS (
+        INSERT INTO categories (name)
+        SELECT name FROM unnest(%s::text[]) WITH ORDINALITY AS t(name, position)
+        WHERE NOT EXISTS (SELECT 1 FROM categories c WHERE c.name = t.name)
+        ORDER BY position
+        ON CONFLICT (name) DO NOTHING
+        RETURNING id, name
+    )
+    SELECT id, name FROM categories
+    UNION ALL
+    SELECT id, name FROM added
+"""
+
+# ---------- Псевдонимы категорий (миграция 0007) ----------
+
+CATEGORY_ALIASES = """
+    SELECT alias, category_id FROM category_aliases WHERE user_id = %s
+"""
+
+SET_CATEGORY_ALIAS = """
+    INSERT INTO category_aliases (user_id, alias, category_id)
+    VALUES (%s, %s, %s)
+    ON CONFLICT (user_id, alias) DO UPDATE SET category_id = EXCLUDED.category_id
+"""
+
+DELETE_CATEGORY_ALIAS = """
+    DELETE FROM category_aliases WHERE user_id = %s AND alias = %s
+"""
+
+# ---------- Состояние диалогов бота ----------
+
+# Все состояние пользователя одним запросом: строка с name IS NULL -
+# user_data, остальные - состояния диалогов
+LOAD_BOT_STATE = """
+    SELECT NULL::text AS name, NULL::jsonb AS key, data
+    FROM bot_user_data
+    WHERE user_id = %(user_id)s
+    UNION ALL
+    SELECT name, key, state
+    FROM bot_conversations
+    WHERE user_id = %(user_id)s
+"""
+
+SAVE_BOT_USER_DATA = """
+    INSERT INTO bot_user_data (user_id, data)
+    SELECT user_id, data::jsonb
+    FROM unnest(%s::bigint[], %s::text[]) AS t(user_id, data)
+    ON CONFLICT (user_id) DO UPDATE
+    SET data = EXCLUDED.data, updated_at = NOW()
+"""
+
+DELETE_BOT_USER_DATA = """
+    DELETE FROM bot_user_data WHERE user_id = ANY(%s::bigint[])
+"""
+
+SAVE_BOT_CONVERSATIONS = """
+    INSERT INTO bot_conversations (name, key, user_id, state)
+    SELECT name, key::jsonb, user_id, state::jsonb
+    FROM unnest(%s::text[], %s::text[], %s::bigint[], %s::text[]) AS t(name, key, user_id, state)
+    ON CONFLICT (name, key) DO UPDATE
+    SET state = EXCLUDED.state, user_id = EXCLUDED.user_id, updated_at = NOW()
+"""
+
+DELETE_BOT_CONVERSATIONS = """
+    DELETE FROM bot_conversations c
+    USING unnest(%s::text[], %s::text[]) AS t(name, key)
+    WHERE c.name = t.name AND c.key = t.key::jsonb
+"""
+
+# ---------- Подготовленные операторы (psycopg2) ----------
+
+# Частые запросы синхронного слоя: готовятся один раз на соединение
+# (PREPARE) и выполняются по имени, без разбора и планирования на каждый
+# вызов. Значение - (запрос, типы параметров)
+_PREPARED = {
+    'add_expense': (ADD_EXPENSE, ('bigint', 'numeric', 'smallint', 'text')),
+    'today_expenses': (TODAY_EXPENSES, ('bigint',)),
+    'month_expenses': (MONTH_EXPENSES, ('bigint',)),
+    'expenses_by_category': (EXPENSES_BY_CATEGORY, ('bigint',)),
+    'total_expenses': (TOTAL_EXPENSES, ('bigint',)),
+    'today_total': (TODAY_TOTAL, ('bigint',)),
+    'month_total': (MONTH_TOTAL, ('bigint',)),
+}
+
+
+def _numbered(sql):
+    """Плейсхолдеры %s -> $1, $2, ... (синтаксис PREPARE)"""
+    parts = sql.split('%s')
+    return parts[0] + ''.join(f"${i}{part}" for i, part in enumerate(parts[1:], 1))
+
+
+PREPARE_STATEMENTS = {
+    name: f"PREPARE {name} ({', '.join(types)}) AS {_numbered(sql)}"
+    for name, (sql, types) in _PREPARED.items()
+}
+
+EXECUTE_STATEMENTS = {
+    name: f"EXECUTE {name} ({', '.join(['%s'] * len(types))})"
+    for name, (sql, types) in _PREPARED.items()
+}
+
+DEALLOCATE_STATEMENTS = "DEALLOCATE ALL"
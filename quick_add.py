@@ -0,0 +1,63 @@
+import re
+
+from config import QUICK_ADD_MAX_LINES
+from importer import parse_amount
+from categories import CATEGORY_MATCHER, normalize_category
+
+# Сколько слов после суммы пробовать как название категории
+# ("домашние животные" - два слова, плюс эмодзи, если его скопировали)
+MAX_CATEGORY_WORDS = max(
+    len(normalize_category(category).split()) for category in CATEGORY_MATCHER.categories
+) + 1
+# Необязательная валюта после суммы: 1500р, 1500 руб., 1500₽
+_CURRENCY_RE = re.compile(r'^(?:р|руб|рублей|rub|₽)\.?$', re.IGNORECASE)
+_AMOUNT_SUFFIX_RE = re.compile(r'(?<=\d)(?:р|руб|₽)\.?$', re.IGNORECASE)
+
+
+def parse_expense_line(line, aliases=None):
+    """Расход из строки "сумма категория [описание]".
+
+    Сумма - как в process_amount (запятая или точка), после нее может
+    стоять валюта. Категория ищется CATEGORY_MATCHER (псевдонимы, префикс,
+    опечатка) и может состоять из нескольких слов. Возвращает (amount, category, description),
+    при ошибке - ValueError с текстом для пользователя.
+    """
+    words = line.split()
+    if not words:
+        raise ValueError("пустая строка")
+
+    # Отрицательная сумма, как и в process_amount, - ошибка
+    amount = parse_amount(_AMOUNT_SUFFIX_RE.sub('', words[0]))
+    rest = words[1:]
+    if rest and _CURRENCY_RE.match(rest[0]):
+        rest = rest[1:]
+    if not rest:
+        raise ValueError("не указана категория")
+
+    # Самое длинное совпадение: "домашние животные", а не "домашние"
+    for size in range(min(MAX_CATEGORY_WORDS, len(rest)), 0, -1):
+        category = CATEGORY_MATCHER.match(' '.join(rest[:size]), aliases)
+        if category is not None:
+            description = ' '.join(rest[size:]) or None
+            return amount, category, description
+    raise ValueError(f"неизвестная категория: {rest[0]}")
+
+
+def parse_expense_text(text, aliases=None, max_lines=QUICK_ADD_MAX_LINES):
+    """Разбор сообщения, по расходу в строке.
+
+    Возвращает (расходы, ошибки): расходы - кортежи (amount, category,
+    description), ошибки - строки "строка N: причина". Пустые строки
+    пропускаются.
+    """
+    expenses, errors = [], []
+    lines = [(line_no, line) for line_no, line in enumerate(text.splitlines(), 1) if line.strip()]
+    if len(lines) > max_lines:
+        return [], [f"не больше {max_lines} расходов в одном сообщении"]
+
+    for line_no, line in lines:
+        try:
+            expenses.append(parse_expense_line(line, aliases))
+        except ValueError as e:
+            errors.append(f"строка {line_no}: {e}")
+    return expenses, errors
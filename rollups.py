@@ -0,0 +1,39 @@
+# rollups.py
+# Сверка и пересборка агрегатов expense_rollups по таблице expenses.
+#
+#     python rollups.py verify [--user ID]
+#     python rollups.py rebuild [--user ID]
+import sys
+import logging
+import argparse
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Агрегаты расходов (expense_rollups)")
+    parser.add_argument('command', choices=('verify', 'rebuild'))
+    parser.add_argument('--user', type=int, default=None, help="Только для одного пользователя")
+    args = parser.parse_args(argv)
+
+    from database_postgres import db
+
+    if args.command == 'rebuild':
+        return 0 if db.rebuild_rollups(args.user) else 1
+
+    mismatches = db.verify_rollups(args.user)
+    if mismatches is None:
+        return 1
+    if not mismatches:
+        print("✅ Агрегаты совпадают с расходами")
+        return 0
+
+    print(f"❌ Расхождений: {len(mismatches)}")
+    for user_id, kind, start, category, actual, stored, actual_count, stored_count in mismatches[:50]:
+        print(f"  {user_id} {kind} {start} {category}: "
+              f"сумма {actual} / {stored}, записей {actual_count} / {stored_count}")
+    print("Исправить: python rollups.py rebuild")
+    return 2
+
+
+if __name__ == '__main__':
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+    sys.exit(main())
@@ -0,0 +1,80 @@
+# Очистка расходов пользователя удаляет и строки отсоединенных разделов
+# expenses_archive вместе с агрегатами их месяцев. Нужна база с
+# примененными миграциями:
+#     DATABASE_URL=postgresql://... python -m pytest tests/test_clear_expenses.py
+import os
+from datetime import date
+
+import pytest
+
+pytest.importorskip('psycopg2')
+if not os.environ.get('DATABASE_URL'):
+    pytest.skip("нужна DATABASE_URL", allow_module_level=True)
+
+import config
+from categories import CATEGORY_IDS
+from database_postgres import db
+
+USER_ID = 899_999_999
+ARCHIVED_MONTH = date(1990, 1, 1)
+ARCHIVED_TABLE = 'expenses_1990_01'
+
+
+def archive_expense(cursor, amount, category):
+    """Расход и агрегат в месяце, чей раздел отсоединен в expenses_archive"""
+    category_id = CATEGORY_IDS.id(category)
+    cursor.execute("SELECT create_expense_partition(%s)", (ARCHIVED_MONTH,))
+    cursor.execute("""
+        INSERT INTO expenses (user_id, amount, category_id, created_at)
+        VALUES (%s, %s, %s, %s)
+    """, (USER_ID, amount, category_id, ARCHIVED_MONTH))
+    cursor.execute("""
+        INSERT INTO expense_rollups (user_id, period_kind, period_start, category_id, total, expense_count)
+        VALUES (%s, 'm', %s, %s, %s, 1), (%s, 'd', %s, %s, %s, 1)
+    """, (USER_ID, ARCHIVED_MONTH, category_id, amount) * 2)
+    cursor.execute(f"ALTER TABLE expenses DETACH PARTITION {ARCHIVED_TABLE}")
+    cursor.execute(f"ALTER TABLE {ARCHIVED_TABLE} SET SCHEMA expenses_archive")
+
+
+@pytest.fixture
+def connection():
+    connection = db.get_connection()
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            INSERT INTO users (user_id, username) VALUES (%s, 'test')
+            ON CONFLICT (user_id) DO NOTHING
+        """, (USER_ID,))
+    try:
+        yield connection
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS expenses_archive.{ARCHIVED_TABLE}")
+            cursor.execute("DELETE FROM users WHERE user_id = %s", (USER_ID,))
+        db.release_connection(connection)
+
+
+def remaining(cursor):
+    cursor.execute(f"SELECT COUNT(*) FROM expenses_archive.{ARCHIVED_TABLE} WHERE user_id = %s", (USER_ID,))
+    archived = cursor.fetchone()[0]
+    cursor.execute("SELECT COUNT(*) FROM expense_rollups WHERE user_id = %s", (USER_ID,))
+    return archived, cursor.fetchone()[0]
+
+
+def test_delete_all_expenses_clears_archive(connection):
+    category = config.CATEGORIES[0]
+    with connection.cursor() as cursor:
+        archive_expense(cursor, 100, category)
+    assert db.add_expense(USER_ID, 50, category)
+
+    assert db.delete_all_expenses(USER_ID) == 150
+    with connection.cursor() as cursor:
+        assert remaining(cursor) == (0, 0)
+
+
+def test_clear_user_expenses_clears_archive(connection):
+    with connection.cursor() as cursor:
+        archive_expense(cursor, 100, config.CATEGORIES[0])
+
+    assert db.clear_user_expenses(USER_ID)
+    with connection.cursor() as cursor:
+        assert remaining(cursor) == (0, 0)
@@ -0,0 +1,62 @@
+import io
+import asyncio
+from decimal import Decimal
+
+import pytest
+
+from importer import import_expenses, parse_amount, read_expense_rows, INCOME
+
+
+class FakeDatabase:
+    """Методы БД, которые вызывает import_expenses"""
+
+    def __init__(self):
+        self.rows = []
+
+    async def get_category_aliases(self, user_id):
+        return {}
+
+    async def copy_expenses(self, user_id, rows):
+        self.rows.extend(rows)
+        return len(rows)
+
+
+def run_import(text):
+    database = FakeDatabase()
+    result = asyncio.run(import_expenses(database, 1, io.StringIO(text)))
+    return database.rows, result
+
+
+def test_statement_imports_only_debits():
+    rows, result = run_import(
+        "дата;сумма;категория;описание\n"
+        "31.01.2024;-1500,50;Еда;обед\n"
+        "31.01.2024;50000;Другое;зарплата\n"
+        "01.02.2024;-300;Транспорт;метро\n"
+        "01.02.2024;700;Еда;возврат\n"
+    )
+    assert [(amount, description) for amount, _, description, _ in rows] == [
+        (Decimal('1500.50'), 'обед'),
+        (Decimal('300.00'), 'метро'),
+    ]
+    assert result['imported'] == 2
+    assert result['income'] == 2
+    assert result['skipped'] == 0
+
+
+def test_positive_amounts_are_expenses():
+    rows, result = run_import("сумма,категория\n1500,Еда\n300,Транспорт\n")
+    assert [row[0] for row in rows] == [Decimal('1500.00'), Decimal('300.00')]
+    assert result['income'] == 0
+
+
+def test_rows_of_other_sign_are_income():
+    rows = list(read_expense_rows(["сумма;категория\n", "-10;Еда\n", "10;Еда\n"], sign=-1))
+    assert rows[0][1][0] == Decimal('10.00')
+    assert rows[1] == (3, None, INCOME)
+
+
+@pytest.mark.parametrize('text', ['-1500', 'nan', 'Infinity', '0'])
+def test_parse_amount_rejects(text):
+    with pytest.raises(ValueError):
+        parse_amount(text)
@@ -0,0 +1,173 @@
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+def update_key(update):
+    """Ключ очередности: обновления одного пользователя обрабатываются строго по порядку"""
+    if update.effective_user:
+        return update.effective_user.id
+    if update.effective_chat:
+        return update.effective_chat.id
+    # Без пользователя и чата порядок не важен
+    return ('update', update.update_id)
+
+
+class UpdateQueue:
+    """Ограниченная очередь обновлений с пулом воркеров в event loop бота.
+
+    Вебхук кладет обновление в очередь и сразу отвечает Telegram. Воркеры
+    обрабатывают обновления разных пользователей параллельно, а одного
+    пользователя - строго по одному и в порядке поступления: пока его
+    обновление в работе, следующие ждут в его личной очереди.
+    """
+
+    def __init__(self, process, workers=8, max_pending=1000):
+        self.process = process
+        self.workers = workers
+        self.max_pending = max_pending
+
+        self._loop = None
+        self._tasks = []
+        self._ready = None
+        self._by_key = {}
+        self._idle = None
+
+        # Счетчики пишутся из потоков Flask и из loop
+        self._lock = threading.Lock()
+        self._accepting = False
+        self._pending = 0
+        self._stats = {
+            'accepted': 0,
+            'rejected': 0,
+            'processed': 0,
+            'failed': 0,
+            'in_flight': 0,
+            'max_depth_seen': 0,
+            'wait_seconds_total': 0.0,
+            'wait_seconds_max': 0.0,
+            'process_seconds_total': 0.0,
+        }
+
+    async def start(self):
+        """Запуск воркеров (вызывается внутри event loop бота)"""
+        if self._tasks:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._ready = asyncio.Queue()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"update-worker-{i}")
+            for i in range(self.workers)
+        ]
+        with self._lock:
+            self._accepting = True
+        logger.info(f"✅ Очередь обновлений запущена (воркеров: {self.workers}, лимит: {self.max_pending})")
+
+    def submit(self, update):
+        """Постановка обновления в очередь из любого потока.
+
+        Возвращает False, если очередь не запущена, останавливается или
+        переполнена - тогда вебхук отвечает ошибкой и Telegram повторит доставку.
+        """
+        with self._lock:
+            if not self._accepting or self._pending >= self.max_pending:
+                self._stats['rejected'] += 1
+                return False
+            self._pending += 1
+            self._stats['accepted'] += 1
+            self._stats['max_depth_seen'] = max(self._stats['max_depth_seen'], self._pending)
+
+        self._loop.call_soon_threadsafe(self._enqueue, update_key(update), update, time.monotonic())
+        return True
+
+    def _enqueue(self, key, update, enqueued_at):
+        self._idle.clear()
+        items = self._by_key.get(key)
+        if items is not None:
+            # Пользователь уже в очереди или в работе - воркер заберет по порядку
+            items.append((update, enqueued_at))
+            return
+        self._by_key[key] = deque([(update, enqueued_at)])
+        self._ready.put_nowait(key)
+
+    async def _worker(self):
+        while True:
+            key = await self._ready.get()
+            items = self._by_key[key]
+            update, enqueued_at = items.popleft()
+
+            started = time.monotonic()
+            with self._lock:
+                self._stats['in_flight'] += 1
+                wait = started - enqueued_at
+                self._stats['wait_seconds_total'] += wait
+                self._stats['wait_seconds_max'] = max(self._stats['wait_seconds_max'], wait)
+
+            failed = False
+            try:
+                await self.process(update)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                failed = True
+                logger.error(f"❌ Ошибка обработки обновления {update.update_id}: {e}", exc_info=True)
+            finally:
+                with self._lock:
+                    self._stats['in_flight'] -= 1
+                    self._stats['processed'] += 1
+                    self._stats['failed'] += failed
+                    self._stats['process_seconds_total'] += time.monotonic() - started
+                    self._pending -= 1
+                    pending = self._pending
+
+                # Ключ остается в _by_key на время обработки, чтобы новые
+                # обновления пользователя не ушли другому воркеру
+                if items:
+                    self._ready.put_nowait(key)
+                else:
+                    del self._by_key[key]
+                if pending == 0:
+                    self._idle.set()
+
+    async def drain(self, timeout=25.0):
+        """Остановка приема и ожидание обработки уже принятых обновлений"""
+        with self._lock:
+            self._accepting = False
+            pending = self._pending
+        if not self._tasks:
+            return True
+
+        logger.info(f"⏳ Дожидаемся обработки обновлений в очереди: {pending}")
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            drained = True
+        except asyncio.TimeoutError:
+            drained = False
+            logger.warning(f"⚠️ Очередь не опустела за {timeout} с, осталось: {self._pending}")
+
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        logger.info("🛑 Очередь обновлений остановлена")
+        return drained
+
+    def stats(self):
+        """Метрики очереди: глубина, отказы (backpressure), время ожидания и обработки"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['depth'] = self._pending
+            stats['max_pending'] = self.max_pending
+            stats['workers'] = self.workers
+            stats['accepting'] = self._accepting
+        processed = stats['processed']
+        stats['wait_seconds_avg'] = stats['wait_seconds_total'] / processed if processed else 0.0
+        stats['process_seconds_avg'] = stats['process_seconds_total'] / processed if processed else 0.0
+        stats['utilization'] = stats['depth'] / self.max_pending if self.max_pending else 0.0
+        return stats
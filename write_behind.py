@@ -0,0 +1,91 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ExpenseBatcher:
+    """Буфер отложенной записи расходов (write-behind).
+
+    add() кладет расход в буфер и ждет подтверждения. Буфер сбрасывается
+    одним оператором, когда набирается max_size строк или через max_delay
+    секунд после первой строки. Результат каждой строки приходит в ее future.
+
+    Правила надежности:
+    * True возвращается только после COMMIT пачки - подтвержденный
+      пользователю расход уже в БД;
+    * при падении процесса теряется только несброшенный буфер, а по этим
+      расходам пользователь подтверждения еще не получил;
+    * если пачка не записалась, строки повторяются по одной, чтобы ошибка
+      одной строки не отменяла остальные;
+    * close() дописывает буфер перед остановкой.
+    """
+
+    def __init__(self, write_batch, write_one, max_size=100, max_delay=0.05):
+        self.write_batch = write_batch
+        self.write_one = write_one
+        self.max_size = max_size
+        self.max_delay = max_delay
+
+        self._buffer = []
+        self._timer = None
+        self._flushes = set()
+        self._stats = {'rows': 0, 'batches': 0, 'fallback_rows': 0, 'failed_rows': 0}
+
+    async def add(self, user_id, amount, category, description=None):
+        """Добавление расхода в буфер; True/False - записан ли он на самом деле"""
+        future = asyncio.get_running_loop().create_future()
+        self._buffer.append(((user_id, amount, category, description), future))
+
+        if len(self._buffer) >= self.max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_delay, self._flush)
+
+        return await asyncio.shield(future)
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._buffer:
+            return
+
+        batch, self._buffer = self._buffer, []
+        task = asyncio.create_task(self._write(batch))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _write(self, batch):
+        rows = [row for row, _ in batch]
+        try:
+            if await self.write_batch(rows):
+                results = [True] * len(rows)
+            elif len(rows) == 1:
+                results = [False]
+            else:
+                logger.warning(f"⚠️ Пачка из {len(rows)} расходов не записана, повторяем по одному")
+                self._stats['fallback_rows'] += len(rows)
+                results = [await self.write_one(*row) for row in rows]
+        except Exception as e:
+            logger.error(f"❌ Ошибка записи пачки расходов: {e}")
+            results = [False] * len(rows)
+
+        self._stats['rows'] += len(rows)
+        self._stats['batches'] += 1
+        self._stats['failed_rows'] += results.count(False)
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def close(self):
+        """Запись оставшегося буфера и ожидание начатых записей"""
+        self._flush()
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+
+    def stats(self):
+        stats = dict(self._stats)
+        stats['buffered'] = len(self._buffer)
+        stats['avg_batch'] = stats['rows'] / stats['batches'] if stats['batches'] else 0.0
+        return stats